@@ -0,0 +1,165 @@
+'''Batch analysis of FEN positions or PGN games across worker processes.
+
+Inputs are cut into chunks of compact encodings (FEN strings, or a game's
+starting FEN and SAN moves) so no ``Game`` object ever has to be pickled.
+Each worker rebuilds its own ``Game``, runs the check, checkmate and
+legal move analysis, and the results are streamed back in input order
+to a JSONL or CSV sink.
+
+    python Batch.py positions.fen -o results.jsonl
+    python Batch.py archive.pgn -o results.csv --workers 8
+'''
+import argparse
+import csv
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Optional, TextIO
+from ChessBoard import Game
+from PGN import PgnGame, read_games, replay
+
+POSITION_FIELDS = ['index', 'fen', 'turn', 'check', 'checkmate',
+                   'legal_moves', 'error']
+GAME_FIELDS = ['index', 'white', 'black', 'result', 'plies'] + POSITION_FIELDS[1:]
+
+
+def analyze_game_position(game: Game) -> dict:
+    moves = sum(1 for _ in game.legal_moves())
+    check = game.is_check()
+    return {'fen': game.to_fen(), 'turn': game.turn, 'check': check,
+            'checkmate': check and moves == 0, 'legal_moves': moves}
+
+
+def analyze_fen(fen: str) -> dict:
+    return analyze_game_position(Game.from_fen(fen))
+
+
+def analyze_pgn(unit: tuple) -> dict:
+    '''Analyze the final position of a game given as (white, black,
+    result, starting FEN or None, SAN moves)'''
+    white, black, result, fen, moves = unit
+    game = Game.from_fen(fen) if fen else Game()
+    for _ in replay(PgnGame(moves=moves), game):
+        pass
+    row = {'white': white, 'black': black, 'result': result, 'plies': len(moves)}
+    row.update(analyze_game_position(game))
+    return row
+
+
+def pgn_units(lines: Iterable[str]) -> Iterator[tuple]:
+    '''Encode each game of a PGN stream as a picklable tuple'''
+    for record in read_games(lines):
+        headers = record.headers
+        yield (headers.get('White', '?'), headers.get('Black', '?'),
+               record.result, headers.get('FEN'), record.moves)
+
+
+def fen_units(lines: Iterable[str]) -> Iterator[str]:
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+
+def analyze_chunk(analyze: Callable, chunk: List) -> List[dict]:
+    '''Run analyze over a chunk, recording failures instead of raising so
+    one bad record cannot sink the batch'''
+    rows = []
+    for unit in chunk:
+        try:
+            rows.append(analyze(unit))
+        except (ValueError, RuntimeError) as e:
+            rows.append({'error': str(e)})
+    return rows
+
+
+def chunked(units: Iterable, size: int) -> Iterator[List]:
+    units = iter(units)
+    while True:
+        chunk = list(islice(units, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def run(units: Iterable, analyze: Callable, workers: Optional[int] = None,
+        chunk_size: int = 256) -> Iterator[dict]:
+    '''Analyze every unit and yield the results in input order.
+
+    At most two chunks per worker are in flight, so the input is read
+    lazily and memory stays bounded however long it is.  ``workers=0``
+    runs everything in the calling process.
+    '''
+    index = 0
+    if workers == 0:
+        for chunk in chunked(units, chunk_size):
+            for row in analyze_chunk(analyze, chunk):
+                yield {'index': index, **row}
+                index += 1
+        return
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(workers) as executor:
+        pending = deque()
+        chunks = chunked(units, chunk_size)
+        for chunk in islice(chunks, 2 * workers):
+            pending.append(executor.submit(analyze_chunk, analyze, chunk))
+        while pending:
+            rows = pending.popleft().result()
+            for chunk in islice(chunks, 1):
+                pending.append(executor.submit(analyze_chunk, analyze, chunk))
+            for row in rows:
+                yield {'index': index, **row}
+                index += 1
+
+
+def write_jsonl(rows: Iterable[dict], out: TextIO) -> int:
+    count = 0
+    for row in rows:
+        out.write(json.dumps(row) + '\n')
+        count += 1
+    return count
+
+
+def write_csv(rows: Iterable[dict], out: TextIO, fields: List[str]) -> int:
+    writer = csv.DictWriter(out, fields, extrasaction='ignore')
+    writer.writeheader()
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Analyze FEN positions or PGN games in parallel")
+    parser.add_argument('input', help="a .pgn file, or a file with one FEN per line")
+    parser.add_argument('-o', '--output', help="a .jsonl or .csv file (JSONL on stdout by default)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="worker processes (default: one per CPU, 0 runs inline)")
+    parser.add_argument('--chunk-size', type=int, default=256)
+    args = parser.parse_args(argv)
+
+    is_pgn = args.input.lower().endswith('.pgn')
+    with open(args.input, encoding='utf-8', errors='replace') as f:
+        units = pgn_units(f) if is_pgn else fen_units(f)
+        rows = run(units, analyze_pgn if is_pgn else analyze_fen,
+                   args.workers, args.chunk_size)
+        out = open(args.output, 'w', newline='') if args.output else sys.stdout
+        try:
+            if args.output and args.output.lower().endswith('.csv'):
+                count = write_csv(rows, out, GAME_FIELDS if is_pgn else POSITION_FIELDS)
+            else:
+                count = write_jsonl(rows, out)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+    print(f"Analyzed {count} {'games' if is_pgn else 'positions'}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
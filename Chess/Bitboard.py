@@ -0,0 +1,777 @@
+'''Bitboard representation of a chess position.
+
+Every square maps to one bit of a 64-bit integer: ``Position(x, y)`` is
+bit ``y * 8 + x``, so a1 is bit 0 and h8 is bit 63.  The position is
+stored as one bitboard per color and piece kind plus a per-color
+occupancy, and every query is a handful of shifts and masks instead of a
+walk over ``Piece`` objects.
+'''
+import random
+from typing import Iterator, List, Optional
+from Piece import *
+
+# Castling rights, one bit each
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+ALL_CASTLING = 15
+
+FULL = 0xFFFFFFFFFFFFFFFF
+FILE_A = 0x0101010101010101
+FILE_B = FILE_A << 1
+FILE_G = FILE_A << 6
+FILE_H = FILE_A << 7
+RANK_1 = 0xFF
+RANK_2 = RANK_1 << 8
+RANK_3 = RANK_1 << 16
+RANK_6 = RANK_1 << 40
+RANK_7 = RANK_1 << 48
+RANK_8 = RANK_1 << 56
+NOT_FILE_A = FULL ^ FILE_A
+NOT_FILE_H = FULL ^ FILE_H
+NOT_FILE_AB = FULL ^ (FILE_A | FILE_B)
+NOT_FILE_GH = FULL ^ (FILE_G | FILE_H)
+
+# (shift, mask applied after the shift) for every sliding direction
+ROOK_DIRECTIONS = ((8, FULL), (-8, FULL), (1, NOT_FILE_A), (-1, NOT_FILE_H))
+BISHOP_DIRECTIONS = ((9, NOT_FILE_A), (7, NOT_FILE_H),
+                     (-7, NOT_FILE_A), (-9, NOT_FILE_H))
+
+# Squares whose state decides each castling right; moving from or to them
+# clears the right
+CASTLING_MASK = [ALL_CASTLING] * 64
+CASTLING_MASK[0] &= ~WHITE_QUEENSIDE
+CASTLING_MASK[4] &= ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASK[7] &= ~WHITE_KINGSIDE
+CASTLING_MASK[56] &= ~BLACK_QUEENSIDE
+CASTLING_MASK[60] &= ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_MASK[63] &= ~BLACK_KINGSIDE
+
+
+def square(pos: Position) -> int:
+    return pos.sq
+
+
+def position(sq: int) -> Position:
+    return Position(sq & 7, sq >> 3)
+
+
+def iter_bits(bb: int) -> Iterator[int]:
+    '''Yield the index of every set bit, lowest first'''
+    while bb:
+        lsb = bb & -bb
+        yield lsb.bit_length() - 1
+        bb ^= lsb
+
+
+def shift(bb: int, offset: int) -> int:
+    return (bb << offset) & FULL if offset > 0 else bb >> -offset
+
+
+def knight_attacks(bb: int) -> int:
+    return (((bb << 17) & NOT_FILE_A) | ((bb << 15) & NOT_FILE_H)
+            | ((bb << 10) & NOT_FILE_AB) | ((bb << 6) & NOT_FILE_GH)
+            | ((bb >> 6) & NOT_FILE_AB) | ((bb >> 10) & NOT_FILE_GH)
+            | ((bb >> 15) & NOT_FILE_A) | ((bb >> 17) & NOT_FILE_H)) & FULL
+
+
+def king_attacks(bb: int) -> int:
+    sides = ((bb << 1) & NOT_FILE_A) | ((bb >> 1) & NOT_FILE_H)
+    row = bb | sides
+    return (sides | (row << 8) | (row >> 8)) & FULL
+
+
+def pawn_attacks(bb: int, color: int) -> int:
+    if color == WHITE:
+        return ((bb << 9) & NOT_FILE_A) | ((bb << 7) & NOT_FILE_H)
+    return ((bb >> 7) & NOT_FILE_A) | ((bb >> 9) & NOT_FILE_H)
+
+
+def slide(bb: int, occupied: int, directions) -> int:
+    '''Squares reached from ``bb`` along the given rays, stopping at
+    (and including) the first occupied square'''
+    attacks = 0
+    for offset, mask in directions:
+        ray = bb
+        while True:
+            ray = shift(ray, offset) & mask
+            if not ray:
+                break
+            attacks |= ray
+            if ray & occupied:
+                break
+    return attacks
+
+
+# Per-square attack tables for the leapers
+KNIGHT_ATTACKS = [knight_attacks(1 << sq) for sq in range(64)]
+KING_ATTACKS = [king_attacks(1 << sq) for sq in range(64)]
+PAWN_ATTACKS = [[pawn_attacks(1 << sq, color) for sq in range(64)]
+                for color in (WHITE, BLACK)]
+
+
+def _relevant_mask(sq: int, directions) -> int:
+    '''Squares on the rays from ``sq`` whose occupancy can change the
+    attack set, i.e. the rays minus their final square'''
+    mask = 0
+    for offset, edge in directions:
+        ray = 1 << sq
+        while True:
+            ray = shift(ray, offset) & edge
+            if not ray or not shift(ray, offset) & edge:
+                break
+            mask |= ray
+    return mask
+
+
+def _attack_table(sq: int, mask: int, directions) -> dict:
+    '''Attack set for every subset of ``mask``, keyed by the subset'''
+    table = {}
+    subset = 0
+    while True:
+        table[subset] = slide(1 << sq, subset, directions)
+        subset = (subset - mask) & mask
+        if not subset:
+            return table
+
+
+# Sliding attacks are looked up by the occupancy of the relevant squares.
+# This is the PEXT scheme with the dict hash standing in for the bit
+# extraction, which in Python beats emulating a 64-bit magic multiply.
+ROOK_MASKS = [_relevant_mask(sq, ROOK_DIRECTIONS) for sq in range(64)]
+BISHOP_MASKS = [_relevant_mask(sq, BISHOP_DIRECTIONS) for sq in range(64)]
+ROOK_TABLE = [_attack_table(sq, ROOK_MASKS[sq], ROOK_DIRECTIONS)
+              for sq in range(64)]
+BISHOP_TABLE = [_attack_table(sq, BISHOP_MASKS[sq], BISHOP_DIRECTIONS)
+                for sq in range(64)]
+
+
+def rook_attacks(sq: int, occupied: int) -> int:
+    return ROOK_TABLE[sq][occupied & ROOK_MASKS[sq]]
+
+
+def bishop_attacks(sq: int, occupied: int) -> int:
+    return BISHOP_TABLE[sq][occupied & BISHOP_MASKS[sq]]
+
+
+def queen_attacks(sq: int, occupied: int) -> int:
+    return (ROOK_TABLE[sq][occupied & ROOK_MASKS[sq]]
+            | BISHOP_TABLE[sq][occupied & BISHOP_MASKS[sq]])
+
+
+def _between_table() -> List[List[int]]:
+    '''Squares strictly between two squares that share a rank, file or
+    diagonal; 0 for unaligned pairs'''
+    table = [[0] * 64 for _ in range(64)]
+    for sq in range(64):
+        for offset, mask in ROOK_DIRECTIONS + BISHOP_DIRECTIONS:
+            ray = 1 << sq
+            passed = 0
+            while True:
+                ray = shift(ray, offset) & mask
+                if not ray:
+                    break
+                table[sq][ray.bit_length() - 1] = passed
+                passed |= ray
+    return table
+
+
+BETWEEN = _between_table()
+
+
+# Zobrist keys, drawn from a fixed seed so position hashes are stable
+# across runs and processes
+_rng = random.Random(0x5A0B4157)
+PIECE_KEYS = [[[_rng.getrandbits(64) for _ in range(64)] for _ in range(6)]
+              for _ in (WHITE, BLACK)]
+_RIGHT_KEYS = [_rng.getrandbits(64) for _ in range(4)]
+CASTLING_KEYS = [0] * 16
+for _rights in range(16):
+    for _bit in range(4):
+        if _rights >> _bit & 1:
+            CASTLING_KEYS[_rights] ^= _RIGHT_KEYS[_bit]
+EN_PASSANT_KEYS = [_rng.getrandbits(64) for _ in range(8)]
+SIDE_KEY = _rng.getrandbits(64)  # Black to move
+# The same piece keys looked up by Piece class and color name
+OBJECT_PIECE_KEYS = {(cls, COLORS[color]): PIECE_KEYS[color][kind]
+                     for color in (WHITE, BLACK)
+                     for kind, cls in enumerate(PIECE_CLASSES)}
+
+
+# Moves are packed into 15 bits: source square, destination square and
+# the promotion piece kind (0 when the move is not a promotion)
+def encode_move(src: int, dst: int, promotion: int = 0) -> int:
+    return src | dst << 6 | promotion << 12
+
+
+def move_src(move: int) -> int:
+    return move & 63
+
+
+def move_dst(move: int) -> int:
+    return move >> 6 & 63
+
+
+def move_promotion(move: int) -> int:
+    return move >> 12
+
+
+def square_name(sq: int) -> str:
+    return 'abcdefgh'[sq & 7] + str((sq >> 3) + 1)
+
+
+def move_to_uci(move: int) -> str:
+    '''Coordinate notation of an encoded move, e.g. e2e4 or a7a8q'''
+    name = square_name(move & 63) + square_name(move >> 6 & 63)
+    if move >> 12:
+        name += 'pnbrqk'[move >> 12]
+    return name
+
+
+class BitboardGame:
+    '''Drop-in alternative to ``Game`` backed by bitboards.
+
+    ``pieces[color][kind]`` holds one bitboard per piece type and color,
+    ``occupancy[color]`` the union of a color's pieces and ``occupied``
+    every piece on the board.  ``mailbox`` mirrors the bitboards as a
+    64-entry list of ``(color, kind)`` tuples so a single square can be
+    read without scanning twelve bitboards.
+    '''
+    pieces: List[List[int]]
+    occupancy: List[int]
+    occupied: int
+    mailbox: List[Optional[tuple[int, int]]]
+    turn: int = WHITE
+    castling: int = ALL_CASTLING
+    ep_square: Optional[int] = None
+    halfmove_clock: int = 0
+    fullmove_number: int = 1
+    zobrist: int = 0
+    undo_stack: List[tuple]
+
+    def __init__(self):
+        self.pieces = [[0] * 6, [0] * 6]
+        self.occupancy = [0, 0]
+        self.occupied = 0
+        self.mailbox = [None] * 64
+        self.zobrist = 0
+        self.undo_stack = []
+
+        back_rank = (ROOK, KNIGHT, BISHOP, QUEEN, KING, BISHOP, KNIGHT, ROOK)
+        for x, kind in enumerate(back_rank):
+            self.put(x, WHITE, kind)
+            self.put(8 + x, WHITE, PAWN)
+            self.put(48 + x, BLACK, PAWN)
+            self.put(56 + x, BLACK, kind)
+        self.zobrist = self.compute_zobrist()
+
+    @classmethod
+    def from_game(cls, game) -> "BitboardGame":
+        '''Build the bitboards from the object board of a ``Game``'''
+        bg = cls.__new__(cls)
+        bg.pieces = [[0] * 6, [0] * 6]
+        bg.occupancy = [0, 0]
+        bg.occupied = 0
+        bg.mailbox = [None] * 64
+        bg.zobrist = 0
+        bg.undo_stack = []
+        for y in range(8):
+            for x in range(8):
+                piece = game.board[y][x]
+                if piece is not None:
+                    bg.put(y * 8 + x, COLORS.index(piece.color),
+                           PIECE_CLASSES.index(type(piece)))
+
+        # Only keep the rights whose king and rook are still in place, in
+        # case pieces were put on the board by hand
+        bg.castling = 0
+        for right, king_sq, rook_sq, color in (
+                (WHITE_KINGSIDE, 4, 7, WHITE), (WHITE_QUEENSIDE, 4, 0, WHITE),
+                (BLACK_KINGSIDE, 60, 63, BLACK), (BLACK_QUEENSIDE, 60, 56, BLACK)):
+            if (game.castling & right
+                    and bg.mailbox[king_sq] == (color, KING)
+                    and bg.mailbox[rook_sq] == (color, ROOK)):
+                bg.castling |= right
+
+        bg.turn = COLORS.index(game.turn)
+        bg.ep_square = None
+        bg.halfmove_clock = game.halfmove_clock
+        bg.fullmove_number = game.fullmove_number
+        if game.last_move is not None:
+            src, dst = game.last_move
+            moved = bg.mailbox[square(dst)]
+            if moved is not None and moved[1] == PAWN and abs(dst.y - src.y) == 2:
+                bg.ep_square = (src.y + dst.y) // 2 * 8 + dst.x
+        bg.zobrist = bg.compute_zobrist()
+        return bg
+
+    def to_game(self):
+        '''Build an equivalent object-backed ``Game``'''
+        from ChessBoard import Game
+        from Evaluation import compute
+
+        game = Game()
+        game.board = [[None] * 8 for _ in range(8)]
+        for sq, entry in enumerate(self.mailbox):
+            if entry is not None:
+                color, kind = entry
+                game.board[sq >> 3][sq & 7] = PIECE_CLASSES[kind](
+                    COLORS[color], position(sq), game)
+        game.last_move = self.last_move
+        game.halfmove_clock = self.halfmove_clock
+        game.fullmove_number = self.fullmove_number
+        game.turn = COLORS[self.turn]
+        game.castling = self.castling
+        game.zobrist = game.compute_zobrist()
+        game.psqt, game.phase = compute(game.board)
+        game.material, game.bishop_squares = game.compute_material()
+        game.repetitions = {game.zobrist: 1}
+        return game
+
+    @classmethod
+    def from_fen(cls, fen: str) -> "BitboardGame":
+        from Fen import parse_fen
+
+        placement, turn, castling, ep, halfmove_clock, fullmove_number = parse_fen(fen)
+        bg = cls.__new__(cls)
+        bg.pieces = [[0] * 6, [0] * 6]
+        bg.occupancy = [0, 0]
+        bg.occupied = 0
+        bg.mailbox = [None] * 64
+        bg.zobrist = 0
+        bg.undo_stack = []
+        for y, row in enumerate(placement):
+            for x, letter in enumerate(row):
+                if letter is not None:
+                    bg.put(y * 8 + x, WHITE if letter.isupper() else BLACK,
+                           'pnbrqk'.index(letter.lower()))
+        bg.turn = COLORS.index(turn)
+        bg.castling = castling
+        bg.ep_square = None if ep is None else square(ep)
+        bg.halfmove_clock = halfmove_clock
+        bg.fullmove_number = fullmove_number
+        bg.zobrist = bg.compute_zobrist()
+        return bg
+
+    def to_fen(self) -> str:
+        from Fen import format_fen
+
+        placement = [[None] * 8 for _ in range(8)]
+        for sq, entry in enumerate(self.mailbox):
+            if entry is not None:
+                letter = 'pnbrqk'[entry[1]]
+                placement[sq >> 3][sq & 7] = letter.upper() if entry[0] == WHITE else letter
+        ep = None if self.ep_square is None else position(self.ep_square)
+        return format_fen(placement, COLORS[self.turn], self.castling, ep,
+                          self.halfmove_clock, self.fullmove_number)
+
+    def copy(self) -> "BitboardGame":
+        bg = BitboardGame.__new__(BitboardGame)
+        bg.pieces = [self.pieces[WHITE][:], self.pieces[BLACK][:]]
+        bg.occupancy = self.occupancy[:]
+        bg.occupied = self.occupied
+        bg.mailbox = self.mailbox[:]
+        bg.turn = self.turn
+        bg.castling = self.castling
+        bg.ep_square = self.ep_square
+        bg.halfmove_clock = self.halfmove_clock
+        bg.fullmove_number = self.fullmove_number
+        bg.zobrist = self.zobrist
+        bg.undo_stack = self.undo_stack[:]
+        return bg
+
+    @property
+    def last_move(self) -> Optional[tuple[Position, Position]]:
+        '''The double pawn push behind the en passant square, which is
+        all ``Game`` reads from its own last move'''
+        if self.ep_square is None:
+            return None
+        step = 8 if self.turn == BLACK else -8
+        return (position(self.ep_square - step), position(self.ep_square + step))
+
+    def put(self, sq: int, color: int, kind: int) -> None:
+        bit = 1 << sq
+        self.pieces[color][kind] |= bit
+        self.occupancy[color] |= bit
+        self.occupied |= bit
+        self.mailbox[sq] = (color, kind)
+        self.zobrist ^= PIECE_KEYS[color][kind][sq]
+
+    def remove(self, sq: int) -> None:
+        color, kind = self.mailbox[sq]
+        mask = FULL ^ (1 << sq)
+        self.pieces[color][kind] &= mask
+        self.occupancy[color] &= mask
+        self.occupied &= mask
+        self.mailbox[sq] = None
+        self.zobrist ^= PIECE_KEYS[color][kind][sq]
+
+    def en_passant_key(self) -> int:
+        '''Key of the en passant file, hashed only when a pawn of the
+        side to move can actually make the capture'''
+        ep = self.ep_square
+        if ep is not None and PAWN_ATTACKS[1 - self.turn][ep] & self.pieces[self.turn][PAWN]:
+            return EN_PASSANT_KEYS[ep & 7]
+        return 0
+
+    def compute_zobrist(self) -> int:
+        '''Hash the position from scratch; make_move keeps ``zobrist``
+        up to date incrementally'''
+        key = CASTLING_KEYS[self.castling] ^ self.en_passant_key()
+        if self.turn == BLACK:
+            key ^= SIDE_KEY
+        for sq, entry in enumerate(self.mailbox):
+            if entry is not None:
+                key ^= PIECE_KEYS[entry[0]][entry[1]][sq]
+        return key
+
+    def print(self):
+        output = ''
+        for y in range(8):
+            for x in range(8):
+                entry = self.mailbox[y * 8 + x]
+                if entry is not None:
+                    output += str(PIECE_CLASSES[entry[1]](COLORS[entry[0]])) + ' '
+                else:
+                    output += '  '
+            output += '\n'
+        print(output, end='')
+
+    def is_empty(self, pos: Position) -> bool:
+        return not self.occupied >> square(pos) & 1
+
+    def is_enemy(self, pos: Position, color: str) -> bool:
+        return bool(self.occupancy[1 - COLORS.index(color)] >> square(pos) & 1)
+
+    def attacks_from(self, sq: int) -> int:
+        '''Squares attacked by the piece on ``sq``'''
+        color, kind = self.mailbox[sq]
+        if kind == PAWN:
+            return PAWN_ATTACKS[color][sq]
+        if kind == KNIGHT:
+            return KNIGHT_ATTACKS[sq]
+        if kind == BISHOP:
+            return bishop_attacks(sq, self.occupied)
+        if kind == ROOK:
+            return rook_attacks(sq, self.occupied)
+        if kind == QUEEN:
+            return queen_attacks(sq, self.occupied)
+        return KING_ATTACKS[sq]
+
+    def attacked_by(self, color: int) -> int:
+        '''Every square attacked by ``color``'''
+        attacks = 0
+        for sq in iter_bits(self.occupancy[color]):
+            attacks |= self.attacks_from(sq)
+        return attacks
+
+    def moves_from(self, sq: int) -> int:
+        '''Pseudo-legal destinations of the piece on ``sq``, castling
+        excluded'''
+        color, kind = self.mailbox[sq]
+        bit = 1 << sq
+        if kind == PAWN:
+            empty = FULL ^ self.occupied
+            if color == WHITE:
+                single = (bit << 8) & empty
+                double = ((single & RANK_3) << 8) & empty
+            else:
+                single = (bit >> 8) & empty
+                double = ((single & RANK_6) >> 8) & empty
+            targets = self.occupancy[1 - color]
+            if self.ep_square is not None:
+                targets |= 1 << self.ep_square
+            return single | double | (PAWN_ATTACKS[color][sq] & targets)
+        return self.attacks_from(sq) & ~self.occupancy[color]
+
+    def get_possible_moves(self, pos: Position) -> List[Position]:
+        return [position(sq) for sq in iter_bits(self.moves_from(square(pos)))]
+
+    def make_move(self, move: int) -> None:
+        '''Play an encoded move without validating it and push what
+        unmake_move needs to take it back'''
+        src = move & 63
+        dst = move >> 6 & 63
+        color, kind = self.mailbox[src]
+        captured = self.mailbox[dst]
+        self.undo_stack.append((move, captured, self.castling,
+                                self.ep_square, self.halfmove_clock,
+                                self.zobrist))
+        # put and remove hash the pieces; the rest is swapped here
+        self.zobrist ^= CASTLING_KEYS[self.castling] ^ self.en_passant_key()
+
+        if captured is not None:
+            self.remove(dst)
+        elif kind == PAWN and dst == self.ep_square:
+            self.remove(dst - 8 if color == WHITE else dst + 8)
+        self.remove(src)
+        self.put(dst, color, move >> 12 or kind)
+
+        if kind == KING and abs(dst - src) == 2:
+            rook_src, rook_dst = (src + 3, src + 1) if dst > src else (src - 4, src - 1)
+            self.remove(rook_src)
+            self.put(rook_dst, color, ROOK)
+
+        self.castling &= CASTLING_MASK[src] & CASTLING_MASK[dst]
+        self.ep_square = (src + dst) // 2 if kind == PAWN and abs(dst - src) == 16 else None
+        self.halfmove_clock = 0 if kind == PAWN or captured is not None else self.halfmove_clock + 1
+        self.fullmove_number += color
+        self.turn = 1 - color
+        self.zobrist ^= CASTLING_KEYS[self.castling] ^ self.en_passant_key() ^ SIDE_KEY
+
+    def unmake_move(self) -> int:
+        '''Take back the last move played with make_move and return it'''
+        (move, captured, self.castling, self.ep_square,
+         self.halfmove_clock, zobrist) = self.undo_stack.pop()
+        src = move & 63
+        dst = move >> 6 & 63
+        color, kind = self.mailbox[dst]
+
+        self.remove(dst)
+        self.put(src, color, PAWN if move >> 12 else kind)
+        if captured is not None:
+            self.put(dst, *captured)
+        elif kind == PAWN and dst == self.ep_square:
+            self.put(dst - 8 if color == WHITE else dst + 8, 1 - color, PAWN)
+        elif kind == KING and abs(dst - src) == 2:
+            rook_src, rook_dst = (src + 3, src + 1) if dst > src else (src - 4, src - 1)
+            self.remove(rook_dst)
+            self.put(rook_src, color, ROOK)
+
+        self.fullmove_number -= color
+        self.turn = color
+        self.zobrist = zobrist
+        return move
+
+    def move_piece(self, src: Position, dst: Position) -> None:
+        '''Move the piece to the destination,
+        if the move is not valid, raise an exception.
+
+        As with ``Game.move_piece``, a move of the side to move must be
+        one of legal_moves; a piece of the other side is only checked
+        against its own moves, as when setting up a position.'''
+
+        if not (0 <= src.x <= 7 and 0 <= src.y <= 7 and
+                0 <= dst.x <= 7 and 0 <= dst.y <= 7):
+            raise RuntimeError("Invalid move")
+
+        src_sq, dst_sq = square(src), square(dst)
+        entry = self.mailbox[src_sq]
+        if entry is None:
+            raise RuntimeError("No piece at the source position")
+        color, kind = entry
+        if kind == KING and abs(dst.x - src.x) == 2:
+            self.castle(src, dst)
+            return
+        move = encode_move(src_sq, dst_sq, QUEEN if kind == PAWN and dst.y in (0, 7) else 0)
+        if color == self.turn:
+            if move not in self.legal_moves():
+                raise RuntimeError("Invalid move")
+        elif not self.moves_from(src_sq) >> dst_sq & 1:
+            raise RuntimeError("Invalid move")
+        self.make_move(move)
+
+    def castle(self, src: Position, dst: Position) -> None:
+        src_sq, dst_sq = square(src), square(dst)
+        entry = self.mailbox[src_sq]
+        if entry is None or entry[1] != KING:
+            raise RuntimeError("Only the king can castle")
+
+        if abs(dst.x - src.x) != 2 or dst.y != src.y:
+            raise RuntimeError("Invalid castling move")
+
+        color = entry[0]
+        rook_sq = src_sq + 3 if dst_sq > src_sq else src_sq - 4
+        between = 0
+        for sq in range(min(src_sq, rook_sq) + 1, max(src_sq, rook_sq)):
+            between |= 1 << sq
+        if self.mailbox[rook_sq] != (color, ROOK) or self.occupied & between:
+            raise RuntimeError("Invalid castling move")
+        move = encode_move(src_sq, dst_sq)
+        if color != self.turn or move not in self.legal_moves():
+            # Out of turn, out of, through or into check, or without the right
+            raise RuntimeError("Invalid castling move")
+
+        self.make_move(move)
+
+    def attackers_to(self, sq: int, by_color: int, occupied: int = None) -> int:
+        '''Bitboard of the pieces of ``by_color`` attacking ``sq``'''
+        if occupied is None:
+            occupied = self.occupied
+        theirs = self.pieces[by_color]
+        return ((KNIGHT_ATTACKS[sq] & theirs[KNIGHT])
+                | (PAWN_ATTACKS[1 - by_color][sq] & theirs[PAWN])
+                | (KING_ATTACKS[sq] & theirs[KING])
+                | (rook_attacks(sq, occupied) & (theirs[ROOK] | theirs[QUEEN]))
+                | (bishop_attacks(sq, occupied) & (theirs[BISHOP] | theirs[QUEEN])))
+
+    def is_square_attacked(self, sq: int, by_color: int) -> bool:
+        '''Look outward from ``sq`` for an attacker of ``by_color``,
+        stopping at the first pattern that finds one'''
+        theirs = self.pieces[by_color]
+        if KNIGHT_ATTACKS[sq] & theirs[KNIGHT]:
+            return True
+        if PAWN_ATTACKS[1 - by_color][sq] & theirs[PAWN]:
+            return True
+        if KING_ATTACKS[sq] & theirs[KING]:
+            return True
+        occupied = self.occupied
+        if rook_attacks(sq, occupied) & (theirs[ROOK] | theirs[QUEEN]):
+            return True
+        return bool(bishop_attacks(sq, occupied) & (theirs[BISHOP] | theirs[QUEEN]))
+
+    def legal_moves(self) -> List[int]:
+        '''Every legal move of the side to move, as encoded moves.
+
+        Checkers and pinned pieces are found once per position: a single
+        check restricts every non-king move to the squares that capture
+        or block the checker, a double check leaves only king moves, and
+        a pinned piece may only move along the line of its pin.
+        '''
+        us = self.turn
+        them = 1 - us
+        ours = self.pieces[us]
+        theirs = self.pieces[them]
+        own = self.occupancy[us]
+        enemy = self.occupancy[them]
+        occupied = self.occupied
+        if not ours[KING]:
+            return self._pseudo_legal_moves()
+        king = ours[KING].bit_length() - 1
+        king_bit = 1 << king
+        moves = []
+
+        # The king must not step onto an attacked square, including the
+        # squares behind it on the line of a slider checking it
+        for dst in iter_bits(KING_ATTACKS[king] & ~own):
+            if not self.attackers_to(dst, them, occupied ^ king_bit):
+                moves.append(king | dst << 6)
+
+        checkers = self.attackers_to(king, them)
+        if checkers & (checkers - 1):
+            return moves
+        if checkers:
+            target = (BETWEEN[king][checkers.bit_length() - 1] | checkers) & ~own
+        else:
+            target = FULL ^ own
+            self._castling_moves(moves, king)
+
+        pinned = 0
+        pin_masks = {}
+        snipers = ((ROOK_TABLE[king][0] & (theirs[ROOK] | theirs[QUEEN]))
+                   | (BISHOP_TABLE[king][0] & (theirs[BISHOP] | theirs[QUEEN])))
+        for sniper in iter_bits(snipers):
+            blockers = BETWEEN[king][sniper] & occupied
+            if blockers & own and not blockers & (blockers - 1):
+                pinned |= blockers
+                pin_masks[blockers.bit_length() - 1] = (
+                    BETWEEN[king][sniper] | 1 << sniper)
+
+        mailbox = self.mailbox
+        empty = FULL ^ occupied
+        for src in iter_bits(own ^ king_bit):
+            kind = mailbox[src][1]
+            if kind == PAWN:
+                bit = 1 << src
+                if us == WHITE:
+                    single = (bit << 8) & empty
+                    double = ((single & RANK_3) << 8) & empty
+                else:
+                    single = (bit >> 8) & empty
+                    double = ((single & RANK_6) >> 8) & empty
+                dsts = (single | double | (PAWN_ATTACKS[us][src] & enemy)) & target
+            elif kind == KNIGHT:
+                dsts = KNIGHT_ATTACKS[src] & target
+            elif kind == BISHOP:
+                dsts = BISHOP_TABLE[src][occupied & BISHOP_MASKS[src]] & target
+            elif kind == ROOK:
+                dsts = ROOK_TABLE[src][occupied & ROOK_MASKS[src]] & target
+            else:
+                dsts = (ROOK_TABLE[src][occupied & ROOK_MASKS[src]]
+                        | BISHOP_TABLE[src][occupied & BISHOP_MASKS[src]]) & target
+            if pinned >> src & 1:
+                dsts &= pin_masks[src]
+
+            if kind == PAWN and dsts & (RANK_1 | RANK_8):
+                for dst in iter_bits(dsts):
+                    if dst >> 3 in (0, 7):
+                        for promotion in (QUEEN, ROOK, BISHOP, KNIGHT):
+                            moves.append(src | dst << 6 | promotion << 12)
+                    else:
+                        moves.append(src | dst << 6)
+            else:
+                for dst in iter_bits(dsts):
+                    moves.append(src | dst << 6)
+
+        if self.ep_square is not None:
+            ep = self.ep_square
+            captured = 1 << (ep - 8 if us == WHITE else ep + 8)
+            for src in iter_bits(PAWN_ATTACKS[them][ep] & ours[PAWN]):
+                # Replay the capture on the occupancy alone; this covers
+                # pins, checks by the captured pawn and the rank pin
+                # through both pawns in one test
+                after = (occupied ^ (1 << src) ^ captured) | (1 << ep)
+                if not self.attackers_to(king, them, after) & ~captured:
+                    moves.append(src | ep << 6)
+        return moves
+
+    def _pseudo_legal_moves(self) -> List[int]:
+        '''Every move of the side to move, for a board without its king
+        where no move can leave it in check; castling excluded'''
+        moves = []
+        for src in iter_bits(self.occupancy[self.turn]):
+            is_pawn = self.mailbox[src][1] == PAWN
+            for dst in iter_bits(self.moves_from(src)):
+                if is_pawn and dst >> 3 in (0, 7):
+                    for promotion in (QUEEN, ROOK, BISHOP, KNIGHT):
+                        moves.append(src | dst << 6 | promotion << 12)
+                else:
+                    moves.append(src | dst << 6)
+        return moves
+
+    def _castling_moves(self, moves: List[int], king: int) -> None:
+        rights = self.castling & ((WHITE_KINGSIDE | WHITE_QUEENSIDE)
+                                  if self.turn == WHITE
+                                  else (BLACK_KINGSIDE | BLACK_QUEENSIDE))
+        if not rights or king not in (4, 60):
+            return
+        them = 1 - self.turn
+        occupied = self.occupied
+        if (rights & (WHITE_KINGSIDE | BLACK_KINGSIDE)
+                and not occupied & BETWEEN[king][king + 3]
+                and not self.is_square_attacked(king + 1, them)
+                and not self.is_square_attacked(king + 2, them)):
+            moves.append(king | (king + 2) << 6)
+        if (rights & (WHITE_QUEENSIDE | BLACK_QUEENSIDE)
+                and not occupied & BETWEEN[king][king - 4]
+                and not self.is_square_attacked(king - 1, them)
+                and not self.is_square_attacked(king - 2, them)):
+            moves.append(king | (king - 2) << 6)
+
+    def king_square(self, color: int) -> Optional[int]:
+        king = self.pieces[color][KING]
+        return king.bit_length() - 1 if king else None
+
+    def is_check(self, color: Optional[int] = None) -> bool:
+        '''Whether the king of ``color`` (the side to move by default)
+        is attacked'''
+        if color is None:
+            color = self.turn
+        king = self.pieces[color][KING]
+        if not king:
+            return False  # No king found
+        return self.is_square_attacked(king.bit_length() - 1, 1 - color)
+
+    def is_checkmate(self, color: Optional[int] = None) -> bool:
+        if color is None:
+            color = self.turn
+        if not self.is_check(color):
+            return False
+
+        board = self
+        if color != self.turn:
+            board = self.copy()
+            board.turn = color
+            board.ep_square = None
+        return not board.legal_moves()
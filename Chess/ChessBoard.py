@@ -1,10 +1,38 @@
-from typing import List
+from typing import Dict, Iterator, List, Optional, Tuple
 from Piece import *
+from Bitboard import (ALL_CASTLING, BLACK_KINGSIDE, BLACK_QUEENSIDE,
+                      CASTLING_KEYS, CASTLING_MASK, EN_PASSANT_KEYS,
+                      OBJECT_PIECE_KEYS, SIDE_KEY, WHITE_KINGSIDE,
+                      WHITE_QUEENSIDE)
+from Evaluation import PHASE_WEIGHTS, SQUARE_SCORES, compute
 
+# Values of Game.outcome
+CHECKMATE = 'checkmate'
+STALEMATE = 'stalemate'
+REPETITION = 'threefold repetition'
+FIFTY_MOVES = 'fifty-move rule'
+INSUFFICIENT_MATERIAL = 'insufficient material'
 
 class Game:
     board: List[List[Piece]]
     last_move: tuple[Position, Position] = None
+    turn: str = 'white'
+    castling: int = ALL_CASTLING
+    halfmove_clock: int = 0
+    fullmove_number: int = 1
+    zobrist: int = 0
+    psqt: int = 0  # Packed piece-square score, see Evaluation
+    phase: int = 0
+    # Pieces on the board by Piece.code, and bishops on dark and light squares
+    material: List[int]
+    bishop_squares: List[int]
+    # Times each Zobrist key has been reached in the moves played so far
+    repetitions: Dict[int, int]
+    undo_stack: List[tuple]
+    # (zobrist, value) of the last position queried; see cached_moves
+    move_cache: tuple = None
+    check_cache: tuple = None
+    recorder = None  # Told of each move_piece and castle, see Record
 
     def __init__(self):
         Q = Queen
@@ -36,6 +64,116 @@ class Game:
                     piece.p = Position(x, y)
                     piece.g = self
 
+        self.turn = 'white'
+        self.castling = ALL_CASTLING
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.undo_stack = []
+        self.zobrist = self.compute_zobrist()
+        self.psqt, self.phase = compute(self.board)
+        self.material, self.bishop_squares = self.compute_material()
+        self.repetitions = {self.zobrist: 1}
+
+    @classmethod
+    def from_fen(cls, fen: str) -> "Game":
+        '''Build a game from a FEN record, creating a piece object only
+        for the occupied squares'''
+        from Fen import LETTER_PIECES, parse_fen
+
+        placement, turn, castling, ep, halfmove_clock, fullmove_number = parse_fen(fen)
+        game = cls.__new__(cls)
+        board = []
+        for y, row in enumerate(placement):
+            line = [None] * 8
+            for x, letter in enumerate(row):
+                if letter is not None:
+                    line[x] = LETTER_PIECES[letter.lower()](
+                        'white' if letter.isupper() else 'black', Position(x, y), game)
+            board.append(line)
+        game.board = board
+
+        game.turn = turn
+        game.castling = castling
+        game.halfmove_clock = halfmove_clock
+        game.fullmove_number = fullmove_number
+        game.undo_stack = []
+        # The en passant square stands in for the double push that made it
+        game.last_move = None
+        if ep is not None:
+            step = 1 if ep.y == 2 else -1
+            game.last_move = (Position(ep.x, ep.y - step), Position(ep.x, ep.y + step))
+        game.zobrist = game.compute_zobrist()
+        game.psqt, game.phase = compute(board)
+        game.material, game.bishop_squares = game.compute_material()
+        game.repetitions = {game.zobrist: 1}
+        return game
+
+    def to_fen(self) -> str:
+        from Fen import PIECE_LETTERS, format_fen
+
+        placement = [[None if piece is None else
+                      PIECE_LETTERS[type(piece)].upper() if piece.color == 'white'
+                      else PIECE_LETTERS[type(piece)]
+                      for piece in line] for line in self.board]
+        ep = None
+        if self.last_move is not None:
+            src, dst = self.last_move
+            if isinstance(self.board[dst.y][dst.x], Pawn) and abs(dst.y - src.y) == 2:
+                ep = Position(dst.x, (src.y + dst.y) // 2)
+        return format_fen(placement, self.turn, self.castling, ep,
+                          self.halfmove_clock, self.fullmove_number)
+
+    def compute_zobrist(self) -> int:
+        '''Hash the position from scratch. make_move keeps ``zobrist`` up
+        to date incrementally, so this is only needed after putting pieces
+        on the board by hand.'''
+        key = CASTLING_KEYS[self.castling] ^ self._en_passant_key()
+        if self.turn == 'black':
+            key ^= SIDE_KEY
+        for y in range(8):
+            for x in range(8):
+                piece = self.board[y][x]
+                if piece is not None:
+                    key ^= OBJECT_PIECE_KEYS[type(piece), piece.color][y * 8 + x]
+        return key
+
+    def compute_material(self) -> Tuple[List[int], List[int]]:
+        '''Count the pieces from scratch; make_move keeps ``material``
+        and ``bishop_squares`` up to date'''
+        material = [0] * 12
+        bishop_squares = [0, 0]
+        for y in range(8):
+            for x in range(8):
+                piece = self.board[y][x]
+                if piece is not None:
+                    material[piece.code] += 1
+                    if piece.kind == BISHOP:
+                        bishop_squares[(x + y) & 1] += 1
+        return material, bishop_squares
+
+    def en_passant_square(self) -> Optional[Position]:
+        '''The square a pawn of the side to move can capture en passant
+        onto, or None.  Only set when a pawn stands beside the one that
+        just made a double step, as Zobrist and Polyglot keys need.'''
+        if self.last_move is None:
+            return None
+        src, dst = self.last_move
+        pawn = self.board[dst.y][dst.x]
+        if not isinstance(pawn, Pawn) or abs(dst.y - src.y) != 2:
+            return None
+        for x in (dst.x - 1, dst.x + 1):
+            if 0 <= x <= 7:
+                piece = self.board[dst.y][x]
+                if isinstance(piece, Pawn) and piece.color != pawn.color:
+                    return Position(dst.x, (src.y + dst.y) // 2)
+        return None
+
+    def _en_passant_key(self) -> int:
+        '''Key of the en passant file, hashed only when a pawn can
+        actually make the capture'''
+        square = self.en_passant_square()
+        return 0 if square is None else EN_PASSANT_KEYS[square.x]
+
     def print(self):
         output = ''
         for line in self.board:
@@ -47,77 +185,283 @@ class Game:
             output += '\n'
         print(output, end='')
 
-    def is_check(self) -> bool:
-        king_position = None
-        for y in range(8):
-            for x in range(8):
-                piece = self.board[y][x]
-                if isinstance(piece, King):
-                    king_position = piece.p
-                    break
-            if king_position is not None:
-                break
+    def is_square_attacked(self, pos: Position, by_color: str) -> bool:
+        '''Check whether any piece of by_color attacks the square,
+        looking outward from it and stopping at the first attacker'''
+        board = self.board
 
-        if king_position is None:
-            return False  # No king found
+        for target in KNIGHT_TARGETS[pos.y][pos.x]:
+            piece = board[target.y][target.x]
+            if isinstance(piece, Knight) and piece.color == by_color:
+                return True
 
-        # Iterate through opponent's pieces and see if any can attack the king
-        for y in range(8):
-            for x in range(8):
-                piece = self.board[y][x]
-                if piece is not None and piece.color != self.board[king_position.y][king_position.x].color:
-                    possible_moves = piece.get_possible_moves()
-                    if king_position in possible_moves:
-                        return True  # King is in check
-        return False  # King is not in check
+        for target in KING_TARGETS[pos.y][pos.x]:
+            piece = board[target.y][target.x]
+            if isinstance(piece, King) and piece.color == by_color:
+                return True
+
+        # A pawn attacks diagonally forward, so look one row behind
+        pawn_y = pos.y - 1 if by_color == 'white' else pos.y + 1
+        if 0 <= pawn_y <= 7:
+            for pawn_x in (pos.x - 1, pos.x + 1):
+                if 0 <= pawn_x <= 7:
+                    piece = board[pawn_y][pawn_x]
+                    if isinstance(piece, Pawn) and piece.color == by_color:
+                        return True
+
+        for rays, sliders in ((ROOK_RAYS, (Rook, Queen)),
+                              (BISHOP_RAYS, (Bishop, Queen))):
+            for ray in rays[pos.y][pos.x]:
+                for target in ray:
+                    piece = board[target.y][target.x]
+                    if piece is not None:
+                        if isinstance(piece, sliders) and piece.color == by_color:
+                            return True
+                        break
+        return False
+
+    def find_king(self, color: str = None) -> King:
+        '''Return the king of color, or the first king on the board'''
+        for line in self.board:
+            for piece in line:
+                if piece is not None and piece.kind == KING and color in (None, piece.color):
+                    return piece
+        return None
+
+    def checked_king(self) -> King:
+        '''Return the king that is in check, looking at the side to move
+        first, or None'''
+        for color in (self.turn, 'black' if self.turn == 'white' else 'white'):
+            king = self.find_king(color)
+            enemy = 'black' if color == 'white' else 'white'
+            if king is not None and self.is_square_attacked(king.p, enemy):
+                return king
+        return None
+
+    def cached_checked_king(self) -> King:
+        '''checked_king, computed once per position'''
+        cache = self.check_cache
+        if cache is None or cache[0] != self.zobrist:
+            cache = self.check_cache = (self.zobrist, self.checked_king())
+        return cache[1]
+
+    def cached_moves(self) -> Dict[Position, List[Move]]:
+        '''Legal moves of the side to move grouped by source square.
+
+        The list is generated once per position and shared by
+        is_checkmate and move validation.  It is keyed by the
+        Zobrist key, so making any move invalidates it and taking the
+        move back finds it valid again.  Call invalidate_cache after
+        putting pieces on the board by hand.
+        '''
+        cache = self.move_cache
+        if cache is None or cache[0] != self.zobrist:
+            moves = {}
+            for move in self.legal_moves():
+                moves.setdefault(move.src, []).append(move)
+            cache = self.move_cache = (self.zobrist, moves)
+        return cache[1]
+
+    def invalidate_cache(self) -> None:
+        self.move_cache = self.check_cache = None
+
+    def is_check(self) -> bool:
+        return self.cached_checked_king() is not None
 
     def is_checkmate(self) -> bool:
         # Check if the king is in check
-        if not self.is_check():
+        king = self.cached_checked_king()
+        if king is None:
             return False
 
-        # Find the king's position
-        king_position = None
-        for y in range(8):
-            for x in range(8):
-                piece = self.board[y][x]
-                if isinstance(piece, King) and piece.color == self.board[y][x].color:
-                    king_position = piece.p
-                    break
-            if king_position is not None:
-                break
+        # Any legal move, including blocks and captures, escapes the check
+        if king.color == self.turn:
+            return not self.cached_moves()
+        return next(self.legal_moves(king.color), None) is None
 
-        # Check if the king has any legal moves to escape check
-        king = self.board[king_position.y][king_position.x]
-        for move in king.get_possible_moves():
-            if not self.move_puts_king_in_check(king_position, move):
+    def is_insufficient_material(self) -> bool:
+        '''Whether neither side has the pieces to mate: no pawns, rooks
+        or queens, and a single knight or bishop, or only bishops that
+        all stand on squares of one color'''
+        material = self.material
+        for kind in (PAWN, ROOK, QUEEN):
+            if material[kind] or material[kind + 6]:
                 return False
+        knights = material[KNIGHT] + material[KNIGHT + 6]
+        bishops = material[BISHOP] + material[BISHOP + 6]
+        return knights + bishops <= 1 or knights == 0 and 0 in self.bishop_squares
 
-        return True
+    def outcome(self) -> Optional[str]:
+        '''How the game has ended, or None while it goes on.
 
-    def move_puts_king_in_check(self, king_position: Position, dst: Position) -> bool:
-        '''Check if a move puts the king in check'''
-        src_piece = self.board[king_position.y][king_position.x]
-        dst_piece = self.board[dst.y][dst.x]
+        Checkmate and stalemate come from cached_moves, which move
+        validation shares; repetitions, the halfmove clock and material
+        are kept up to date by make_move, so no history is rescanned.'''
+        if not self.cached_moves():
+            return CHECKMATE if self.is_check() else STALEMATE
+        if self.repetitions.get(self.zobrist, 0) >= 3:
+            return REPETITION
+        if self.halfmove_clock >= 100:
+            return FIFTY_MOVES
+        if self.is_insufficient_material():
+            return INSUFFICIENT_MATERIAL
+        return None
+
+    def legal_moves(self, color: str = None) -> Iterator[Move]:
+        '''Yield every legal move of color (the side to move by default).
+
+        Checkers and pinned pieces are found once, by walking the rays out
+        of the king: a single check limits every other piece to the squares
+        that capture or block the checker, a double check leaves only king
+        moves, and a pinned piece may only move along its pin. The board
+        must not be changed while the moves are being consumed.
+        '''
+        if color is None:
+            color = self.turn
+        enemy = 'black' if color == 'white' else 'white'
+        board = self.board
+        king = self.find_king(color)
+        if king is None:
+            return
+        kx, ky = king.p.x, king.p.y
+
+        checks = 0
+        evasions = None  # squares that resolve the check, as y * 8 + x
+        pins = {}  # pinned square -> squares along its pin
+        for index, ray in enumerate(QUEEN_RAYS[ky][kx]):
+            sliders = (Bishop, Queen) if index < 4 else (Rook, Queen)
+            line = set()
+            shield = None
+            for pos in ray:
+                line.add(pos.sq)
+                piece = board[pos.y][pos.x]
+                if piece is None:
+                    continue
+                if piece.color == color:
+                    if shield is not None:
+                        break
+                    shield = pos
+                    continue
+                if isinstance(piece, sliders):
+                    if shield is None:
+                        checks += 1
+                        evasions = line
+                    else:
+                        pins[shield.sq] = line
+                break
+
+        for pos in KNIGHT_TARGETS[ky][kx]:
+            piece = board[pos.y][pos.x]
+            if isinstance(piece, Knight) and piece.color == enemy:
+                checks += 1
+                evasions = {pos.sq}
+        pawn_y = ky + 1 if color == 'white' else ky - 1
+        if 0 <= pawn_y <= 7:
+            for pawn_x in (kx - 1, kx + 1):
+                if 0 <= pawn_x <= 7:
+                    piece = board[pawn_y][pawn_x]
+                    if isinstance(piece, Pawn) and piece.color == enemy:
+                        checks += 1
+                        evasions = {pawn_y * 8 + pawn_x}
+
+        # Lift the king so squares behind it on a checking line count as
+        # attacked
+        board[ky][kx] = None
+        king_moves = [Move(king.p, dst) for dst in king.get_possible_moves()
+                      if not self.is_square_attacked(dst, enemy)]
+        board[ky][kx] = king
+        yield from king_moves
 
-        # Temporarily move the piece
-        self.board[dst.y][dst.x] = src_piece
-        self.board[king_position.y][king_position.x] = None
-        src_piece.p = dst
+        if checks > 1:
+            return
+        if checks == 0:
+            yield from self._castling_moves(king, enemy)
 
-        # Check if the king is in check after the move
-        result = self.is_check()
+        en_passant = []
+        for line in board:
+            for piece in line:
+                if piece is None or piece.color != color or piece is king:
+                    continue
+                pin = pins.get(piece.p.sq)
+                is_pawn = isinstance(piece, Pawn)
+                for dst in piece.get_possible_moves():
+                    if (is_pawn and dst.x != piece.p.x
+                            and board[dst.y][dst.x] is None):
+                        en_passant.append((piece, dst))
+                        continue
+                    index = dst.sq
+                    if evasions is not None and index not in evasions:
+                        continue
+                    if pin is not None and index not in pin:
+                        continue
+                    if is_pawn and dst.y in (0, 7):
+                        for promotion in (Queen, Rook, Bishop, Knight):
+                            yield Move(piece.p, dst, promotion)
+                    else:
+                        yield Move(piece.p, dst)
+
+        for pawn, dst in en_passant:
+            if self._en_passant_is_safe(pawn, dst, king, enemy):
+                yield Move(pawn.p, dst)
+
+    def _castling_moves(self, king: King, enemy: str) -> List[Move]:
+        if king.color == 'white':
+            kingside, queenside, row = WHITE_KINGSIDE, WHITE_QUEENSIDE, 0
+        else:
+            kingside, queenside, row = BLACK_KINGSIDE, BLACK_QUEENSIDE, 7
+        if king.p != Position(4, row):
+            return []
+
+        moves = []
+        board = self.board
+        for right, rook_x, path, crossed in ((kingside, 7, (5, 6), (5, 6)),
+                                             (queenside, 0, (1, 2, 3), (3, 2))):
+            rook = board[row][rook_x]
+            if (self.castling & right and isinstance(rook, Rook)
+                    and rook.color == king.color
+                    and all(board[row][x] is None for x in path)
+                    and not any(self.is_square_attacked(Position(x, row), enemy)
+                                for x in crossed)):
+                moves.append(Move(king.p, Position(crossed[1], row)))
+        return moves
+
+    def _en_passant_is_safe(self, pawn: Pawn, dst: Position, king: King,
+                            enemy: str) -> bool:
+        '''Play the en passant capture on the board and check whether it
+        leaves the king attacked'''
+        board = self.board
+        src = pawn.p
+        captured = board[src.y][dst.x]
+        board[dst.y][dst.x] = pawn
+        board[src.y][src.x] = None
+        board[src.y][dst.x] = None
+        safe = not self.is_square_attacked(king.p, enemy)
+        board[src.y][dst.x] = captured
+        board[src.y][src.x] = pawn
+        board[dst.y][dst.x] = None
+        return safe
 
-        # Move the piece back
-        self.board[king_position.y][king_position.x] = src_piece
-        self.board[dst.y][dst.x] = dst_piece
-        src_piece.p = king_position
+    def move_puts_king_in_check(self, king_position: Position, dst: Position) -> bool:
+        '''Check if a move puts the king in check'''
+        piece = self.board[king_position.y][king_position.x]
+        enemy = 'black' if piece.color == 'white' else 'white'
+
+        self.make_move(Move(king_position, dst))
+        king = self.find_king(piece.color)
+        result = king is not None and self.is_square_attacked(king.p, enemy)
+        self.unmake_move()
 
         return result
 
-    def move_piece(self, src: Position, dst: Position) -> None:
+    def move_piece(self, src: Position, dst: Position,
+                   promotion: type = Queen) -> None:
         '''Move the piece to the destination, 
-        if the move is not valid, raise an exception'''
+        if the move is not valid, raise an exception.
+
+        A move of the side to move is checked with is_legal, so it may
+        not leave its own king in check; a piece of the other side
+        is only checked against its own moves, as when setting up a
+        position.'''
 
         if not (0 <= src.x <= 7 and 0 <= src.y <= 7 and
                 0 <= dst.x <= 7 and 0 <= dst.y <= 7):
@@ -126,21 +470,183 @@ class Game:
         piece = self.board[src.y][src.x]
         if piece is None:
             raise RuntimeError("No piece at the source position")
-        valid_positions = piece.get_possible_moves()
-        if dst not in valid_positions:
+        if isinstance(piece, King) and abs(dst.x - src.x) == 2:
+            self.castle(src, dst)
+            return
+        if piece.color == self.turn:
+            if not self.is_legal(src, dst):
+                raise RuntimeError("Invalid move")
+        elif not piece.can_move_to(dst):
             raise RuntimeError("Invalid move")
-        self.board[dst.y][dst.x] = piece
-        self.board[src.y][src.x] = None
+        move = Move(src, dst, promotion if isinstance(piece, Pawn) and dst.y in (0, 7) else None)
+        self.make_move(move)
+        if self.recorder is not None:
+            self.recorder.record(self, move)
+
+    def is_legal(self, src: Position, dst: Position) -> bool:
+        '''Whether the side to move may play src to dst.
+
+        Answered from the cached move list when this position has one;
+        otherwise only this move is looked at, its path with
+        Piece.can_move_to and then its king safety.'''
+        if not (0 <= src.x <= 7 and 0 <= src.y <= 7 and
+                0 <= dst.x <= 7 and 0 <= dst.y <= 7):
+            return False
+        piece = self.board[src.y][src.x]
+        if piece is None or piece.color != self.turn:
+            return False
+        cache = self.move_cache
+        if cache is not None and cache[0] == self.zobrist:
+            return any(move.dst is dst for move in cache[1].get(src, ()))
+        if isinstance(piece, King) and abs(dst.x - src.x) == 2:
+            return any(move.dst is dst for move in self.cached_moves().get(src, ()))
+        return piece.can_move_to(dst) and self._leaves_king_safe(piece, dst)
+
+    def _leaves_king_safe(self, piece: Piece, dst: Position) -> bool:
+        '''Play piece to dst on the board alone and check whether its
+        king is attacked afterwards; not for castling'''
+        board = self.board
+        src = piece.p
+        enemy = 'black' if piece.color == 'white' else 'white'
+        captured = board[dst.y][dst.x]
+        if isinstance(piece, King):
+            king_position = dst
+        else:
+            king = self.find_king(piece.color)
+            if king is None:
+                return True
+            if isinstance(piece, Pawn) and captured is None and dst.x != src.x:
+                return self._en_passant_is_safe(piece, dst, king, enemy)
+            king_position = king.p
+        board[dst.y][dst.x] = piece
+        board[src.y][src.x] = None
+        safe = not self.is_square_attacked(king_position, enemy)
+        board[src.y][src.x] = piece
+        board[dst.y][dst.x] = captured
+        return safe
+
+    def make_move(self, move: Move) -> None:
+        '''Play a move without validating it, handling en passant,
+        castling and promotion, and push what unmake_move needs to take
+        it back'''
+        src, dst = move.src, move.dst
+        board = self.board
+        piece = board[src.y][src.x]
+        captured = board[dst.y][dst.x]
+        is_pawn = isinstance(piece, Pawn)
+
+        # Hash out the state the move replaces; the pieces are swapped
+        # below as they move
+        key = self.zobrist ^ CASTLING_KEYS[self.castling] ^ self._en_passant_key()
+        if self.turn == 'black':
+            key ^= SIDE_KEY
+
+        if is_pawn and dst.x != src.x and captured is None:
+            # En passant: the captured pawn sits beside the source square
+            captured = board[src.y][dst.x]
+            board[src.y][dst.x] = None
+
+        self.undo_stack.append((move, piece, captured, self.castling,
+                                self.last_move, self.halfmove_clock,
+                                is_pawn and piece.has_moved, self.zobrist,
+                                self.psqt, self.phase))
+
+        piece_keys = OBJECT_PIECE_KEYS[type(piece), piece.color]
+        key ^= piece_keys[src.sq]
+        scores = SQUARE_SCORES[type(piece), piece.color]
+        psqt = self.psqt - scores[src.sq]
+        if captured is not None:
+            captured_sq = captured.p.sq
+            key ^= OBJECT_PIECE_KEYS[type(captured), captured.color][captured_sq]
+            psqt -= SQUARE_SCORES[type(captured), captured.color][captured_sq]
+            self.phase -= PHASE_WEIGHTS[type(captured)]
+            self.material[captured.code] -= 1
+            if captured.kind == BISHOP:
+                self.bishop_squares[captured.p.x + captured.p.y & 1] -= 1
+
+        board[dst.y][dst.x] = piece
+        board[src.y][src.x] = None
         piece.p = dst
-        if isinstance(piece, Pawn) and abs(dst.y - src.y) == 2:
-            piece.has_moved = True
-        if isinstance(piece, Pawn) and piece.can_be_en_passant():
-            if piece.color == 'white':
-                self.board[dst.y - 1][dst.x] = None
-            else:
-                self.board[dst.y + 1][dst.x] = None
+        if is_pawn:
+            if abs(dst.y - src.y) == 2:
+                piece.has_moved = True
+            if dst.y in (0, 7):
+                promoted = move.promotion or Queen
+                board[dst.y][dst.x] = promoted(piece.color, dst, self)
+                self.material[piece.code] -= 1
+                self.material[board[dst.y][dst.x].code] += 1
+                if promoted is Bishop:
+                    self.bishop_squares[dst.x + dst.y & 1] += 1
+                piece_keys = OBJECT_PIECE_KEYS[promoted, piece.color]
+                scores = SQUARE_SCORES[promoted, piece.color]
+                self.phase += PHASE_WEIGHTS[promoted]
+        elif isinstance(piece, King) and abs(dst.x - src.x) == 2:
+            rook_x, rook_dst_x = (7, 5) if dst.x > src.x else (0, 3)
+            rook = board[src.y][rook_x]
+            board[src.y][rook_dst_x] = rook
+            board[src.y][rook_x] = None
+            rook.p = Position(rook_dst_x, src.y)
+            rook_keys = OBJECT_PIECE_KEYS[Rook, piece.color]
+            key ^= rook_keys[src.y * 8 + rook_x] ^ rook_keys[src.y * 8 + rook_dst_x]
+            rook_scores = SQUARE_SCORES[Rook, piece.color]
+            psqt += rook_scores[src.y * 8 + rook_dst_x] - rook_scores[src.y * 8 + rook_x]
+        key ^= piece_keys[dst.sq]
+        self.psqt = psqt + scores[dst.sq]
+
+        self.castling &= CASTLING_MASK[src.sq] & CASTLING_MASK[dst.sq]
+        self.halfmove_clock = 0 if is_pawn or captured is not None else self.halfmove_clock + 1
+        if piece.color == 'black':
+            self.fullmove_number += 1
+        self.turn = 'black' if piece.color == 'white' else 'white'
         self.last_move = (src, dst)
 
+        key ^= CASTLING_KEYS[self.castling] ^ self._en_passant_key()
+        if self.turn == 'black':
+            key ^= SIDE_KEY
+        self.zobrist = key
+        self.repetitions[key] = self.repetitions.get(key, 0) + 1
+
+    def unmake_move(self) -> Move:
+        '''Take back the last move played with make_move and return it'''
+        count = self.repetitions.get(self.zobrist, 0) - 1
+        if count > 0:
+            self.repetitions[self.zobrist] = count
+        else:
+            self.repetitions.pop(self.zobrist, None)
+        (move, piece, captured, self.castling, self.last_move,
+         self.halfmove_clock, has_moved, self.zobrist,
+         self.psqt, self.phase) = self.undo_stack.pop()
+        src, dst = move.src, move.dst
+        board = self.board
+
+        promoted = board[dst.y][dst.x]
+        if promoted is not piece:
+            self.material[promoted.code] -= 1
+            self.material[piece.code] += 1
+            if promoted.kind == BISHOP:
+                self.bishop_squares[dst.x + dst.y & 1] -= 1
+        board[dst.y][dst.x] = None
+        board[src.y][src.x] = piece
+        piece.p = src
+        if captured is not None:
+            board[captured.p.y][captured.p.x] = captured
+            self.material[captured.code] += 1
+            if captured.kind == BISHOP:
+                self.bishop_squares[captured.p.x + captured.p.y & 1] += 1
+        if isinstance(piece, Pawn):
+            piece.has_moved = has_moved
+        elif isinstance(piece, King) and abs(dst.x - src.x) == 2:
+            rook_x, rook_dst_x = (7, 5) if dst.x > src.x else (0, 3)
+            rook = board[src.y][rook_dst_x]
+            board[src.y][rook_x] = rook
+            board[src.y][rook_dst_x] = None
+            rook.p = Position(rook_x, src.y)
+
+        if piece.color == 'black':
+            self.fullmove_number -= 1
+        self.turn = piece.color
+        return move
+
     def is_empty(self, pos: Position) -> bool:
         return self.board[pos.y][pos.x] is None
 
@@ -175,19 +681,26 @@ class Game:
         # Check if the path between the king and rook is clear
         if dst.x > src.x:  # King side castle
             rook_src = Position(7, src.y)
-            rook_dst = Position(5, src.y)
         else:  # Queen side castle
             rook_src = Position(0, src.y)
-            rook_dst = Position(3, src.y)
 
-        if not self.is_empty(rook_dst):
+        rook = self.board[rook_src.y][rook_src.x]
+        if not isinstance(rook, Rook) or rook.color != king.color:
+            raise RuntimeError("Invalid castling move")
+        for x in range(min(src.x, rook_src.x) + 1, max(src.x, rook_src.x)):
+            if not self.is_empty(Position(x, src.y)):
+                raise RuntimeError("Invalid castling move")
+        if king.color == self.turn and not self.is_legal(src, dst):
+            # Out of, through or into check, or without the right
             raise RuntimeError("Invalid castling move")
 
-        # Move the king
-        self.move_piece(src, dst)
-        # Move the rook
-        self.move_piece(rook_src, rook_dst)
+        # Move the king and the rook
+        move = Move(src, dst)
+        self.make_move(move)
+        if self.recorder is not None:
+            self.recorder.record(self, move)
 
 
-g = Game()
-g.print()
+if __name__ == '__main__':
+    g = Game()
+    g.print()
@@ -0,0 +1,368 @@
+'''Alpha-beta search over ``Game``.
+
+``Engine.search`` runs negamax alpha-beta with iterative deepening, so a
+best move is always on hand when the time or node budget runs out:
+
+    engine = Engine()
+    result = engine.search(game, time_limit=0.5)
+    game.make_move(result.move)
+
+Moves are searched transposition table move first, then captures by
+most valuable victim / least valuable attacker, then killer moves, then
+quiet moves by history score.  Leaves are resolved by a quiescence search
+over captures and queen promotions.  With an opening ``book`` or endgame
+``tablebases``, the positions they know are answered without searching.
+
+    python Engine.py --fen "<FEN>" --time 2
+'''
+import argparse
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+from ChessBoard import Game
+from Evaluation import evaluate
+from Fen import START_FEN
+from Piece import *
+from Tablebase import LOSS, WIN, Tablebases
+from TranspositionTable import EXACT, LOWER, UPPER, TranspositionTable
+
+PIECE_VALUES = {Pawn: 100, Knight: 320, Bishop: 330, Rook: 500, Queen: 900, King: 0}
+
+MATE = 30000
+MATE_BOUND = MATE - 1000  # Scores beyond this are forced mates
+INFINITY = MATE + 1
+MAX_PLY = 64
+CHECK_INTERVAL = 1024  # Nodes between clock reads
+
+TT_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 20
+KILLER_SCORE = 1 << 19
+
+
+def encode(move: Move) -> int:
+    '''Pack a Move into the 16 bits the transposition table keeps'''
+    return move.encode()
+
+
+def _score_to_tt(score: int, ply: int) -> int:
+    # Mate scores are stored relative to the node, not the root
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def _score_from_tt(score: int, ply: int) -> int:
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
+
+
+class _Stopped(Exception):
+    '''Unwinds the search when the budget runs out'''
+
+
+@dataclass
+class SearchResult:
+    move: Optional[Move]
+    score: int  # Centipawns for the side to move; +-(MATE - plies) for mates
+    depth: int  # Deepest completed iteration
+    nodes: int = 0
+    seconds: float = 0.0
+    pv: List[Move] = field(default_factory=list)
+
+
+class Engine:
+    '''Iterative deepening alpha-beta searcher.
+
+    ``evaluate`` scores a quiet position for the side to move.  The
+    transposition table is kept between searches, so successive moves of
+    one game reuse earlier work.  ``book`` is an ``OpeningBook`` or
+    anything else whose ``choose(game)`` returns a move or None, and
+    ``tablebases`` a ``Tablebases``.
+    '''
+
+    def __init__(self, tt: TranspositionTable = None,
+                 evaluate: Callable[[Game], int] = evaluate, book=None,
+                 tablebases=None):
+        self.tt = tt if tt is not None else TranspositionTable()
+        self.evaluate = evaluate
+        self.book = book
+        self.tablebases = tablebases
+        self.nodes = 0
+        self.next_check = 0
+        self.node_limit = None
+        self.deadline = None
+        self.killers = []
+        self.history = {}
+        self.root_best = None
+        self.stop_event = None  # Set from another process to stop a search
+
+    def stop(self) -> None:
+        '''Make a running search return at the next node'''
+        self.next_check = 0
+        self.deadline = 0
+
+    def search(self, game: Game, max_depth: int = MAX_PLY,
+               time_limit: float = None, node_limit: int = None,
+               info: Callable[[SearchResult], None] = None,
+               start_depth: int = 1) -> SearchResult:
+        '''Search the position of game and return the best move found
+        within the budget.
+
+        The search stops after max_depth plies, once time_limit seconds
+        or node_limit nodes are spent, or when stop is called; the result
+        of an unfinished iteration is used when it has already improved
+        on the previous one.  info is called after every completed
+        iteration.  Iterations start at start_depth, which lets parallel
+        helpers search ahead of each other.  game is left as it was found.
+        A book or tablebase move is returned at once with depth 0.
+        '''
+        start = time.perf_counter()
+        if self.book is not None:
+            move = self.book.choose(game)
+            if move is not None:
+                return SearchResult(move, 0, 0, 0, time.perf_counter() - start, [move])
+        if self.tablebases is not None:
+            found = self.tablebases.best_move(game)
+            if found is not None:
+                move, result, distance = found
+                score = {WIN: MATE - distance, LOSS: distance - MATE}.get(result, 0)
+                return SearchResult(move, score, 0, 0, time.perf_counter() - start, [move])
+        self.deadline = start + time_limit if time_limit is not None else None
+        self.node_limit = node_limit
+        self.nodes = 0
+        self.next_check = min(CHECK_INTERVAL, node_limit or CHECK_INTERVAL)
+        self.killers = [[0, 0] for _ in range(MAX_PLY + 1)]
+        self.history = {'white': [0] * 4096, 'black': [0] * 4096}
+        self.tt.new_search()
+
+        moves = self._order(game, list(game.legal_moves()), 0, 0)
+        if not moves:
+            return SearchResult(None, -MATE if game.is_check() else 0, 0)
+        result = SearchResult(moves[0], 0, 0)
+        root_ply = len(game.undo_stack)
+
+        for depth in range(start_depth, max_depth + 1):
+            self.root_best = None
+            try:
+                score, move = self._root(game, moves, depth)
+            except _Stopped:
+                while len(game.undo_stack) > root_ply:
+                    game.unmake_move()
+                if self.root_best is not None:
+                    result.move, result.score = self.root_best
+                    result.pv = [result.move]
+                break
+            result = SearchResult(move, score, depth, self.nodes,
+                                  time.perf_counter() - start, self._pv(game, depth))
+            if info is not None:
+                info(result)
+            if abs(score) > MATE_BOUND and MATE - abs(score) <= depth:
+                break  # A shorter mate cannot turn up deeper
+            if time_limit is not None and result.seconds > time_limit / 2:
+                break  # The next iteration would not finish in time
+
+        result.nodes = self.nodes
+        result.seconds = time.perf_counter() - start
+        return result
+
+    def _root(self, game: Game, moves: List[Move], depth: int) -> tuple:
+        alpha, beta = -INFINITY, INFINITY
+        best = moves[0]
+        for move in moves:
+            game.make_move(move)
+            score = -self._negamax(game, depth - 1, -beta, -alpha, 1)
+            game.unmake_move()
+            if score > alpha:
+                alpha, best = score, move
+                self.root_best = move, score
+        # Search the best move first on the next iteration
+        moves.remove(best)
+        moves.insert(0, best)
+        self.tt.store(game.zobrist, depth, _score_to_tt(alpha, 0), EXACT, encode(best))
+        return alpha, best
+
+    def _negamax(self, game: Game, depth: int, alpha: int, beta: int, ply: int) -> int:
+        self._count()
+        if self._is_draw(game):
+            return 0
+        if depth <= 0 or ply >= MAX_PLY:
+            return self._quiesce(game, alpha, beta, ply)
+
+        key = game.zobrist
+        tt_move = 0
+        entry = self.tt.probe(key)
+        if entry is not None:
+            entry_depth, score, bound, tt_move = entry
+            if entry_depth >= depth:
+                score = _score_from_tt(score, ply)
+                if (bound == EXACT or bound == LOWER and score >= beta
+                        or bound == UPPER and score <= alpha):
+                    return score
+
+        moves = list(game.legal_moves())
+        if not moves:
+            return -MATE + ply if game.is_check() else 0
+
+        best_move = 0
+        bound = UPPER
+        for move in self._order(game, moves, tt_move, ply):
+            game.make_move(move)
+            score = -self._negamax(game, depth - 1, -beta, -alpha, ply + 1)
+            game.unmake_move()
+            if score > alpha:
+                alpha = score
+                best_move = encode(move)
+                bound = EXACT
+                if alpha >= beta:
+                    bound = LOWER
+                    if not self._is_capture(game, move):
+                        self._reward(game, move, best_move, depth, ply)
+                    break
+        self.tt.store(key, depth, _score_to_tt(alpha, ply), bound, best_move)
+        return alpha
+
+    def _quiesce(self, game: Game, alpha: int, beta: int, ply: int) -> int:
+        self._count()
+        stand_pat = self.evaluate(game)
+        if stand_pat >= beta:
+            return beta
+        alpha = max(alpha, stand_pat)
+        if ply >= MAX_PLY:
+            return alpha
+
+        captures = [move for move in game.legal_moves()
+                    if move.promotion is Queen
+                    or move.promotion is None and self._is_capture(game, move)]
+        for move in self._order(game, captures, 0, ply):
+            game.make_move(move)
+            score = -self._quiesce(game, -beta, -alpha, ply + 1)
+            game.unmake_move()
+            if score >= beta:
+                return beta
+            alpha = max(alpha, score)
+        return alpha
+
+    def _order(self, game: Game, moves: List[Move], tt_move: int, ply: int) -> List[Move]:
+        board = game.board
+        killers = self.killers[ply] if self.killers else ()
+        history = self.history.get(game.turn)
+
+        def score(move: Move) -> int:
+            code = encode(move)
+            if code == tt_move:
+                return TT_MOVE_SCORE
+            src, dst = move.src, move.dst
+            piece = board[src.y][src.x]
+            victim = board[dst.y][dst.x]
+            if victim is not None or isinstance(piece, Pawn) and src.x != dst.x:
+                victim_value = PIECE_VALUES[type(victim)] if victim is not None else 100
+                return CAPTURE_SCORE + 10 * victim_value - PIECE_VALUES[type(piece)]
+            if move.promotion is not None:
+                return CAPTURE_SCORE + PIECE_VALUES[move.promotion]
+            if code in killers:
+                return KILLER_SCORE - killers.index(code)
+            return history[code & 0xFFF] if history else 0
+
+        return sorted(moves, key=score, reverse=True)
+
+    def _reward(self, game: Game, move: Move, code: int, depth: int, ply: int) -> None:
+        '''Remember a quiet move that caused a beta cutoff'''
+        killers = self.killers[ply]
+        if killers[0] != code:
+            killers[1] = killers[0]
+            killers[0] = code
+        self.history[game.turn][code & 0xFFF] += depth * depth
+
+    @staticmethod
+    def _is_capture(game: Game, move: Move) -> bool:
+        src, dst = move.src, move.dst
+        return (game.board[dst.y][dst.x] is not None
+                or isinstance(game.board[src.y][src.x], Pawn) and src.x != dst.x)
+
+    @staticmethod
+    def _is_draw(game: Game) -> bool:
+        '''Fifty-move rule, or a repetition of a position reached since
+        the last capture or pawn move'''
+        if game.halfmove_clock >= 100:
+            return True
+        stack = game.undo_stack
+        # Entries keep the key before their move; the same side was to
+        # move two, four, ... plies ago
+        for index in range(len(stack) - 2, max(len(stack) - game.halfmove_clock, 0) - 1, -2):
+            if stack[index][7] == game.zobrist:
+                return True
+        return False
+
+    def _count(self) -> None:
+        self.nodes += 1
+        if self.nodes >= self.next_check:
+            if (self.deadline is not None and time.perf_counter() >= self.deadline
+                    or self.node_limit is not None and self.nodes >= self.node_limit
+                    or self.stop_event is not None and self.stop_event.is_set()):
+                raise _Stopped
+            self.next_check = self.nodes + CHECK_INTERVAL
+            if self.node_limit is not None:
+                self.next_check = min(self.next_check, self.node_limit)
+
+    def _pv(self, game: Game, depth: int) -> List[Move]:
+        '''Follow transposition table moves from the root'''
+        pv = []
+        seen = set()
+        while len(pv) < depth and game.zobrist not in seen:
+            seen.add(game.zobrist)
+            entry = self.tt.probe(game.zobrist)
+            move = None
+            if entry is not None and entry[3]:
+                move = next((m for m in game.legal_moves() if encode(m) == entry[3]), None)
+            if move is None:
+                break
+            game.make_move(move)
+            pv.append(move)
+        for _ in pv:
+            game.unmake_move()
+        return pv
+
+
+def format_score(score: int) -> str:
+    if abs(score) > MATE_BOUND:
+        plies = MATE - abs(score)
+        return f"mate {(plies + 1) // 2 if score > 0 else -((plies + 1) // 2)}"
+    return f"cp {score}"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Search a position for the best move")
+    parser.add_argument('--fen', default=START_FEN)
+    parser.add_argument('--depth', type=int, default=MAX_PLY)
+    parser.add_argument('--time', type=float, default=None, help="seconds to search")
+    parser.add_argument('--nodes', type=int, default=None, help="nodes to search")
+    parser.add_argument('--book', help="Polyglot opening book to play from")
+    parser.add_argument('--tablebases', help="directory of endgame tables")
+    args = parser.parse_args(argv)
+    if args.time is None and args.nodes is None and args.depth == MAX_PLY:
+        args.time = 5.0
+
+    def info(result: SearchResult) -> None:
+        print(f"depth {result.depth} score {format_score(result.score)} "
+              f"nodes {result.nodes} time {result.seconds * 1000:.0f} "
+              f"pv {' '.join(map(str, result.pv))}")
+
+    book = None
+    if args.book:
+        from Book import OpeningBook
+        book = OpeningBook(args.book)
+    tablebases = Tablebases(args.tablebases) if args.tablebases else None
+    engine = Engine(book=book, tablebases=tablebases)
+    result = engine.search(Game.from_fen(args.fen), args.depth, args.time, args.nodes, info)
+    print(f"bestmove {result.move if result.move is not None else '(none)'}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
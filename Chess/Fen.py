@@ -0,0 +1,108 @@
+'''Forsyth-Edwards Notation (FEN) parsing.
+
+A FEN record has six space-separated fields: piece placement from rank 8
+down to rank 1, side to move, castling rights, en passant target square,
+halfmove clock and fullmove number, e.g. the starting position::
+
+    rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1
+'''
+from typing import List, Optional
+from Piece import *
+from Bitboard import (BLACK_KINGSIDE, BLACK_QUEENSIDE, WHITE_KINGSIDE,
+                      WHITE_QUEENSIDE)
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+CASTLING_LETTERS = (('K', WHITE_KINGSIDE), ('Q', WHITE_QUEENSIDE),
+                    ('k', BLACK_KINGSIDE), ('q', BLACK_QUEENSIDE))
+
+# FEN letter of each piece class; upper case marks white
+PIECE_LETTERS = {Pawn: 'p', Knight: 'n', Bishop: 'b', Rook: 'r', Queen: 'q',
+                 King: 'k'}
+LETTER_PIECES = {letter: cls for cls, letter in PIECE_LETTERS.items()}
+
+
+def parse_fen(fen: str) -> tuple[List[List[Optional[str]]], str, int,
+                                 Optional[Position], int, int]:
+    '''Split a FEN record into (placement, turn, castling, en passant,
+    halfmove clock, fullmove number).
+
+    ``placement[y][x]`` is the FEN letter of the piece on ``Position(x, y)``
+    (upper case for white) or None.  The clocks default to 0 and 1 when
+    the record omits them.
+    '''
+    fields = fen.split()
+    if len(fields) == 4:
+        fields += ['0', '1']
+    if len(fields) != 6:
+        raise ValueError(f"Invalid FEN: {fen!r}")
+    board, side, rights, ep, halfmove, fullmove = fields
+
+    rows = board.split('/')
+    if len(rows) != 8:
+        raise ValueError(f"Invalid FEN placement: {board!r}")
+    placement = []
+    for row in reversed(rows):
+        line = []
+        for letter in row:
+            if letter.isdigit():
+                line.extend([None] * int(letter))
+            elif letter.lower() in 'pnbrqk':
+                line.append(letter)
+            else:
+                raise ValueError(f"Invalid FEN piece: {letter!r}")
+        if len(line) != 8:
+            raise ValueError(f"Invalid FEN rank: {row!r}")
+        placement.append(line)
+
+    if side not in ('w', 'b'):
+        raise ValueError(f"Invalid FEN side to move: {side!r}")
+    turn = 'white' if side == 'w' else 'black'
+
+    castling = 0
+    if rights != '-':
+        for letter in rights:
+            right = dict(CASTLING_LETTERS).get(letter)
+            if right is None:
+                raise ValueError(f"Invalid FEN castling rights: {rights!r}")
+            castling |= right
+
+    en_passant = None
+    if ep != '-':
+        if len(ep) != 2 or ep[0] not in 'abcdefgh' or ep[1] not in '36':
+            raise ValueError(f"Invalid FEN en passant square: {ep!r}")
+        en_passant = Position(ord(ep[0]) - ord('a'), int(ep[1]) - 1)
+
+    try:
+        return placement, turn, castling, en_passant, int(halfmove), int(fullmove)
+    except ValueError:
+        raise ValueError(f"Invalid FEN move counters: {halfmove!r} {fullmove!r}")
+
+
+def format_fen(placement: List[List[Optional[str]]], turn: str,
+               castling: int, en_passant: Optional[Position],
+               halfmove_clock: int, fullmove_number: int) -> str:
+    '''Inverse of parse_fen'''
+    rows = []
+    for line in reversed(placement):
+        row = ''
+        empty = 0
+        for letter in line:
+            if letter is None:
+                empty += 1
+                continue
+            if empty:
+                row += str(empty)
+                empty = 0
+            row += letter
+        if empty:
+            row += str(empty)
+        rows.append(row)
+
+    rights = ''.join(letter for letter, right in CASTLING_LETTERS
+                     if castling & right) or '-'
+    ep = '-'
+    if en_passant is not None:
+        ep = 'abcdefgh'[en_passant.x] + str(en_passant.y + 1)
+    return ' '.join(('/'.join(rows), 'w' if turn == 'white' else 'b', rights,
+                     ep, str(halfmove_clock), str(fullmove_number)))
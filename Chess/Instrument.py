@@ -0,0 +1,192 @@
+'''Opt-in call counters, timings and latency histograms for the hot paths.
+
+Nothing is measured until ``enable`` is called.  It replaces the
+instrumented methods on their classes with counting wrappers, and
+``disable`` puts the originals back, so instrumentation costs nothing
+at all while it is off.
+
+    Instrument.enable()
+    with Instrument.scope('move'):
+        game.move_piece(src, dst)
+    print(Instrument.prometheus_text())
+    Instrument.disable()
+
+Each function gets a call count, the total seconds spent in it
+(including the functions it calls) and a histogram of call durations.
+A ``scope`` also records how many calls of each function happened
+inside it, so one ``move_piece`` or ``is_checkmate`` can be broken down
+into the work it caused.  Generator functions are counted but not
+timed, as their time is spread over the loop that consumes them.
+``Position`` is interned, so its count is of lookups, not allocations.
+'''
+import bisect
+import inspect
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Sequence, Tuple
+from ChessBoard import Game
+from Piece import *
+
+# Upper bounds of the histogram buckets, in seconds
+BUCKETS = (1e-6, 5e-6, 1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 1e-2, 5e-2, 0.1, 0.5, 1.0)
+
+DEFAULT_TARGETS = [(Game, name) for name in (
+    'move_piece', 'castle', 'make_move', 'unmake_move', 'is_check', 'is_checkmate',
+    'checked_king', 'cached_moves', 'legal_moves', 'is_square_attacked',
+    'move_puts_king_in_check', 'find_king', 'is_legal')]
+DEFAULT_TARGETS += [(cls, 'get_possible_moves') for cls in PIECE_CLASSES]
+DEFAULT_TARGETS.append((Piece, 'can_move_to'))
+DEFAULT_TARGETS.append((Position, '__new__'))
+
+
+@dataclass
+class Stat:
+    calls: int = 0
+    seconds: float = 0.0
+    counts: List[int] = field(default_factory=lambda: [0] * (len(BUCKETS) + 1))
+
+    def add(self, seconds: float) -> None:
+        self.calls += 1
+        self.seconds += seconds
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+
+
+@dataclass
+class ScopeStat(Stat):
+    calls_by_function: Dict[str, int] = field(default_factory=dict)
+
+
+_stats: Dict[str, Stat] = {}
+_scopes: Dict[str, ScopeStat] = {}
+_originals: List[Tuple[type, str, object]] = []
+
+
+def _name(owner: type, name: str) -> str:
+    return f"{owner.__name__}.{name}"
+
+
+def _wrap(function, stat: Stat):
+    if inspect.isgeneratorfunction(function):
+        def counted(*args, **kwargs):
+            stat.calls += 1
+            return function(*args, **kwargs)
+        return counted
+
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            stat.add(time.perf_counter() - start)
+    return timed
+
+
+def enable(targets: Sequence[Tuple[type, str]] = None) -> None:
+    '''Instrument the (class, method name) pairs of targets, by default
+    the move generation and check detection methods of Game and the
+    pieces'''
+    for owner, name in DEFAULT_TARGETS if targets is None else targets:
+        if any(o is owner and n == name for o, n, _ in _originals):
+            continue
+        original = owner.__dict__[name]
+        stat = _stats.setdefault(_name(owner, name), Stat())
+        if isinstance(original, (staticmethod, classmethod)):
+            wrapper = type(original)(_wrap(original.__func__, stat))
+        else:
+            wrapper = _wrap(original, stat)
+        type.__setattr__(owner, name, wrapper)
+        _originals.append((owner, name, original))
+
+
+def disable() -> None:
+    '''Restore every instrumented method; the figures are kept'''
+    while _originals:
+        owner, name, original = _originals.pop()
+        type.__setattr__(owner, name, original)
+
+
+def enabled() -> bool:
+    return bool(_originals)
+
+
+def reset() -> None:
+    '''Zero the figures.  The installed wrappers hold on to their Stat
+    objects, so those are cleared in place.'''
+    for stat in _stats.values():
+        stat.calls, stat.seconds = 0, 0.0
+        stat.counts = [0] * (len(BUCKETS) + 1)
+    _scopes.clear()
+
+
+@contextmanager
+def scope(label: str) -> Iterator[None]:
+    '''Time the block and count the calls made in it under label; does
+    nothing while instrumentation is off'''
+    if not _originals:
+        yield
+        return
+    before = {name: stat.calls for name, stat in _stats.items()}
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stat = _scopes.setdefault(label, ScopeStat())
+        stat.add(time.perf_counter() - start)
+        for name, function_stat in _stats.items():
+            calls = function_stat.calls - before.get(name, 0)
+            if calls:
+                stat.calls_by_function[name] = stat.calls_by_function.get(name, 0) + calls
+
+
+def snapshot() -> dict:
+    '''The figures so far, as plain data'''
+    def stat_dict(stat: Stat) -> dict:
+        return {'calls': stat.calls, 'seconds': stat.seconds,
+                'buckets': dict(zip(BUCKETS + (float('inf'),), stat.counts))}
+
+    return {'functions': {name: stat_dict(stat) for name, stat in _stats.items()},
+            'scopes': {label: {**stat_dict(stat), 'calls_by_function': dict(stat.calls_by_function)}
+                       for label, stat in _scopes.items()}}
+
+
+def _histogram(lines: List[str], metric: str, labels: str, stat: Stat) -> None:
+    total = 0
+    for bound, count in zip(BUCKETS + (float('inf'),), stat.counts):
+        total += count
+        le = '+Inf' if bound == float('inf') else repr(bound)
+        lines.append(f'{metric}_bucket{{{labels},le="{le}"}} {total}')
+    lines.append(f'{metric}_sum{{{labels}}} {stat.seconds!r}')
+    lines.append(f'{metric}_count{{{labels}}} {stat.calls}')
+
+
+def prometheus_text() -> str:
+    '''The figures in the Prometheus text exposition format'''
+    lines = ['# HELP chess_calls_total Calls of each instrumented function.',
+             '# TYPE chess_calls_total counter']
+    for name, stat in sorted(_stats.items()):
+        lines.append(f'chess_calls_total{{function="{name}"}} {stat.calls}')
+    lines += ['# HELP chess_call_seconds Duration of each instrumented function call.',
+              '# TYPE chess_call_seconds histogram']
+    for name, stat in sorted(_stats.items()):
+        _histogram(lines, 'chess_call_seconds', f'function="{name}"', stat)
+    lines += ['# HELP chess_scope_seconds Duration of each scope.',
+              '# TYPE chess_scope_seconds histogram']
+    for label, stat in sorted(_scopes.items()):
+        _histogram(lines, 'chess_scope_seconds', f'scope="{label}"', stat)
+    lines += ['# HELP chess_scope_calls_total Function calls made inside each scope.',
+              '# TYPE chess_scope_calls_total counter']
+    for label, stat in sorted(_scopes.items()):
+        for name, calls in sorted(stat.calls_by_function.items()):
+            lines.append(f'chess_scope_calls_total{{scope="{label}",function="{name}"}} {calls}')
+    return '\n'.join(lines) + '\n'
+
+
+def write_prometheus(path: str) -> None:
+    '''Write prometheus_text to path, replacing it atomically so a
+    scraper never reads half a file'''
+    temp = path + '.tmp'
+    with open(temp, 'w') as f:
+        f.write(prometheus_text())
+    os.replace(temp, path)
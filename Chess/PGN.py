@@ -0,0 +1,188 @@
+'''Streaming reader for Portable Game Notation (PGN) files.
+
+Games are read one at a time from any iterable of lines, so memory use is
+bounded by the longest single game rather than by the file:
+
+    with open('archive.pgn') as f:
+        for record in read_games(f):
+            game = Game()
+            for move in replay(record, game):
+                ...
+
+SAN moves are resolved by looking outward from the destination square
+for pieces of the right kind, so only the few candidate pieces are ever
+examined; a full legality check is only needed when two candidates can
+reach the square and one of them is pinned.
+'''
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List
+from ChessBoard import Game
+from Piece import *
+
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+
+SAN_PATTERN = re.compile(
+    r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?[+#]?[!?]*$')
+CASTLING_PATTERN = re.compile(r'^([O0]-[O0](-[O0])?)[+#]?[!?]*$')
+TAG_PATTERN = re.compile(r'^\[(\w+)\s+"((?:[^"\\]|\\.)*)"\]\s*$')
+TOKEN_PATTERN = re.compile(
+    r'\{[^}]*\}|;[^\n]*|\(|\)|\$\d+|\d+\.+|[^\s(){};.][^\s(){};]*')
+
+PIECE_LETTERS = {'N': Knight, 'B': Bishop, 'R': Rook, 'Q': Queen, 'K': King}
+
+
+@dataclass
+class PgnGame:
+    headers: Dict[str, str] = field(default_factory=dict)
+    moves: List[str] = field(default_factory=list)  # SAN, main line only
+    result: str = '*'
+
+
+def read_games(lines: Iterable[str]) -> Iterator[PgnGame]:
+    '''Yield each game of a PGN stream as soon as it has been read'''
+    headers = {}
+    movetext = []
+    in_comment = False
+    for line in lines:
+        if line.startswith('%'):
+            continue  # Escaped line
+        stripped = line.strip()
+        if not in_comment and stripped.startswith('['):
+            if movetext:
+                yield _build(headers, movetext)
+                headers, movetext = {}, []
+            match = TAG_PATTERN.match(stripped)
+            if match:
+                headers[match.group(1)] = re.sub(r'\\(.)', r'\1', match.group(2))
+            continue
+        if stripped:
+            movetext.append(line)
+            # Track braces so a '[' inside a multi-line comment is not
+            # taken for the next game's tags
+            for char in stripped:
+                if char == '{':
+                    in_comment = True
+                elif char == '}':
+                    in_comment = False
+    if headers or movetext:
+        yield _build(headers, movetext)
+
+
+def _build(headers: Dict[str, str], movetext: List[str]) -> PgnGame:
+    record = PgnGame(headers, [], headers.get('Result', '*'))
+    depth = 0  # Nesting of variations being skipped
+    # Lines may come with or without their line breaks; a ';' comment
+    # runs to the end of its own line only
+    for token in TOKEN_PATTERN.findall('\n'.join(movetext)):
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+        elif depth or token[0] in '{;$' or token[0].isdigit() and token.endswith('.'):
+            continue
+        elif token in RESULTS:
+            record.result = token
+        else:
+            record.moves.append(token)
+    return record
+
+
+def parse_san(game: Game, san: str) -> Move:
+    '''Resolve a SAN move for the side to move of game'''
+    color = game.turn
+    row = 0 if color == 'white' else 7
+    castling = CASTLING_PATTERN.match(san)
+    if castling:
+        x = 2 if castling.group(2) else 6
+        return Move(Position(4, row), Position(x, row))
+
+    match = SAN_PATTERN.match(san)
+    if not match:
+        raise ValueError(f"Invalid SAN move: {san!r}")
+    letter, file, rank, target, promotion = match.groups()
+    dst = Position(ord(target[0]) - ord('a'), int(target[1]) - 1)
+    if promotion is not None:
+        promotion = PIECE_LETTERS[promotion]
+
+    if letter is None:
+        sources = _pawn_sources(game, color, dst, file)
+    else:
+        sources = _piece_sources(game, PIECE_LETTERS[letter], color, dst)
+    if file is not None:
+        sources = [src for src in sources if src.x == ord(file) - ord('a')]
+    if rank is not None:
+        sources = [src for src in sources if src.y == int(rank) - 1]
+    if len(sources) > 1:
+        sources = [src for src in sources
+                   if not game.move_puts_king_in_check(src, dst)]
+    if len(sources) != 1:
+        raise ValueError(f"Illegal or ambiguous SAN move: {san!r}")
+    return Move(sources[0], dst, promotion)
+
+
+def _pawn_sources(game: Game, color: str, dst: Position, file) -> List[Position]:
+    direction = 1 if color == 'white' else -1
+    y = dst.y - direction
+    if not 0 <= y <= 7:
+        return []
+    if file is not None:
+        # A capture names the file the pawn comes from
+        x = ord(file) - ord('a')
+        piece = game.board[y][x]
+        return [Position(x, y)] if isinstance(piece, Pawn) and piece.color == color else []
+    for y in (y, y - direction):
+        piece = game.board[y][dst.x] if 0 <= y <= 7 else None
+        if piece is not None:
+            return [Position(dst.x, y)] if isinstance(piece, Pawn) and piece.color == color else []
+    return []
+
+
+def _piece_sources(game: Game, cls: type, color: str, dst: Position) -> List[Position]:
+    '''Squares holding a piece of cls and color that reaches dst, found by
+    looking outward from dst'''
+    board = game.board
+    sources = []
+    if cls in (Knight, King):
+        targets = KNIGHT_TARGETS if cls is Knight else KING_TARGETS
+        for pos in targets[dst.y][dst.x]:
+            piece = board[pos.y][pos.x]
+            if type(piece) is cls and piece.color == color:
+                sources.append(pos)
+        return sources
+
+    rays = {Rook: ROOK_RAYS, Bishop: BISHOP_RAYS, Queen: QUEEN_RAYS}[cls]
+    for ray in rays[dst.y][dst.x]:
+        for pos in ray:
+            piece = board[pos.y][pos.x]
+            if piece is not None:
+                if type(piece) is cls and piece.color == color:
+                    sources.append(pos)
+                break
+    return sources
+
+
+def replay(record: PgnGame, game: Game = None) -> Iterator[Move]:
+    '''Play the moves of record through move_piece and castle on game (the
+    starting position by default), yielding each move once it is on the
+    board'''
+    if game is None:
+        fen = record.headers.get('FEN')
+        game = Game.from_fen(fen) if fen else Game()
+    for ply, san in enumerate(record.moves):
+        try:
+            move = parse_san(game, san)
+            piece = game.board[move.src.y][move.src.x]
+            if isinstance(piece, King) and abs(move.dst.x - move.src.x) == 2:
+                game.castle(move.src, move.dst)
+            else:
+                game.move_piece(move.src, move.dst, move.promotion or Queen)
+        except (ValueError, RuntimeError) as e:
+            raise ValueError(f"Cannot replay ply {ply + 1} ({san}): {e}") from e
+        yield move
+
+
+def open_games(path: str) -> Iterator[PgnGame]:
+    '''Stream the games of a PGN file'''
+    with open(path, encoding='utf-8', errors='replace') as f:
+        yield from read_games(f)
@@ -0,0 +1,164 @@
+'''Lazy SMP: parallel alpha-beta search across worker processes.
+
+Every worker runs the ordinary ``Engine`` search on the same root
+position, and all of them read and write one transposition table held in
+shared memory.  The workers share no other state; they speed each other
+up only through the table, as one worker's results cut off the
+subtrees that the others reach later.  Odd-numbered workers start their
+iterations one ply deeper, so the workers spread over two depths instead
+of all searching the same tree in the same order.
+
+    with ParallelEngine(workers=8) as engine:
+        result = engine.search(game, time_limit=2.0)
+
+Worker processes start once and keep their engines between searches, so
+each search only pays for shipping a FEN and a few moves.
+'''
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from multiprocessing import shared_memory
+from typing import List, Tuple
+from ChessBoard import Game
+from Engine import MAX_PLY, Engine, SearchResult, format_score
+from Fen import START_FEN
+from Piece import Move
+from TranspositionTable import TranspositionTable, table_bytes
+
+
+def _worker(conn, memory_name: str, size: int, stop_event) -> None:
+    '''Search each job received on conn until None arrives'''
+    memory = shared_memory.SharedMemory(memory_name)
+    engine = Engine(TranspositionTable(buffer=memory.buf[:size]))
+    engine.stop_event = stop_event
+    try:
+        while True:
+            job = conn.recv()
+            if job is None:
+                break
+            fen, moves, max_depth, time_limit, node_limit, start_depth = job
+            game = Game.from_fen(fen)
+            for move in moves:
+                game.make_move(move)
+            conn.send(engine.search(game, max_depth, time_limit, node_limit,
+                                    start_depth=start_depth))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        # The table's views must go before the block can be closed
+        del engine
+        memory.close()
+
+
+def game_record(game: Game) -> Tuple[str, List[Move]]:
+    '''Encode game as a FEN and the moves played since the last capture
+    or pawn move, which is all the history repetition detection needs'''
+    plies = min(game.halfmove_clock, len(game.undo_stack))
+    moves = [game.unmake_move() for _ in range(plies)][::-1]
+    fen = game.to_fen()
+    for move in moves:
+        game.make_move(move)
+    return fen, moves
+
+
+class ParallelEngine:
+    '''Lazy SMP search over a pool of worker processes.
+
+    The shared transposition table is ``size_mb`` megabytes, rounded down
+    like ``TranspositionTable``'s.  Call close, or use the engine as a
+    context manager, to stop the workers and free the shared memory.
+    '''
+
+    def __init__(self, workers: int = None, size_mb: float = 64):
+        self.workers = workers or os.cpu_count() or 1
+        size = table_bytes(size_mb)
+        self.memory = shared_memory.SharedMemory(create=True, size=size)
+        self.stop_event = multiprocessing.Event()
+        self.connections = []
+        self.processes = []
+        for _ in range(self.workers):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_worker, args=(child, self.memory.name, size, self.stop_event),
+                daemon=True)
+            process.start()
+            child.close()
+            self.connections.append(parent)
+            self.processes.append(process)
+
+    def search(self, game: Game, max_depth: int = MAX_PLY,
+               time_limit: float = None, node_limit: int = None) -> SearchResult:
+        '''Search the position of game on every worker and return the
+        deepest result, preferring the main worker's on a tie.
+
+        The budget applies to each worker; node_limit in particular is
+        per worker, while the returned node count is the total.  The
+        helpers are stopped as soon as the main worker finishes.
+        '''
+        start = time.perf_counter()
+        fen, moves = game_record(game)
+        self.stop_event.clear()
+        for index, conn in enumerate(self.connections):
+            conn.send((fen, moves, max_depth, time_limit, node_limit, 1 + index % 2))
+
+        main = self.connections[0].recv()
+        self.stop_event.set()
+        results = [main] + [conn.recv() for conn in self.connections[1:]]
+
+        best = main
+        for result in results[1:]:
+            if result.depth > best.depth and result.move is not None:
+                best = result
+        return SearchResult(best.move, best.score, best.depth,
+                            sum(result.nodes for result in results),
+                            time.perf_counter() - start, best.pv)
+
+    def close(self) -> None:
+        if not self.processes:
+            return
+        for conn in self.connections:
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for conn in self.connections:
+            conn.close()
+        self.connections, self.processes = [], []
+        self.memory.close()
+        self.memory.unlink()
+
+    def __enter__(self) -> "ParallelEngine":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Search a position on several cores")
+    parser.add_argument('--fen', default=START_FEN)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--hash', type=float, default=64, help="table size in megabytes")
+    parser.add_argument('--depth', type=int, default=MAX_PLY)
+    parser.add_argument('--time', type=float, default=None, help="seconds to search")
+    args = parser.parse_args(argv)
+    if args.time is None and args.depth == MAX_PLY:
+        args.time = 5.0
+
+    with ParallelEngine(args.workers, args.hash) as engine:
+        result = engine.search(Game.from_fen(args.fen), args.depth, args.time)
+    print(f"depth {result.depth} score {format_score(result.score)} "
+          f"nodes {result.nodes} time {result.seconds * 1000:.0f} "
+          f"pv {' '.join(map(str, result.pv))}")
+    print(f"bestmove {result.move if result.move is not None else '(none)'}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
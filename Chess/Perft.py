@@ -0,0 +1,130 @@
+'''Perft: count the leaf nodes of the legal move tree to a fixed depth.
+
+The counts for the standard test positions are known exactly, so a
+mismatch points at a move generation bug, and nodes per second gives a
+single throughput number to track across releases.
+
+    python Perft.py                      run the reference suite
+    python Perft.py 4                    perft 4 from the start position
+    python Perft.py 3 --fen "<FEN>" --divide
+    python Perft.py 3 --engine game      use Game instead of BitboardGame
+'''
+import argparse
+import sys
+import time
+from typing import Dict, List
+from Bitboard import BitboardGame, move_to_uci
+from ChessBoard import Game
+from Fen import START_FEN
+
+# (name, FEN, node counts for depth 1, 2, ...)
+POSITIONS = [
+    ('start', START_FEN,
+     [20, 400, 8902, 197281, 4865609, 119060324]),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     [48, 2039, 97862, 4085603, 193690690]),
+    ('endgame', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     [14, 191, 2812, 43238, 674624, 11030083]),
+    ('promotions', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     [6, 264, 9467, 422333, 15833292]),
+    ('discovered', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+     [44, 1486, 62379, 2103487, 89941194]),
+    ('middlegame', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     [46, 2079, 89890, 3894594, 164075551]),
+]
+
+
+def load(fen: str, engine: str = 'bitboard'):
+    '''Set up a position on the chosen engine'''
+    if engine == 'game':
+        return Game.from_fen(fen)
+    return BitboardGame.from_fen(fen)
+
+
+def perft(game, depth: int) -> int:
+    '''Number of leaf nodes depth plies below the position of game, which
+    may be a Game or a BitboardGame'''
+    if depth <= 0:
+        return 1
+    moves = list(game.legal_moves())
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        game.make_move(move)
+        nodes += perft(game, depth - 1)
+        game.unmake_move()
+    return nodes
+
+
+def divide(game, depth: int) -> Dict[str, int]:
+    '''Perft split by root move, for comparing against another engine;
+    empty below depth 1, where there are no root moves to split by'''
+    counts = {}
+    if depth < 1:
+        return counts
+    for move in list(game.legal_moves()):
+        game.make_move(move)
+        name = move_to_uci(move) if isinstance(move, int) else str(move)
+        counts[name] = perft(game, depth - 1)
+        game.unmake_move()
+    return counts
+
+
+def run_suite(max_depth: int, engine: str = 'bitboard',
+              max_nodes: int = 2_000_000) -> List[tuple]:
+    '''Run every reference position up to max_depth, skipping depths with
+    more than max_nodes leaves; returns (name, depth, nodes, expected,
+    seconds) rows'''
+    results = []
+    for name, fen, expected in POSITIONS:
+        for depth, count in enumerate(expected[:max_depth], 1):
+            if count > max_nodes:
+                break
+            game = load(fen, engine)
+            start = time.perf_counter()
+            nodes = perft(game, depth)
+            results.append((name, depth, nodes, count, time.perf_counter() - start))
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Count move generation leaf nodes")
+    parser.add_argument('depth', type=int, nargs='?',
+                        help="perft depth; runs the reference suite when omitted")
+    parser.add_argument('--fen', default=START_FEN)
+    parser.add_argument('--divide', action='store_true',
+                        help="print the node count below each root move")
+    parser.add_argument('--engine', choices=('bitboard', 'game'), default='bitboard')
+    parser.add_argument('--max-depth', type=int, default=4,
+                        help="deepest suite depth to run")
+    parser.add_argument('--max-nodes', type=int, default=2_000_000,
+                        help="skip suite depths with more leaf nodes than this")
+    args = parser.parse_args(argv)
+
+    if args.depth is None:
+        failures = 0
+        for name, depth, nodes, expected, seconds in run_suite(
+                args.max_depth, args.engine, args.max_nodes):
+            status = 'ok' if nodes == expected else f'FAIL (expected {expected})'
+            failures += nodes != expected
+            print(f"{name:<12} depth {depth}  {nodes:>10} nodes  "
+                  f"{nodes / max(seconds, 1e-9):>10.0f} nps  {status}")
+        return 1 if failures else 0
+
+    game = load(args.fen, args.engine)
+    start = time.perf_counter()
+    if args.divide:
+        counts = divide(game, args.depth)
+        for name in sorted(counts):
+            print(f"{name}: {counts[name]}")
+        nodes = sum(counts.values())
+    else:
+        nodes = perft(game, args.depth)
+    seconds = time.perf_counter() - start
+    print(f"Nodes: {nodes}  Time: {seconds:.3f}s  NPS: {nodes / max(seconds, 1e-9):.0f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
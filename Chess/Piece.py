@@ -2,19 +2,165 @@ from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from typing import List
 
+# Integer codes for colors and piece kinds, for tables and compact
+# encodings; pieces themselves keep their color as 'white' or 'black'
+WHITE = 0
+BLACK = 1
+COLORS = ('white', 'black')
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+
 
-@dataclass
 class Position:
-    x: int
-    y: int
+    '''A square, x the file and y the rank, both 0-7 on the board.
+
+    Positions are interned and immutable: ``Position(x, y)`` always
+    returns the same object for the same square, so ``==``, hashing and
+    ``in`` checks on move lists are identity tests done in C, and a set
+    of positions stores pointers to 64 shared objects.  Coordinates off
+    the board give a new object each time, compared by value, so they
+    cannot grow memory.  ``sq`` is the 0-63 square index ``y * 8 + x``.
+    '''
+    __slots__ = ('x', 'y', 'sq')
+
+    def __new__(cls, x: int, y: int) -> "Position":
+        if 0 <= x <= 7 and 0 <= y <= 7:
+            return _SQUARES[y * 8 + x]
+        return _OffBoard._create(x, y)
+
+    @classmethod
+    def _create(cls, x: int, y: int) -> "Position":
+        pos = object.__new__(cls)
+        object.__setattr__(pos, 'x', x)
+        object.__setattr__(pos, 'y', y)
+        object.__setattr__(pos, 'sq', y * 8 + x)
+        return pos
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Position is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Position is immutable")
+
+    def __reduce__(self):
+        # Unpickled and copied positions resolve to the interned objects
+        return Position, (self.x, self.y)
+
+    def __repr__(self) -> str:
+        return f"Position(x={self.x}, y={self.y})"
+
+
+class _OffBoard(Position):
+    '''A position off the board.  Only these compare by value; squares
+    on the board keep the identity comparison.'''
+    __slots__ = ()
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, _OffBoard) and self.x == other.x and self.y == other.y
+
+    def __hash__(self) -> int:
+        return hash((self.x, self.y))
+
+
+_SQUARES = [Position._create(sq & 7, sq >> 3) for sq in range(64)]
 
 
 @dataclass
+class Move:
+    src: Position
+    dst: Position
+    promotion: type = None  # Piece class a pawn promotes to
+
+    def __str__(self) -> str:
+        '''Coordinate notation, e.g. e2e4 or a7a8q'''
+        name = ''
+        for pos in (self.src, self.dst):
+            name += 'abcdefgh'[pos.x] + str(pos.y + 1)
+        if self.promotion is not None:
+            name += {Queen: 'q', Rook: 'r', Bishop: 'b', Knight: 'n'}[self.promotion]
+        return name
+
+    def encode(self) -> int:
+        '''16 bits: source square, destination square << 6 and the
+        promotion kind << 12'''
+        code = self.src.sq | self.dst.sq << 6
+        return code | self.promotion.kind << 12 if self.promotion is not None else code
+
+    @classmethod
+    def decode(cls, code: int) -> "Move":
+        promotion = PIECE_CLASSES[code >> 12] if code >> 12 else None
+        return cls(Position(code & 7, code >> 3 & 7),
+                   Position(code >> 6 & 7, code >> 9 & 7), promotion)
+
+    @classmethod
+    def from_uci(cls, text: str) -> "Move":
+        '''Parse coordinate notation such as e2e4 or a7a8q'''
+        text = text.strip().lower()
+        if (len(text) not in (4, 5) or text[0] not in 'abcdefgh' or text[2] not in 'abcdefgh'
+                or text[1] not in '12345678' or text[3] not in '12345678'
+                or len(text) == 5 and text[4] not in 'qrbn'):
+            raise ValueError(f"Invalid move: {text!r}")
+        promotion = None
+        if len(text) == 5:
+            promotion = {'q': Queen, 'r': Rook, 'b': Bishop, 'n': Knight}[text[4]]
+        return cls(Position(ord(text[0]) - ord('a'), int(text[1]) - 1),
+                   Position(ord(text[2]) - ord('a'), int(text[3]) - 1), promotion)
+
+
+def _targets(x: int, y: int, offsets) -> List[Position]:
+    '''On-board squares one offset away from (x, y), in offset order'''
+    return [Position(x + dx, y + dy) for dx, dy in offsets
+            if 0 <= x + dx <= 7 and 0 <= y + dy <= 7]
+
+
+def _rays(x: int, y: int, directions) -> List[List[Position]]:
+    '''For each direction, the squares from (x, y) to the board edge'''
+    rays = []
+    for dx, dy in directions:
+        ray = []
+        new_x, new_y = x + dx, y + dy
+        while 0 <= new_x <= 7 and 0 <= new_y <= 7:
+            ray.append(Position(new_x, new_y))
+            new_x += dx
+            new_y += dy
+        rays.append(ray)
+    return rays
+
+
+KNIGHT_OFFSETS = [(2, 1), (1, 2), (-1, 2), (-2, 1),
+                  (-2, -1), (-1, -2), (1, -2), (2, -1)]
+KING_OFFSETS = [(0, 1), (0, -1), (1, 0), (-1, 0),
+                (1, 1), (1, -1), (-1, 1), (-1, -1)]
+ROOK_STEPS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+BISHOP_STEPS = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+
+# Move tables indexed [y][x], built once so move generation walks shared
+# Position objects instead of allocating and bounds-checking new ones.
+# Each table keeps the order the pieces have always generated moves in.
+KNIGHT_TARGETS = [[_targets(x, y, KNIGHT_OFFSETS) for x in range(8)]
+                  for y in range(8)]
+KING_TARGETS = [[_targets(x, y, KING_OFFSETS) for x in range(8)]
+                for y in range(8)]
+ROOK_RAYS = [[_rays(x, y, ROOK_STEPS) for x in range(8)]
+             for y in range(8)]
+BISHOP_RAYS = [[_rays(x, y, BISHOP_STEPS) for x in range(8)]
+               for y in range(8)]
+QUEEN_RAYS = [[BISHOP_RAYS[y][x] + _rays(x, y, ROOK_STEPS)
+               for x in range(8)] for y in range(8)]
+
+
+@dataclass(slots=True)
 class Piece(ABC):
     color: str
     p: Position = None
     g: "Game" = None
 
+    kind = None  # PAWN ... KING, set by each subclass
+
+    @property
+    def code(self) -> int:
+        '''0-11: the kind, plus 6 for black'''
+        return self.kind if self.color == 'white' else self.kind + 6
+
     @abstractmethod
     def __str__(self) -> str:
         pass
@@ -23,14 +169,80 @@ class Piece(ABC):
     def get_possible_moves(self) -> List[Position]:
         pass
 
+    def can_move_to(self, dst: Position) -> bool:
+        '''Whether dst is one of get_possible_moves, answered for that
+        square alone without generating the others'''
+        if not (0 <= dst.x <= 7 and 0 <= dst.y <= 7):
+            return False
+        return self._reaches(dst)
+
+    def _reaches(self, dst: Position) -> bool:
+        '''can_move_to for a square on the board'''
+        return dst in self.get_possible_moves()
+
     def can_be_en_passant(self) -> bool:
         return False
 
+    def _can_take(self, dst: Position) -> bool:
+        '''Whether dst is empty or holds an enemy'''
+        piece = self.g.board[dst.y][dst.x]
+        return piece is None or piece.color != self.color
 
-@dataclass
+    def _can_slide_to(self, dst: Position, straight: bool, diagonal: bool) -> bool:
+        '''Whether dst is on one of the lines the piece slides along, with
+        nothing in between'''
+        dx, dy = dst.x - self.p.x, dst.y - self.p.y
+        if dx == dy == 0:
+            return False
+        if dx == 0 or dy == 0:
+            if not straight:
+                return False
+        elif abs(dx) != abs(dy) or not diagonal:
+            return False
+        step_x = (dx > 0) - (dx < 0)
+        step_y = (dy > 0) - (dy < 0)
+        board = self.g.board
+        x, y = self.p.x + step_x, self.p.y + step_y
+        while (x, y) != (dst.x, dst.y):
+            if board[y][x] is not None:
+                return False
+            x += step_x
+            y += step_y
+        return self._can_take(dst)
+
+    def _slide(self, rays: List[List[Position]]) -> List[Position]:
+        '''Walk each ray up to the first piece, keeping it if it is an
+        enemy'''
+        positions = []
+        board = self.g.board
+        for ray in rays:
+            for pos in ray:
+                piece = board[pos.y][pos.x]
+                if piece is None:
+                    positions.append(pos)
+                else:
+                    if piece.color != self.color:
+                        positions.append(pos)
+                    break
+        return positions
+
+    def _jump(self, targets: List[Position]) -> List[Position]:
+        '''Keep the targets that are empty or hold an enemy'''
+        board = self.g.board
+        positions = []
+        for pos in targets:
+            piece = board[pos.y][pos.x]
+            if piece is None or piece.color != self.color:
+                positions.append(pos)
+        return positions
+
+
+@dataclass(slots=True)
 class Pawn(Piece):
     has_moved: bool = False
 
+    kind = PAWN
+
     def __str__(self) -> str:
         return "♙" if self.color == "white" else "♟"
 
@@ -38,32 +250,53 @@ class Pawn(Piece):
         if self.color == "white":
             direction = 1
             start_row = 1
-            en_passant_row = 4
         else:
             direction = -1
             start_row = 6
-            en_passant_row = 3
 
         positions = []
-        if self.p.y == start_row and not self.has_moved:
-            # Pawn can move two squares forward from starting position
-            positions.append(Position(self.p.x, self.p.y + 2 * direction))
+        board = self.g.board
+        new_y = self.p.y + direction
+        if not 0 <= new_y <= 7:
+            return positions
 
-        positions.append(Position(self.p.x, self.p.y + direction))
+        if board[new_y][self.p.x] is None:
+            positions.append(Position(self.p.x, new_y))
+            # Pawn can move two squares forward from starting position
+            if self.p.y == start_row and not self.has_moved:
+                if board[new_y + direction][self.p.x] is None:
+                    positions.append(Position(self.p.x, new_y + direction))
 
         # Capture moves
         for dx in [-1, 1]:
             new_x = self.p.x + dx
-            new_y = self.p.y + direction
-            if 0 <= new_x <= 7 and 0 <= new_y <= 7:
-                piece = self.g.board[new_y][new_x]
+            if 0 <= new_x <= 7:
+                piece = board[new_y][new_x]
                 if piece is not None and piece.color != self.color:
                     positions.append(Position(new_x, new_y))
-                elif piece is None and self.can_be_en_passant():
+                elif (piece is None and self.can_be_en_passant()
+                        and self.g.last_move[1].x == new_x):
                     positions.append(Position(new_x, new_y))
 
-        empty_positions = [p for p in positions if self.g.is_empty(p)]
-        return empty_positions
+        return positions
+
+    def _reaches(self, dst: Position) -> bool:
+        direction = 1 if self.color == "white" else -1
+        board = self.g.board
+        dx, dy = dst.x - self.p.x, dst.y - self.p.y
+        if dx == 0:
+            if dy == direction:
+                return board[dst.y][dst.x] is None
+            start_row = 1 if self.color == "white" else 6
+            return (dy == 2 * direction and self.p.y == start_row and not self.has_moved
+                    and board[self.p.y + direction][dst.x] is None
+                    and board[dst.y][dst.x] is None)
+        if abs(dx) != 1 or dy != direction:
+            return False
+        piece = board[dst.y][dst.x]
+        if piece is not None:
+            return piece.color != self.color
+        return self.can_be_en_passant() and self.g.last_move[1].x == dst.x
 
     def can_be_en_passant(self) -> bool:
         if self.g.last_move is None:
@@ -80,167 +313,73 @@ class Pawn(Piece):
 
 
 class Rook(Piece):
+    __slots__ = ()
+    kind = ROOK
+
     def get_possible_moves(self) -> List[Position]:
-        positions = []
-        for i in range(self.p.x + 1, 8):
-            if self.g.is_empty(Position(i, self.p.y)):
-                positions.append(Position(i, self.p.y))
-            else:
-                if self.g.is_enemy(Position(i, self.p.y), self.color):
-                    positions.append(Position(i, self.p.y))
-                break
-        for i in range(self.p.x - 1, -1, -1):
-            if self.g.is_empty(Position(i, self.p.y)):
-                positions.append(Position(i, self.p.y))
-            else:
-                if self.g.is_enemy(Position(i, self.p.y), self.color):
-                    positions.append(Position(i, self.p.y))
-                break
-        for i in range(self.p.y + 1, 8):
-            if self.g.is_empty(Position(self.p.x, i)):
-                positions.append(Position(self.p.x, i))
-            else:
-                if self.g.is_enemy(Position(self.p.x, i), self.color):
-                    positions.append(Position(self.p.x, i))
-                break
-        for i in range(self.p.y - 1, -1, -1):
-            if self.g.is_empty(Position(self.p.x, i)):
-                positions.append(Position(self.p.x, i))
-            else:
-                if self.g.is_enemy(Position(self.p.x, i), self.color):
-                    positions.append(Position(self.p.x, i))
-                break
-        return positions
+        return self._slide(ROOK_RAYS[self.p.y][self.p.x])
+
+    def _reaches(self, dst: Position) -> bool:
+        return self._can_slide_to(dst, True, False)
 
     def __str__(self) -> str:
         return "♖" if self.color == "white" else "♜"
 
 
 class Knight(Piece):
+    __slots__ = ()
+    kind = KNIGHT
 
     def __str__(self) -> str:
         return "♘" if self.color == "white" else "♞"
 
     def get_possible_moves(self) -> List[Position]:
-        positions = []
-        offsets = [
-            (2, 1),
-            (1, 2),
-            (-1, 2),
-            (-2, 1),
-            (-2, -1),
-            (-1, -2),
-            (1, -2),
-            (2, -1),
-        ]
-        for offset in offsets:
-            new_x = self.p.x + offset[0]
-            new_y = self.p.y + offset[1]
-            if 0 <= new_x <= 7 and 0 <= new_y <= 7:
-                if (
-                    self.g.is_empty(Position(new_x, new_y))
-                    or self.g.is_enemy(Position(new_x, new_y), self.color)
-                ):
-                    positions.append(Position(new_x, new_y))
-        return positions
+        return self._jump(KNIGHT_TARGETS[self.p.y][self.p.x])
+
+    def _reaches(self, dst: Position) -> bool:
+        return {abs(dst.x - self.p.x), abs(dst.y - self.p.y)} == {1, 2} and self._can_take(dst)
 
 
 class Bishop(Piece):
+    __slots__ = ()
+    kind = BISHOP
 
     def __str__(self) -> str:
         return "♗" if self.color == "white" else "♝"
 
     def get_possible_moves(self) -> List[Position]:
-        positions = []
-        offsets = [
-            (1, 1),
-            (1, -1),
-            (-1, 1),
-            (-1, -1),
-        ]
-
-        for offset in offsets:
-            new_x = self.p.x + offset[0]
-            new_y = self.p.y + offset[1]
-            while 0 <= new_x <= 7 and 0 <= new_y <= 7:
-                if self.g.is_empty(Position(new_x, new_y)):
-                    positions.append(Position(new_x, new_y))
-                else:
-                    if self.g.is_enemy(Position(new_x, new_y), self.color):
-                        positions.append(Position(new_x, new_y))
-                    break
-                new_x += offset[0]
-                new_y += offset[1]
-        return positions
+        return self._slide(BISHOP_RAYS[self.p.y][self.p.x])
+
+    def _reaches(self, dst: Position) -> bool:
+        return self._can_slide_to(dst, False, True)
 
 
 class Queen(Piece):
+    __slots__ = ()
+    kind = QUEEN
+
     def __str__(self) -> str:
         return "♕" if self.color == "white" else "♛"
 
     def get_possible_moves(self) -> List[Position]:
-        positions = []
+        return self._slide(QUEEN_RAYS[self.p.y][self.p.x])
 
-        # cross move 
-        offsets = [
-            (1, 1),
-            (1, -1),
-            (-1, 1),
-            (-1, -1),
-        ]
-
-        for offset in offsets:
-            new_x = self.p.x + offset[0]
-            new_y = self.p.y + offset[1]
-            while 0 <= new_x <= 7 and 0 <= new_y <= 7:
-                if self.g.is_empty(Position(new_x, new_y)):
-                    positions.append(Position(new_x, new_y))
-                else:
-                    if self.g.is_enemy(Position(new_x, new_y), self.color):
-                        positions.append(Position(new_x, new_y))
-                    break
-                new_x += offset[0]
-                new_y += offset[1]
-
-        # horizontal and vertical moves
-        for direction in [(1, 0), (-1, 0), (0, 1), (0, -1)]:
-            dx, dy = direction
-            x, y = self.p.x + dx, self.p.y + dy
-            while 0 <= x <= 7 and 0 <= y <= 7:
-                if self.g.is_empty(Position(x, y)):
-                    positions.append(Position(x, y))
-                else:
-                    if self.g.is_enemy(Position(x, y), self.color):
-                        positions.append(Position(x, y))
-                    break
-                x += dx
-                y += dy
-        return positions
+    def _reaches(self, dst: Position) -> bool:
+        return self._can_slide_to(dst, True, True)
 
 
 class King(Piece):
+    __slots__ = ()
+    kind = KING
+
     def __str__(self) -> str:
         return "♔" if self.color == "white" else "♚"
 
     def get_possible_moves(self) -> List[Position]:
-        positions = []
-        offsets = [
-            (0, 1),
-            (0, -1),
-            (1, 0),
-            (-1, 0),
-            (1, 1),
-            (1, -1),
-            (-1, 1),
-            (-1, -1),
-        ]
-        for offset in offsets:
-            new_x = self.p.x + offset[0]
-            new_y = self.p.y + offset[1]
-            if 0 <= new_x <= 7 and 0 <= new_y <= 7:
-                if (
-                    self.g.is_empty(Position(new_x, new_y))
-                    or self.g.is_enemy(Position(new_x, new_y), self.color)
-                ):
-                    positions.append(Position(new_x, new_y))
-        return positions
+        return self._jump(KING_TARGETS[self.p.y][self.p.x])
+
+    def _reaches(self, dst: Position) -> bool:
+        return max(abs(dst.x - self.p.x), abs(dst.y - self.p.y)) == 1 and self._can_take(dst)
+
+
+PIECE_CLASSES = (Pawn, Knight, Bishop, Rook, Queen, King)  # Indexed by kind
@@ -0,0 +1,244 @@
+'''On-disk index from positions to the games and plies that reached them.
+
+Positions are keyed by ``Game.zobrist``, which already covers the
+pieces, the side to move, castling rights and a capturable en passant
+square.  The index file is two parallel arrays of unsigned 64-bit words
+sorted by key:
+
+    header    b'CHPI', version (u32), entry count (u64), byte order mark (u64)
+    keys      Zobrist key of each entry
+    values    game number << 16 | ply
+
+so a lookup is a binary search over the memory-mapped key array, and
+the file is never loaded or unpickled as a whole.  Words are stored in
+the native byte order; the byte order mark catches a file moved to a
+machine of the other order.
+
+    with IndexBuilder('archive.idx') as builder:
+        for number, record in enumerate(open_games('archive.pgn')):
+            game = Game()
+            builder.begin(game, number)    # move_piece and castle now index
+            for _ in replay(record, game):
+                pass
+            builder.end(game)
+
+    with PositionIndex('archive.idx') as index:
+        index.lookup(game.zobrist)         # [(game number, ply), ...]
+'''
+import argparse
+import bisect
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Iterator, List, Tuple
+from ChessBoard import Game
+from Piece import Move
+
+MAGIC = b'CHPI'
+VERSION = 1
+HEADER = struct.Struct('=4sIQQ')
+BYTE_ORDER_MARK = 0x0102030405060708
+MAX_PLY = 0xFFFF
+MAX_GAME = (1 << 48) - 1
+
+
+class PositionIndex:
+    '''Read-only view of an index file'''
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, count, mark = HEADER.unpack_from(self.data, 0)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError("Not a position index file")
+            if mark != BYTE_ORDER_MARK:
+                raise ValueError("Position index was written with the other byte order")
+            if len(self.data) != HEADER.size + count * 16:
+                raise ValueError("Truncated position index file")
+        except (ValueError, struct.error):
+            self.data.close()
+            raise
+        words = memoryview(self.data)[HEADER.size:].cast('Q')
+        self.keys = words[:count]
+        self.values = words[count:]
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _range(self, key: int) -> Tuple[int, int]:
+        start = bisect.bisect_left(self.keys, key)
+        return start, bisect.bisect_right(self.keys, key, start)
+
+    def lookup(self, key: int) -> List[Tuple[int, int]]:
+        '''(game number, ply) of every occurrence of the position with
+        Zobrist key, by game then ply'''
+        start, stop = self._range(key)
+        return [(value >> 16, value & MAX_PLY) for value in self.values[start:stop]]
+
+    def games(self, game: Game) -> List[int]:
+        '''Numbers of the games that reached the position of game'''
+        return sorted({number for number, _ in self.lookup(game.zobrist)})
+
+    def count(self, key: int) -> int:
+        start, stop = self._range(key)
+        return stop - start
+
+    def __contains__(self, key: int) -> bool:
+        return self.count(key) > 0
+
+    def entries(self) -> Iterator[Tuple[int, int]]:
+        '''Every (key, value) in key order'''
+        return zip(self.keys, self.values)
+
+    def close(self) -> None:
+        self.keys.release()
+        self.values.release()
+        self.data.close()
+
+    def __enter__(self) -> "PositionIndex":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class IndexBuilder:
+    '''Collect positions and write them to an index file on close.
+
+    An existing index at path is extended: its entries are merged with
+    the new ones and the file is replaced atomically.  ``begin`` attaches
+    the builder to a game as its ``recorder`` so each move played through
+    ``move_piece`` or ``castle`` adds the position it leads to.
+    '''
+
+    def __init__(self, path: str):
+        self.path = path
+        self.keys = array('Q')
+        self.values = array('Q')
+        self.number = None
+        self.ply = 0
+
+    def add(self, key: int, number: int, ply: int) -> None:
+        if not 0 <= number <= MAX_GAME or not 0 <= ply <= MAX_PLY:
+            raise ValueError("Game number or ply out of range")
+        self.keys.append(key)
+        self.values.append(number << 16 | ply)
+
+    def begin(self, game: Game, number: int) -> None:
+        '''Index the position of game as ply 0 of game number'''
+        if not 0 <= number <= MAX_GAME:
+            raise ValueError("Game number out of range")
+        self.number = number
+        self.ply = 0
+        self.add(game.zobrist, number, 0)
+        game.recorder = self
+
+    def record(self, game: Game, move: Move) -> None:
+        '''Called by Game after each move.  A move past the ply limit is
+        taken back, so game stays at the last indexed ply.'''
+        if self.ply == MAX_PLY:
+            game.unmake_move()
+            raise ValueError("Game too long to index")
+        self.ply += 1
+        self.add(game.zobrist, self.number, self.ply)
+
+    def end(self, game: Game = None) -> None:
+        if game is not None and game.recorder is self:
+            game.recorder = None
+        self.number = None
+
+    def close(self) -> None:
+        entries = sorted(zip(self.keys, self.values))
+        keys = array('Q', (key for key, _ in entries))
+        values = array('Q', (value for _, value in entries))
+        if os.path.exists(self.path):
+            keys, values = self._merge(keys, values)
+
+        temp = self.path + '.tmp'
+        with open(temp, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(keys), BYTE_ORDER_MARK))
+            keys.tofile(f)
+            values.tofile(f)
+        os.replace(temp, self.path)
+        self.keys, self.values = array('Q'), array('Q')
+
+    def _merge(self, keys: array, values: array) -> Tuple[array, array]:
+        '''Merge sorted new entries with those already in the file'''
+        merged_keys, merged_values = array('Q'), array('Q')
+        with PositionIndex(self.path) as index:
+            old_keys, old_values = index.keys, index.values
+            i = j = 0
+            while i < len(old_keys) and j < len(keys):
+                if (old_keys[i], old_values[i]) <= (keys[j], values[j]):
+                    merged_keys.append(old_keys[i])
+                    merged_values.append(old_values[i])
+                    i += 1
+                else:
+                    merged_keys.append(keys[j])
+                    merged_values.append(values[j])
+                    j += 1
+            merged_keys.extend(old_keys[i:])
+            merged_values.extend(old_values[i:])
+        merged_keys.extend(keys[j:])
+        merged_values.extend(values[j:])
+        return merged_keys, merged_values
+
+    def __enter__(self) -> "IndexBuilder":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def index_pgn(pgn_path: str, index_path: str, first: int = 0) -> int:
+    '''Index every game of a PGN file, numbering them from first in file
+    order; returns the number of games indexed'''
+    from PGN import open_games, replay
+
+    count = 0
+    with IndexBuilder(index_path) as builder:
+        for number, record in enumerate(open_games(pgn_path), first):
+            fen = record.headers.get('FEN')
+            try:
+                game = Game.from_fen(fen) if fen else Game()
+            except ValueError:
+                continue
+            builder.begin(game, number)
+            try:
+                for _ in replay(record, game):
+                    pass
+            except ValueError:
+                pass  # Keep the positions up to the bad move
+            builder.end(game)
+            count += 1
+    return count
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Build and query a position index")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="index the games of a PGN file")
+    build.add_argument('pgn')
+    build.add_argument('index')
+    build.add_argument('--first', type=int, default=0,
+                       help="number of the first game, when extending an index")
+    query = commands.add_parser('query', help="list the games that reached a position")
+    query.add_argument('index')
+    query.add_argument('fen')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        count = index_pgn(args.pgn, args.index, args.first)
+        print(f"Indexed {count} games", file=sys.stderr)
+    else:
+        with PositionIndex(args.index) as index:
+            for number, ply in index.lookup(Game.from_fen(args.fen).zobrist):
+                print(f"game {number} ply {ply}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
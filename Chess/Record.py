@@ -0,0 +1,286 @@
+'''Compact binary game records with memory-mapped random access.
+
+A record file holds whole games.  Each game is stored as its starting
+position, its moves as 16-bit ``Move.encode`` codes and a snapshot of the
+position every ``interval`` plies:
+
+    header    b'CHRC', version (u16), snapshot interval (u16)
+    game      plies (u16), result (u8), 0 (u8), start snapshot,
+              moves (u16 each), snapshot after every interval-th ply
+    ...
+    index     offset of each game (u64 each)
+    trailer   number of games (u64), offset of the index (u64)
+
+A snapshot packs the 64 squares into 4-bit piece codes followed by the
+side to move, castling rights, en passant file and both move counters,
+38 bytes in all.  The reader maps the file and jumps straight to game N
+through the index, and to ply K of it from the nearest snapshot, so no
+query replays more than ``interval - 1`` moves.  Integers are little
+endian.
+
+    with RecordWriter('games.rec') as writer:
+        game = Game()
+        writer.begin(game)         # game.move_piece and game.castle now record
+        ...
+        writer.end(game, '1-0')
+
+    with RecordReader('games.rec') as reader:
+        game = reader.position(12, 40)
+'''
+import argparse
+import mmap
+import struct
+import sys
+from typing import Iterable, List, Optional
+from ChessBoard import Game
+from Fen import PIECE_LETTERS, format_fen
+from Piece import *
+
+MAGIC = b'CHRC'
+VERSION = 1
+HEADER = struct.Struct('<4sHH')
+GAME_HEADER = struct.Struct('<HBx')
+SNAPSHOT = struct.Struct('<32sBBHH')
+TRAILER = struct.Struct('<QQ')
+MAX_PLIES = 0xFFFF
+
+RESULTS = ('*', '1-0', '0-1', '1/2-1/2')
+NO_EN_PASSANT = 0xFF
+
+
+def pack_position(game: Game) -> bytes:
+    '''Snapshot the position of game in SNAPSHOT.size bytes'''
+    board = bytearray(32)
+    for y, row in enumerate(game.board):
+        for x, piece in enumerate(row):
+            if piece is not None:
+                sq = y * 8 + x
+                # Nibble 0 is an empty square, 1-12 a piece code plus one
+                board[sq >> 1] |= (piece.code + 1) << ((sq & 1) * 4)
+    ep = NO_EN_PASSANT
+    if game.last_move is not None:
+        src, dst = game.last_move
+        if isinstance(game.board[dst.y][dst.x], Pawn) and abs(dst.y - src.y) == 2:
+            ep = dst.x
+    flags = (game.turn == 'black') | game.castling << 1
+    return SNAPSHOT.pack(bytes(board), flags, ep, min(game.halfmove_clock, 0xFFFF),
+                         min(game.fullmove_number, 0xFFFF))
+
+
+def unpack_position(data, offset: int = 0) -> Game:
+    '''Rebuild a Game from a snapshot'''
+    board, flags, ep, halfmove_clock, fullmove_number = SNAPSHOT.unpack_from(data, offset)
+    placement = [[None] * 8 for _ in range(8)]
+    for sq in range(64):
+        nibble = board[sq >> 1] >> ((sq & 1) * 4) & 0xF
+        if nibble:
+            code = nibble - 1
+            letter = PIECE_LETTERS[PIECE_CLASSES[code % 6]]
+            placement[sq >> 3][sq & 7] = letter if code >= 6 else letter.upper()
+    turn = 'black' if flags & 1 else 'white'
+    ep_square = None
+    if ep != NO_EN_PASSANT:
+        ep_square = Position(ep, 5 if turn == 'white' else 2)
+    return Game.from_fen(format_fen(placement, turn, flags >> 1, ep_square,
+                                    halfmove_clock, fullmove_number))
+
+
+class RecordWriter:
+    '''Append games to a new record file.
+
+    ``begin`` attaches the writer to a game as its ``recorder``, so every
+    move played through ``move_piece`` or ``castle`` is recorded until
+    ``end`` writes the game out; ``add`` writes a finished game in one
+    call.  ``close`` writes the index, and a file is only readable once
+    it has been closed.
+    '''
+
+    def __init__(self, path: str, interval: int = 32):
+        if not 1 <= interval <= MAX_PLIES:
+            raise ValueError("Snapshot interval must be between 1 and 65535")
+        self.file = open(path, 'wb')
+        self.interval = interval
+        self.offsets = []
+        self.start = None
+        self.moves = []
+        self.snapshots = []
+        self.file.write(HEADER.pack(MAGIC, VERSION, interval))
+
+    def begin(self, game: Game) -> None:
+        self.start = pack_position(game)
+        self.moves = []
+        self.snapshots = []
+        game.recorder = self
+
+    def record(self, game: Game, move: Move) -> None:
+        '''Called by Game after each recorded move.  A move past the
+        ply limit is taken back, so game stays at the last stored ply.'''
+        if len(self.moves) == MAX_PLIES:
+            game.unmake_move()
+            raise RuntimeError("Game too long to record")
+        self.moves.append(move.encode())
+        if len(self.moves) % self.interval == 0:
+            self.snapshots.append(pack_position(game))
+
+    def end(self, game: Game = None, result: str = '*') -> None:
+        '''Write out the game started by begin'''
+        if self.start is None:
+            raise RuntimeError("No game in progress")
+        if result not in RESULTS:
+            raise ValueError(f"Invalid result: {result!r}")
+        if game is not None and game.recorder is self:
+            game.recorder = None
+        self.offsets.append(self.file.tell())
+        self.file.write(GAME_HEADER.pack(len(self.moves), RESULTS.index(result)))
+        self.file.write(self.start)
+        self.file.write(struct.pack(f'<{len(self.moves)}H', *self.moves))
+        self.file.write(b''.join(self.snapshots))
+        self.start = None
+
+    def add(self, moves: Iterable[Move], result: str = '*', game: Game = None) -> None:
+        '''Record a whole game from game (the starting position by
+        default), playing moves on it with make_move'''
+        moves = list(moves)
+        if len(moves) > MAX_PLIES:
+            raise RuntimeError("Game too long to record")
+        if result not in RESULTS:
+            raise ValueError(f"Invalid result: {result!r}")
+        game = game if game is not None else Game()
+        self.begin(game)
+        game.recorder = None  # Moves are recorded here, not by the game
+        for move in moves:
+            game.make_move(move)
+            self.record(game, move)
+        self.end(game, result)
+
+    def close(self) -> None:
+        if self.file.closed:
+            return
+        index = self.file.tell()
+        self.file.write(struct.pack(f'<{len(self.offsets)}Q', *self.offsets))
+        self.file.write(TRAILER.pack(len(self.offsets), index))
+        self.file.close()
+
+    def __enter__(self) -> "RecordWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class RecordReader:
+    '''Random access to the games of a record file through mmap'''
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.data) < HEADER.size + TRAILER.size:
+            self.data.close()
+            raise ValueError("Not a game record file")
+        magic, version, self.interval = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            self.data.close()
+            raise ValueError("Not a game record file")
+        self.count, self.index = TRAILER.unpack_from(self.data, len(self.data) - TRAILER.size)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _game(self, n: int) -> tuple:
+        '''(offset of the start snapshot, plies, result) of game n'''
+        if not 0 <= n < self.count:
+            raise IndexError("Game index out of range")
+        offset, = struct.unpack_from('<Q', self.data, self.index + n * 8)
+        plies, result = GAME_HEADER.unpack_from(self.data, offset)
+        return offset + GAME_HEADER.size, plies, RESULTS[result]
+
+    def plies(self, n: int) -> int:
+        return self._game(n)[1]
+
+    def result(self, n: int) -> str:
+        return self._game(n)[2]
+
+    def moves(self, n: int, start: int = 0, stop: Optional[int] = None) -> List[Move]:
+        '''Moves start to stop (all by default) of game n'''
+        offset, plies, _ = self._game(n)
+        start, stop, _ = slice(start, stop).indices(plies)
+        if start >= stop:
+            return []
+        codes = struct.unpack_from(f'<{stop - start}H', self.data,
+                                   offset + SNAPSHOT.size + start * 2)
+        return [Move.decode(code) for code in codes]
+
+    def position(self, n: int, ply: int = 0) -> Game:
+        '''Game n after its first ply moves, replayed from the nearest
+        snapshot; ply may be negative to count from the end'''
+        offset, plies, _ = self._game(n)
+        if ply < 0:
+            ply += plies + 1
+        if not 0 <= ply <= plies:
+            raise IndexError("Ply out of range")
+        snapshot = ply // self.interval
+        if snapshot:
+            base = offset + SNAPSHOT.size + plies * 2 + (snapshot - 1) * SNAPSHOT.size
+        else:
+            base = offset
+        game = unpack_position(self.data, base)
+        for move in self.moves(n, snapshot * self.interval, ply):
+            game.make_move(move)
+        return game
+
+    def close(self) -> None:
+        self.data.close()
+
+    def __enter__(self) -> "RecordReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def convert_pgn(pgn_path: str, record_path: str, interval: int = 32) -> int:
+    '''Convert a PGN file into a record file, skipping games that cannot
+    be replayed; returns the number of games written'''
+    from PGN import open_games, replay
+
+    count = 0
+    with RecordWriter(record_path, interval) as writer:
+        for record in open_games(pgn_path):
+            fen = record.headers.get('FEN')
+            try:
+                game = Game.from_fen(fen) if fen else Game()
+                writer.begin(game)
+                for _ in replay(record, game):
+                    pass
+            except ValueError:
+                continue
+            writer.end(game, record.result if record.result in RESULTS else '*')
+            count += 1
+    return count
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Convert and query binary game records")
+    commands = parser.add_subparsers(dest='command', required=True)
+    convert = commands.add_parser('convert', help="convert a PGN file")
+    convert.add_argument('pgn')
+    convert.add_argument('record')
+    convert.add_argument('--interval', type=int, default=32,
+                         help="plies between position snapshots")
+    show = commands.add_parser('show', help="print the FEN of a game at a ply")
+    show.add_argument('record')
+    show.add_argument('game', type=int)
+    show.add_argument('ply', type=int, nargs='?', default=-1)
+    args = parser.parse_args(argv)
+
+    if args.command == 'convert':
+        count = convert_pgn(args.pgn, args.record, args.interval)
+        print(f"Wrote {count} games", file=sys.stderr)
+    else:
+        with RecordReader(args.record) as reader:
+            print(reader.position(args.game, args.ply).to_fen())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
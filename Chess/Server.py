@@ -0,0 +1,278 @@
+'''Asyncio server hosting many concurrent ``Game`` sessions in one process.
+
+Clients speak newline-delimited JSON over TCP.  Each request is an object
+with an ``op`` and an optional ``id`` that is echoed in its reply:
+
+    {"op": "new", "fen": "<FEN, optional>"}      -> {"game": 1, "fen": ...}
+    {"op": "join", "game": 1}                    -> {"game": 1, "fen": ...}
+    {"op": "move", "game": 1, "move": "e2e4"}    -> {"fen": ..., "check": false, ...}
+    {"op": "moves", "game": 1}                   -> {"moves": ["a2a3", ...]}
+    {"op": "analyze", "game": 1, "time": 0.5}    -> {"move": "e2e4", "score": 31, ...}
+    {"op": "leave", "game": 1}
+
+Every client that created or joined a game is sent an ``{"event":
+"move", ...}`` message for each move played in it, with the check and
+checkmate status and the ``outcome`` of a finished game (see
+``Game.outcome``), after which no more moves are taken.  Moves are
+validated with ``move_piece`` on the event loop, which takes well under
+a millisecond; searches run in a process pool so a slow analysis never
+stalls the other sessions.
+
+    python Server.py --port 8765 --workers 4
+
+With ``--metrics FILE``, the hot paths are instrumented (see
+``Instrument``) per request type, and the figures are written to FILE
+in the Prometheus text format every ``METRICS_INTERVAL`` seconds.
+'''
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+import Instrument
+from ChessBoard import Game
+from Engine import Engine
+from Parallel import game_record
+from Piece import *
+
+MAX_LINE = 1 << 16
+MAX_ANALYSIS_TIME = 30.0
+MAX_PENDING_BYTES = 1 << 20  # Clients further behind than this are dropped
+METRICS_INTERVAL = 15.0
+
+_engine = None
+
+
+def _analyze(fen: str, moves: List[Move], time_limit: float,
+             max_depth: Optional[int]) -> dict:
+    '''Search a position in a worker process, whose engine and table
+    persist between jobs'''
+    global _engine
+    if _engine is None:
+        _engine = Engine()
+    game = Game.from_fen(fen)
+    for move in moves:
+        game.make_move(move)
+    result = _engine.search(game, 64 if max_depth is None else max_depth, time_limit)
+    return {'move': None if result.move is None else str(result.move),
+            'score': result.score, 'depth': result.depth, 'nodes': result.nodes,
+            'pv': [str(move) for move in result.pv]}
+
+
+@dataclass
+class Session:
+    game: Game
+    clients: Set[asyncio.StreamWriter] = field(default_factory=set)
+
+
+class GameServer:
+    '''Hosts the sessions and dispatches each request to an ``op_*``
+    method.  Handlers raise ``ValueError`` or ``RuntimeError`` to answer
+    with an error message.'''
+
+    def __init__(self, workers: int = None):
+        self.sessions: Dict[int, Session] = {}
+        self.ids = itertools.count(1)
+        self.workers = workers
+        self.executor = None  # Started by the first analysis
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8765) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self.handle, host, port, limit=MAX_LINE)
+
+    def close(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    async def handle(self, reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter) -> None:
+        joined = set()
+        tasks = set()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    self.send(writer, {'error': "Request too long"})
+                    break
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("Request must be a JSON object")
+                except ValueError as e:
+                    self.send(writer, {'error': f"Invalid request: {e}"})
+                    continue
+                if request.get('op') == 'analyze':
+                    # Searches answer out of order so they hold up nothing
+                    task = asyncio.create_task(self.reply(request, writer, joined))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                else:
+                    await self.reply(request, writer, joined)
+                if writer.is_closing():
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            for game_id in joined:
+                self.leave(game_id, writer)
+            writer.close()
+
+    async def reply(self, request: dict, writer: asyncio.StreamWriter, joined: set) -> None:
+        op = request.get('op')
+        handler = getattr(self, f"op_{op}", None)
+        try:
+            if handler is None:
+                raise ValueError(f"Unknown op: {op!r}")
+            # Other requests are served while a search runs, so a scope
+            # around one would count their calls too
+            with Instrument.scope(op) if op != 'analyze' else nullcontext():
+                response = await handler(request, writer, joined)
+        except (ValueError, RuntimeError) as e:
+            response = {'error': str(e)}
+        if 'id' in request:
+            response['id'] = request['id']
+        self.send(writer, response)
+
+    def send(self, writer: asyncio.StreamWriter, message: dict) -> None:
+        if writer.is_closing():
+            return
+        if writer.transport.get_write_buffer_size() > MAX_PENDING_BYTES:
+            writer.close()  # Not reading its messages
+            return
+        writer.write(json.dumps(message).encode() + b'\n')
+
+    def session(self, request: dict) -> Session:
+        game_id = request.get('game')
+        session = self.sessions.get(game_id) if isinstance(game_id, int) else None
+        if session is None:
+            raise ValueError(f"No such game: {request.get('game')!r}")
+        return session
+
+    def leave(self, game_id: int, writer: asyncio.StreamWriter) -> None:
+        session = self.sessions.get(game_id)
+        if session is not None:
+            session.clients.discard(writer)
+            if not session.clients:
+                del self.sessions[game_id]
+
+    @staticmethod
+    def status(game: Game) -> dict:
+        return {'fen': game.to_fen(), 'turn': game.turn, 'check': game.is_check(),
+                'checkmate': game.is_checkmate(), 'outcome': game.outcome()}
+
+    async def op_new(self, request, writer, joined) -> dict:
+        fen = request.get('fen')
+        if fen is not None and not isinstance(fen, str):
+            raise ValueError("fen must be a string")
+        game = Game.from_fen(fen) if fen else Game()
+        game_id = next(self.ids)
+        self.sessions[game_id] = Session(game, {writer})
+        joined.add(game_id)
+        return {'game': game_id, **self.status(game)}
+
+    async def op_join(self, request, writer, joined) -> dict:
+        session = self.session(request)
+        session.clients.add(writer)
+        joined.add(request['game'])
+        return {'game': request['game'], **self.status(session.game)}
+
+    async def op_leave(self, request, writer, joined) -> dict:
+        self.session(request)
+        joined.discard(request['game'])
+        self.leave(request['game'], writer)
+        return {'game': request['game']}
+
+    async def op_move(self, request, writer, joined) -> dict:
+        session = self.session(request)
+        game = session.game
+        outcome = game.outcome()
+        if outcome is not None:
+            raise ValueError(f"The game is over: {outcome}")
+        move = Move.from_uci(str(request.get('move', '')))
+        piece = game.board[move.src.y][move.src.x]
+        if piece is None or piece.color != game.turn:
+            raise ValueError(f"Not a piece of the side to move: {move}")
+        game.move_piece(move.src, move.dst, move.promotion or Queen)
+
+        status = {'game': request['game'], 'move': str(move), **self.status(game)}
+        for client in list(session.clients):
+            if client is not writer:
+                self.send(client, {'event': 'move', **status})
+        return status
+
+    async def op_moves(self, request, writer, joined) -> dict:
+        game = self.session(request).game
+        return {'game': request['game'],
+                'moves': [str(move) for moves in game.cached_moves().values()
+                          for move in moves]}
+
+    async def op_analyze(self, request, writer, joined) -> dict:
+        game = self.session(request).game
+        time_limit = request.get('time', 1.0)
+        if isinstance(time_limit, bool) or not isinstance(time_limit, (int, float)):
+            raise ValueError("time must be a number")
+        time_limit = min(float(time_limit), MAX_ANALYSIS_TIME)
+        depth = request.get('depth')
+        if depth is not None and (isinstance(depth, bool) or not isinstance(depth, int)
+                                  or depth < 1):
+            raise ValueError("depth must be a positive integer")
+        fen, moves = game_record(game)
+        position = game.to_fen()  # The game may move on during the search
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(self.workers)
+        result = await asyncio.get_running_loop().run_in_executor(
+            self.executor, _analyze, fen, moves, time_limit, depth)
+        return {'game': request['game'], 'fen': position, **result}
+
+
+async def export_metrics(path: str) -> None:
+    while True:
+        await asyncio.sleep(METRICS_INTERVAL)
+        Instrument.write_prometheus(path)
+
+
+async def serve(host: str, port: int, workers: int = None, metrics: str = None) -> None:
+    game_server = GameServer(workers)
+    server = await game_server.start(host, port)
+    print(f"Serving on {', '.join(str(sock.getsockname()) for sock in server.sockets)}",
+          file=sys.stderr)
+    exporter = None
+    if metrics:
+        Instrument.enable()
+        exporter = asyncio.create_task(export_metrics(metrics))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if exporter is not None:
+            exporter.cancel()
+            Instrument.write_prometheus(metrics)
+        game_server.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Host chess games over TCP")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=None,
+                        help="analysis processes (default: one per CPU)")
+    parser.add_argument('--metrics', help="file to write Prometheus metrics to")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.metrics))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,464 @@
+'''Endgame tablebases: retrograde analysis of pawnless endings.
+
+A table holds every placement of one set of pieces, e.g. ``KQvK`` or
+``KRvKN``, with either side to move.  Each position gets its result for
+the side to move (win, draw or loss) and its distance to mate in plies:
+
+    header    b'CHTB', version (u16), piece count (u16), signature (16 bytes)
+    wdl       2 bits per position: 0 illegal, 1 draw, 2 win, 3 loss
+    dtm       1 byte per position: plies to mate, 0 for draws
+
+Positions are indexed by side to move and then the square (y * 8 + x) of
+each piece, White's king first, then White's other pieces from the
+queen down, then Black's in the same order.  A table of n pieces has
+2 * 64**n positions, so four pieces come to 40 megabytes a table.
+Tables are read through mmap, and a probe is a couple of byte reads.
+
+Generation works backwards from the mates.  Every position starts with
+a count of its moves that stay in the table, and captures, which leave
+it, are scored from the smaller table they lead to.  Positions are then
+settled in order of distance: a position with a move to a lost position
+is won, and one whose every move has been found to lead to a won
+position is lost.  What is never settled is a draw.  The moves are those
+of ``Piece.get_possible_moves``, from the same move tables.  Endings with
+pawns, and positions with castling rights, are not covered.
+
+    python Tablebase.py generate KQvK KRvK --dir tables
+
+    tablebases = Tablebases('tables')
+    tablebases.probe(game)       # (WIN, 19): mates in 19 plies
+'''
+import argparse
+import itertools
+import mmap
+import os
+import struct
+import sys
+from typing import Dict, Iterator, List, Optional, Tuple
+from ChessBoard import Game
+from Fen import LETTER_PIECES, PIECE_LETTERS
+from Piece import *
+
+MAGIC = b'CHTB'
+VERSION = 1
+HEADER = struct.Struct('<4sHH16s')
+MAX_PIECES = 4
+MAX_DTM = 0xFF
+
+ILLEGAL, DRAW, WIN, LOSS = range(4)
+_UNKNOWN = 4  # Not settled yet, while generating
+
+# Rough material values that decide which side of a table is White
+_STRENGTH = {QUEEN: 9, ROOK: 5, BISHOP: 3, KNIGHT: 3}
+
+Signature = Tuple[Tuple[int, ...], Tuple[int, ...]]  # (White kinds, Black kinds)
+
+
+def _square_rays(rays) -> Tuple[Tuple[int, ...], ...]:
+    return tuple(tuple(pos.sq for pos in ray) for ray in rays)
+
+
+# For each piece kind and square, the rays a piece moves along: one
+# square each for kings and knights
+RAYS = {KING: [_square_rays([pos] for pos in KING_TARGETS[sq >> 3][sq & 7])
+               for sq in range(64)],
+        KNIGHT: [_square_rays([pos] for pos in KNIGHT_TARGETS[sq >> 3][sq & 7])
+                 for sq in range(64)],
+        BISHOP: [_square_rays(BISHOP_RAYS[sq >> 3][sq & 7]) for sq in range(64)],
+        ROOK: [_square_rays(ROOK_RAYS[sq >> 3][sq & 7]) for sq in range(64)],
+        QUEEN: [_square_rays(QUEEN_RAYS[sq >> 3][sq & 7]) for sq in range(64)]}
+
+# PATHS[kind][src][dst]: the squares a piece passes over from src to dst
+PATHS = {kind: [{ray[i]: ray[:i] for ray in RAYS[kind][sq] for i in range(len(ray))}
+                for sq in range(64)]
+         for kind in RAYS}
+
+
+def _side_key(kinds: Tuple[int, ...]) -> tuple:
+    return sum(_STRENGTH.get(kind, 0) for kind in kinds), len(kinds), kinds
+
+
+def canonical(white: List[int], black: List[int]) -> Tuple[Signature, bool]:
+    '''Signature of the table holding these pieces, and whether the
+    colors are swapped in it: the stronger side is always White'''
+    white = (KING,) + tuple(sorted((k for k in white if k != KING), reverse=True))
+    black = (KING,) + tuple(sorted((k for k in black if k != KING), reverse=True))
+    if _side_key(black) > _side_key(white):
+        return (black, white), True
+    return (white, black), False
+
+
+def format_signature(signature: Signature) -> str:
+    return 'v'.join(''.join(PIECE_LETTERS[PIECE_CLASSES[kind]].upper() for kind in side)
+                    for side in signature)
+
+
+def parse_signature(text: str) -> Signature:
+    '''Signature of a name such as KQvK, in canonical order'''
+    try:
+        white, black = text.upper().split('V')
+        sides = [[LETTER_PIECES[letter.lower()].kind for letter in side]
+                 for side in (white, black)]
+    except (ValueError, KeyError):
+        raise ValueError(f"Invalid table name: {text!r}") from None
+    for side in sides:
+        if side.count(KING) != 1:
+            raise ValueError(f"Each side needs exactly one king: {text!r}")
+        if PAWN in side:
+            raise ValueError(f"Endings with pawns are not supported: {text!r}")
+    if len(sides[0]) + len(sides[1]) > MAX_PIECES:
+        raise ValueError(f"Tables have at most {MAX_PIECES} pieces: {text!r}")
+    return canonical(*sides)[0]
+
+
+def _index(squares, side: int) -> int:
+    index = side
+    for sq in squares:
+        index = index << 6 | sq
+    return index
+
+
+class Table:
+    '''One table, read from the bytes of a table file'''
+
+    def __init__(self, data):
+        magic, version, count, name = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a tablebase file")
+        self.data = data
+        self.signature = parse_signature(name.rstrip(b'\0').decode('ascii'))
+        self.kinds = self.signature[0] + self.signature[1]
+        self.colors = (0,) * len(self.signature[0]) + (1,) * len(self.signature[1])
+        self.size = 2 << 6 * count
+        self.dtm_offset = HEADER.size + self.size // 4
+        if count != len(self.kinds) or len(data) != self.dtm_offset + self.size:
+            raise ValueError("Truncated tablebase file")
+
+    @property
+    def name(self) -> str:
+        return format_signature(self.signature)
+
+    def wdl(self, index: int) -> int:
+        return self.data[HEADER.size + (index >> 2)] >> (index & 3) * 2 & 3
+
+    def dtm(self, index: int) -> int:
+        return self.data[self.dtm_offset + index]
+
+    def lookup(self, squares, side: int) -> Tuple[int, int]:
+        '''(result, plies to mate) for the side to move, side 0 being
+        White, with the pieces on squares in table order'''
+        index = _index(squares, side)
+        return self.wdl(index), self.dtm(index)
+
+
+def _pack(signature: Signature, value: bytearray, dtm: bytearray) -> bytes:
+    '''Table file bytes for the generated results'''
+    wdl = bytearray(len(value) // 4)
+    for index, result in enumerate(value):
+        if result:
+            wdl[index >> 2] |= result << (index & 3) * 2
+    header = HEADER.pack(MAGIC, VERSION, len(signature[0]) + len(signature[1]),
+                         format_signature(signature).encode('ascii'))
+    return header + bytes(wdl) + bytes(dtm)
+
+
+class _Generator:
+    '''Retrograde analysis of one table'''
+
+    def __init__(self, signature: Signature, tables: Dict[Signature, Table]):
+        self.signature = signature
+        self.tables = tables
+        self.kinds = signature[0] + signature[1]
+        self.colors = (0,) * len(signature[0]) + (1,) * len(signature[1])
+        self.kings = (0, len(signature[0]))  # Index of each side's king
+        self.n = len(self.kinds)
+
+    def attacked(self, squares, target: int, by: int) -> bool:
+        '''Whether a piece of side by attacks target'''
+        occupied = set(squares)
+        for i, sq in enumerate(squares):
+            if self.colors[i] == by:
+                path = PATHS[self.kinds[i]][sq].get(target)
+                if path is not None and occupied.isdisjoint(path):
+                    return True
+        return False
+
+    def moves(self, squares, side: int) -> Iterator[Tuple[int, int, int]]:
+        '''(piece, destination, captured piece or -1) of each legal move'''
+        occupied = {sq: i for i, sq in enumerate(squares)}
+        king = self.kings[side]
+        enemies = [(PATHS[self.kinds[j]][sq], j) for j, sq in enumerate(squares)
+                   if self.colors[j] != side]
+        for i, sq in enumerate(squares):
+            if self.colors[i] != side:
+                continue
+            for ray in RAYS[self.kinds[i]][sq]:
+                for dst in ray:
+                    captured = occupied.get(dst, -1)
+                    if captured >= 0 and self.colors[captured] == side:
+                        break
+                    after = list(squares)
+                    after[i] = dst
+                    target = after[king]
+                    for paths, j in enemies:
+                        path = paths.get(target)
+                        if (j != captured and path is not None
+                                and not any(over in after for over in path)):
+                            break  # Leaves the king in check
+                    else:
+                        yield i, dst, captured
+                    if captured >= 0:
+                        break
+
+    def capture_result(self, squares, side: int, captured: int) -> Tuple[int, int]:
+        '''Result for side to move after a capture of piece captured, with
+        the other pieces on squares'''
+        pieces = [(self.kinds[i], self.colors[i], sq)
+                  for i, sq in enumerate(squares) if i != captured]
+        white = [kind for kind, color, _ in pieces if color == 0]
+        black = [kind for kind, color, _ in pieces if color == 1]
+        if len(pieces) == 2:
+            return DRAW, 0  # Bare kings
+        signature, swapped = canonical(white, black)
+        table = self.tables.get(signature)
+        if table is None:
+            table = self.tables[signature] = generate(signature, self.tables)
+        return table.lookup(_order(signature, pieces, swapped), side ^ swapped)
+
+    def score_moves(self, squares, side: int) -> Tuple[bool, int, Optional[int], int]:
+        '''(whether side has a move, moves that are not yet known to lose,
+        quickest win by a capture, longest loss by a capture) of one
+        position.  Captures leave the table, so they are scored here from
+        the table they lead to.'''
+        has_moves = False
+        count = 0
+        best_win = None
+        longest = 0
+        for piece, dst, captured in self.moves(squares, side):
+            has_moves = True
+            if captured < 0:
+                count += 1
+                continue
+            after = list(squares)
+            after[piece] = dst
+            result, distance = self.capture_result(after, 1 - side, captured)
+            if result == WIN:
+                longest = max(longest, distance + 1)
+                continue
+            # A winning or drawn capture keeps the position from losing
+            count += 1
+            if result == LOSS and (best_win is None or distance + 1 < best_win):
+                best_win = distance + 1
+        return has_moves, count, best_win, longest
+
+    def positions(self) -> Iterator[Tuple[Tuple[int, ...], int]]:
+        '''(squares, side to move) of every placement of the pieces'''
+        for squares in itertools.product(range(64), repeat=self.n):
+            if len(set(squares)) == self.n:
+                yield squares, 0
+                yield squares, 1
+
+    def run(self) -> Table:
+        n, size = self.n, 2 << 6 * self.n
+        value = bytearray(size)  # ILLEGAL until shown otherwise
+        dtm = bytearray(size)
+        remaining = bytearray(size)  # Moves not yet shown to lose
+        longest = bytearray(size)  # Longest loss among the moves that do
+        buckets: Dict[int, List[Tuple[int, int]]] = {}
+
+        def settle(index: int, result: int, distance: int) -> None:
+            if distance > MAX_DTM:
+                raise RuntimeError("Mate too long for the table format")
+            buckets.setdefault(distance, []).append((index, result))
+
+        for squares, side in self.positions():
+            if self.attacked(squares, squares[self.kings[1 - side]], side):
+                continue  # The side not to move is in check
+            index = _index(squares, side)
+            value[index] = _UNKNOWN
+
+        for squares, side in self.positions():
+            index = _index(squares, side)
+            if value[index] != _UNKNOWN:
+                continue
+            has_moves, count, best_win, longest[index] = self.score_moves(squares, side)
+            if not has_moves:
+                king = squares[self.kings[side]]
+                if self.attacked(squares, king, 1 - side):
+                    settle(index, LOSS, 0)
+                else:
+                    value[index] = DRAW
+            elif best_win is not None:
+                settle(index, WIN, best_win)
+            if count == 0 and has_moves:
+                settle(index, LOSS, longest[index])
+            remaining[index] = count
+
+        distance = 0
+        while buckets:
+            for index, result in buckets.pop(distance, ()):
+                if value[index] != _UNKNOWN:
+                    continue
+                value[index] = result
+                dtm[index] = distance
+                for previous in self.unmoves(index):
+                    if value[previous] != _UNKNOWN:
+                        continue
+                    if result == LOSS:
+                        settle(previous, WIN, distance + 1)
+                    else:
+                        remaining[previous] -= 1
+                        longest[previous] = max(longest[previous], distance + 1)
+                        if remaining[previous] == 0:
+                            settle(previous, LOSS, longest[previous])
+            distance += 1
+
+        for index in range(size):
+            if value[index] == _UNKNOWN:
+                value[index] = DRAW
+        return Table(_pack(self.signature, value, dtm))
+
+    def unmoves(self, index: int) -> Iterator[int]:
+        '''Indices of the positions with a move that is not a capture to
+        the position at index'''
+        n = self.n
+        side = index >> 6 * n
+        squares = [index >> 6 * (n - 1 - i) & 63 for i in range(n)]
+        occupied = set(squares)
+        mover = 1 - side
+        for i, sq in enumerate(squares):
+            if self.colors[i] != mover:
+                continue
+            for ray in RAYS[self.kinds[i]][sq]:
+                for src in ray:
+                    if src in occupied:
+                        break
+                    squares[i] = src
+                    yield _index(squares, mover)
+                squares[i] = sq
+
+
+def _order(signature: Signature, pieces, swapped: bool) -> List[int]:
+    '''Squares of pieces, given as (kind, color, square), in the order of
+    the table with signature'''
+    table_pieces = sorted(((kind, color ^ swapped, sq) for kind, color, sq in pieces),
+                          key=lambda piece: (piece[1], piece[0] != KING, -piece[0]))
+    return [sq for _, _, sq in table_pieces]
+
+
+def generate(signature: Signature, tables: Dict[Signature, Table] = None) -> Table:
+    '''Generate a table, and any smaller ones that its captures lead to
+    and that are not in tables'''
+    tables = tables if tables is not None else {}
+    return _Generator(signature, tables).run()
+
+
+class Tablebases:
+    '''The tables of a directory, mapped as they are first needed'''
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.tables: Dict[Signature, Optional[Table]] = {}
+
+    def table(self, signature: Signature) -> Optional[Table]:
+        if signature not in self.tables:
+            path = os.path.join(self.directory, format_signature(signature) + '.ctb')
+            table = None
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    table = Table(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            self.tables[signature] = table
+        return self.tables[signature]
+
+    def probe(self, game: Game) -> Optional[Tuple[int, int]]:
+        '''(WIN, DRAW or LOSS for the side to move, plies to mate) of the
+        position of game, or None when it is not in the tables'''
+        if game.castling:
+            return None
+        pieces = []
+        for y, row in enumerate(game.board):
+            for x, piece in enumerate(row):
+                if piece is not None:
+                    pieces.append((piece.kind, piece.color == 'black', y * 8 + x))
+        if len(pieces) > MAX_PIECES or any(kind == PAWN for kind, _, _ in pieces):
+            return None
+        if len(pieces) == 2:
+            return DRAW, 0
+        white = [kind for kind, color, _ in pieces if not color]
+        black = [kind for kind, color, _ in pieces if color]
+        signature, swapped = canonical(white, black)
+        table = self.table(signature)
+        if table is None:
+            return None
+        result = table.lookup(_order(signature, pieces, swapped),
+                              (game.turn == 'black') ^ swapped)
+        return result if result[0] != ILLEGAL else None
+
+    def best_move(self, game: Game) -> Optional[Tuple[Move, int, int]]:
+        '''(move, result, plies to mate) of the quickest win, the slowest
+        loss, or a move that holds the draw; None when the position or
+        one of its successors is not in the tables'''
+        found = self.probe(game)
+        if found is None:
+            return None
+        result, _ = found
+        best = None
+        for move in game.legal_moves():
+            game.make_move(move)
+            after = self.probe(game)
+            game.unmake_move()
+            if after is None:
+                return None
+            # The opponent's result, turned into ours
+            ours = {WIN: LOSS, LOSS: WIN, DRAW: DRAW}[after[0]]
+            distance = after[1] + 1 if ours != DRAW else 0
+            if ours != result:
+                continue
+            if (best is None or (result == WIN and distance < best[2])
+                    or (result == LOSS and distance > best[2])):
+                best = (move, result, distance)
+        return best
+
+    def close(self) -> None:
+        for table in self.tables.values():
+            if table is not None:
+                table.data.close()
+        self.tables = {}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Generate and probe endgame tablebases")
+    parser.add_argument('--dir', default='.', help="directory of the table files")
+    commands = parser.add_subparsers(dest='command', required=True)
+    make = commands.add_parser('generate', help="generate tables such as KQvK")
+    make.add_argument('names', nargs='+')
+    probe = commands.add_parser('probe', help="look up a position")
+    probe.add_argument('fen')
+    args = parser.parse_args(argv)
+
+    if args.command == 'generate':
+        os.makedirs(args.dir, exist_ok=True)
+        tables: Dict[Signature, Table] = {}
+        for name in args.names:
+            signature = parse_signature(name)
+            tables[signature] = generate(signature, tables)
+        for table in tables.values():
+            with open(os.path.join(args.dir, table.name + '.ctb'), 'wb') as f:
+                f.write(table.data)
+            print(f"Wrote {table.name}", file=sys.stderr)
+    else:
+        tablebases = Tablebases(args.dir)
+        game = Game.from_fen(args.fen)
+        found = tablebases.best_move(game) or tablebases.probe(game)
+        if found is None:
+            print("not in the tables")
+        else:
+            *move, result, distance = found
+            words = {WIN: f"win, mate in {distance} plies",
+                     LOSS: f"loss, mated in {distance} plies", DRAW: "draw"}
+            print(words[result] + (f", best move {move[0]}" if move else ''))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
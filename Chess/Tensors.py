@@ -0,0 +1,203 @@
+'''Batches of positions as NumPy arrays, with vectorized attack, check
+and move counting.
+
+A batch of N positions is held either as ``(N, 12, 8, 8)`` uint8 piece
+planes, indexed ``[n, code, y, x]`` by ``Piece.code`` (the kind, plus 6
+for Black), or as ``(N, 12)`` uint64 bitboards with bit ``y * 8 + x``, as
+in ``Bitboard``.  Side to move is a separate ``(N,)`` array of ``WHITE``
+(0) and ``BLACK`` (1).  Every query works on the whole batch at once
+with shifts and masks; sliding attacks use Kogge-Stone fills, so no
+Python code runs per position or per square.
+
+    planes, turns = encode_games(games)
+    boards = to_bitboards(planes)
+    checks = in_check(boards, turns)       # (N,) bool
+    counts = move_counts(boards, turns)    # (N,) pseudo-legal moves
+
+Requires NumPy.
+'''
+from typing import Iterable, List, Tuple
+import numpy as np
+from Bitboard import (BISHOP_DIRECTIONS, FULL, NOT_FILE_A, NOT_FILE_AB, NOT_FILE_GH,
+                      NOT_FILE_H, RANK_1, RANK_3, RANK_6, RANK_8, ROOK_DIRECTIONS)
+from ChessBoard import Game
+from Fen import PIECE_LETTERS, format_fen
+from Piece import *
+
+PLANES = 12
+
+# (shift, mask applied after the shift) of each knight jump and king step
+KNIGHT_JUMPS = ((17, NOT_FILE_A), (15, NOT_FILE_H), (10, NOT_FILE_AB), (6, NOT_FILE_GH),
+                (-6, NOT_FILE_AB), (-10, NOT_FILE_GH), (-15, NOT_FILE_A), (-17, NOT_FILE_H))
+KING_STEPS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+
+_SQUARE_BITS = np.left_shift(np.uint64(1), np.arange(64, dtype=np.uint64))
+
+
+def board_planes(board) -> np.ndarray:
+    '''(12, 8, 8) planes of a ``Game.board``'''
+    planes = np.zeros((PLANES, 8, 8), dtype=np.uint8)
+    for y, row in enumerate(board):
+        for x, piece in enumerate(row):
+            if piece is not None:
+                planes[piece.code, y, x] = 1
+    return planes
+
+
+def encode_games(games: Iterable[Game]) -> Tuple[np.ndarray, np.ndarray]:
+    '''(planes, turns) of a sequence of games'''
+    games = list(games)
+    planes = np.zeros((len(games), PLANES, 8, 8), dtype=np.uint8)
+    turns = np.zeros(len(games), dtype=np.uint8)
+    for n, game in enumerate(games):
+        for y, row in enumerate(game.board):
+            for x, piece in enumerate(row):
+                if piece is not None:
+                    planes[n, piece.code, y, x] = 1
+        turns[n] = game.turn == 'black'
+    return planes, turns
+
+
+def placement(planes: np.ndarray) -> List[List[str]]:
+    '''FEN letters of one position's (12, 8, 8) planes, as rows of
+    ``Game.board``; None for an empty square'''
+    rows = [[None] * 8 for _ in range(8)]
+    for code, y, x in zip(*np.nonzero(planes)):
+        letter = PIECE_LETTERS[PIECE_CLASSES[code % 6]]
+        rows[y][x] = letter if code >= 6 else letter.upper()
+    return rows
+
+
+def decode_games(planes: np.ndarray, turns: np.ndarray) -> List[Game]:
+    '''Games with the positions of a batch of planes.  The arrays carry
+    no castling rights, en passant square or move counters, so the games
+    have none.'''
+    return [Game.from_fen(format_fen(placement(planes[n]), COLORS[turns[n]], 0, None, 0, 1))
+            for n in range(len(planes))]
+
+
+def to_bitboards(planes: np.ndarray) -> np.ndarray:
+    '''(N, 12) bitboards of (N, 12, 8, 8) planes'''
+    bits = planes.reshape(len(planes), PLANES, 64).astype(bool)
+    return np.bitwise_or.reduce(np.where(bits, _SQUARE_BITS, np.uint64(0)), axis=2)
+
+
+def to_planes(bitboards: np.ndarray) -> np.ndarray:
+    '''(N, 12, 8, 8) planes of (N, 12) bitboards'''
+    bits = (bitboards[..., None] & _SQUARE_BITS) != 0
+    return bits.astype(np.uint8).reshape(len(bitboards), PLANES, 8, 8)
+
+
+def popcount(bb: np.ndarray) -> np.ndarray:
+    '''Number of set bits of each element'''
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(bb).astype(np.int64)
+    bb = bb - ((bb >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    bb = (bb & np.uint64(0x3333333333333333)) + ((bb >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    bb = (bb + (bb >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return ((bb * np.uint64(0x0101010101010101)) >> np.uint64(56)).astype(np.int64)
+
+
+def shift(bb: np.ndarray, offset: int, mask: int = FULL) -> np.ndarray:
+    '''Shift towards higher squares by offset (lower when negative), then
+    mask off the squares that wrapped around a board edge'''
+    if offset > 0:
+        bb = bb << np.uint64(offset)
+    else:
+        bb = bb >> np.uint64(-offset)
+    return bb & np.uint64(mask)
+
+
+def ray_attacks(pieces: np.ndarray, empty: np.ndarray, offset: int, mask: int) -> np.ndarray:
+    '''Squares reached from pieces in one direction, up to and including
+    the first occupied square: a Kogge-Stone occluded fill'''
+    empty = empty & np.uint64(mask)
+    for step in (offset, offset * 2, offset * 4):
+        pieces = pieces | (empty & shift(pieces, step))
+        empty = empty & shift(empty, step)
+    return shift(pieces, offset, mask)
+
+
+def _sides(bitboards: np.ndarray, color: int):
+    '''(own pieces by kind, own occupancy, enemy occupancy) for color'''
+    own = bitboards[:, color * 6:color * 6 + 6]
+    enemy = bitboards[:, (1 - color) * 6:(1 - color) * 6 + 6]
+    return own, np.bitwise_or.reduce(own, axis=1), np.bitwise_or.reduce(enemy, axis=1)
+
+
+def pawn_attacks(pawns: np.ndarray, color: int) -> np.ndarray:
+    if color == WHITE:
+        return shift(pawns, 9, NOT_FILE_A) | shift(pawns, 7, NOT_FILE_H)
+    return shift(pawns, -7, NOT_FILE_A) | shift(pawns, -9, NOT_FILE_H)
+
+
+def attacks(bitboards: np.ndarray, color: int) -> np.ndarray:
+    '''(N,) bitboards of the squares color attacks'''
+    own, occupancy, enemy = _sides(bitboards, color)
+    empty = ~(occupancy | enemy)
+    attacked = pawn_attacks(own[:, PAWN], color)
+    for offset, mask in KNIGHT_JUMPS:
+        attacked |= shift(own[:, KNIGHT], offset, mask)
+    for offset, mask in KING_STEPS:
+        attacked |= shift(own[:, KING], offset, mask)
+    straight = own[:, ROOK] | own[:, QUEEN]
+    diagonal = own[:, BISHOP] | own[:, QUEEN]
+    for offset, mask in ROOK_DIRECTIONS:
+        attacked |= ray_attacks(straight, empty, offset, mask)
+    for offset, mask in BISHOP_DIRECTIONS:
+        attacked |= ray_attacks(diagonal, empty, offset, mask)
+    return attacked
+
+
+def attacked_squares(bitboards: np.ndarray, turns: np.ndarray) -> np.ndarray:
+    '''(N,) bitboards of the squares the side not to move attacks'''
+    return np.where(turns == WHITE, attacks(bitboards, BLACK), attacks(bitboards, WHITE))
+
+
+def in_check(bitboards: np.ndarray, turns: np.ndarray) -> np.ndarray:
+    '''(N,) flags: whether the side to move is in check'''
+    kings = np.where(turns == WHITE, bitboards[:, KING], bitboards[:, 6 + KING])
+    return (kings & attacked_squares(bitboards, turns)) != 0
+
+
+def _move_counts(bitboards: np.ndarray, color: int) -> np.ndarray:
+    own, occupancy, enemy = _sides(bitboards, color)
+    empty = ~(occupancy | enemy)
+    free = ~occupancy
+    promotion_rank = np.uint64(RANK_8 if color == WHITE else RANK_1)
+
+    def count(targets):
+        # A promotion is four moves, one per piece
+        return popcount(targets) + 3 * popcount(targets & promotion_rank)
+
+    pawns = own[:, PAWN]
+    forward = 8 if color == WHITE else -8
+    single = shift(pawns, forward) & empty
+    double = shift(single & np.uint64(RANK_3 if color == WHITE else RANK_6), forward) & empty
+    total = count(single) + popcount(double)
+    for offset, mask in (((9, NOT_FILE_A), (7, NOT_FILE_H)) if color == WHITE
+                         else ((-7, NOT_FILE_A), (-9, NOT_FILE_H))):
+        total += count(shift(pawns, offset, mask) & enemy)
+
+    # Each jump or step moves every piece to a different square, and in
+    # one direction no two rays overlap: a piece behind another is
+    # blocked by it.  So target counts add up without double counting.
+    for offset, mask in KNIGHT_JUMPS:
+        total += popcount(shift(own[:, KNIGHT], offset, mask) & free)
+    for offset, mask in KING_STEPS:
+        total += popcount(shift(own[:, KING], offset, mask) & free)
+    straight = own[:, ROOK] | own[:, QUEEN]
+    diagonal = own[:, BISHOP] | own[:, QUEEN]
+    for offset, mask in ROOK_DIRECTIONS:
+        total += popcount(ray_attacks(straight, empty, offset, mask) & free)
+    for offset, mask in BISHOP_DIRECTIONS:
+        total += popcount(ray_attacks(diagonal, empty, offset, mask) & free)
+    return total
+
+
+def move_counts(bitboards: np.ndarray, turns: np.ndarray) -> np.ndarray:
+    '''(N,) numbers of pseudo-legal moves of the side to move, promotions
+    counted once per piece; castling and en passant are left out, as the
+    arrays do not record the rights'''
+    return np.where(turns == WHITE, _move_counts(bitboards, WHITE),
+                    _move_counts(bitboards, BLACK))
@@ -0,0 +1,125 @@
+'''Fixed-size transposition table for searches over ``Game``.
+
+Entries live in one preallocated buffer of unsigned 64-bit words, so the
+table never grows past its megabyte budget.  Each bucket holds two
+slots: the first keeps the deepest result seen for the bucket, the
+second is overwritten by every store that does not qualify for the
+first.
+'''
+from typing import Optional
+
+EXACT = 0
+LOWER = 1  # Score is a lower bound (fail high)
+UPPER = 2  # Score is an upper bound (fail low)
+
+SLOT_WORDS = 2  # key word, data word
+BUCKET_WORDS = 2 * SLOT_WORDS
+BUCKET_BYTES = BUCKET_WORDS * 8
+
+SCORE_OFFSET = 1 << 15
+
+
+def table_bytes(size_mb: float) -> int:
+    '''Size of a table of at most size_mb megabytes, rounded down to a
+    power-of-two number of buckets'''
+    buckets = max(1, int(size_mb * (1 << 20)) // BUCKET_BYTES)
+    return (1 << (buckets.bit_length() - 1)) * BUCKET_BYTES
+
+
+def pack(depth: int, score: int, bound: int, move: int, age: int) -> int:
+    '''Pack an entry into one 64-bit word: move (16 bits), score (16,
+    so it must lie within +-32767), depth (8), bound (2), age (6)'''
+    return (move | (score + SCORE_OFFSET) << 16 | (depth & 0xFF) << 32
+            | bound << 40 | (age & 0x3F) << 42)
+
+
+def unpack(data: int) -> tuple[int, int, int, int]:
+    '''Return (depth, score, bound, move) from a packed word'''
+    return (data >> 32 & 0xFF, (data >> 16 & 0xFFFF) - SCORE_OFFSET,
+            data >> 40 & 3, data & 0xFFFF)
+
+
+class TranspositionTable:
+    '''Search results keyed by the 64-bit Zobrist key of a position.
+
+    ``size_mb`` is rounded down to a power-of-two number of buckets.  A
+    writable buffer such as a ``bytearray`` or shared memory block can
+    be passed in to hold the entries; its size then decides the number of
+    buckets.  The key word of a slot is stored XORed with its data word,
+    so a slot torn by concurrent writers simply fails to match on probe.
+    '''
+
+    def __init__(self, size_mb: float = 16, buffer=None):
+        if buffer is None:
+            buffer = bytearray(table_bytes(size_mb))
+        buckets = len(buffer) // BUCKET_BYTES
+        if buckets < 1 or buckets & (buckets - 1):
+            raise ValueError("Buffer must hold a power-of-two number of buckets")
+        self.buffer = buffer
+        self.words = memoryview(buffer).cast('B').cast('Q')
+        self.mask = buckets - 1
+        self.age = 0
+
+    @property
+    def buckets(self) -> int:
+        return self.mask + 1
+
+    @property
+    def size_bytes(self) -> int:
+        return self.buckets * BUCKET_BYTES
+
+    def new_search(self) -> None:
+        '''Age the table so entries from earlier searches are replaced
+        first'''
+        self.age = (self.age + 1) & 0x3F
+
+    def clear(self) -> None:
+        self.words[:] = memoryview(bytes(self.size_bytes)).cast('Q')
+        self.age = 0
+
+    def probe(self, key: int) -> Optional[tuple[int, int, int, int]]:
+        '''Return (depth, score, bound, move) stored for key, or None'''
+        words = self.words
+        base = (key & self.mask) * BUCKET_WORDS
+        for index in (base, base + SLOT_WORDS):
+            data = words[index + 1]
+            if data and words[index] ^ data == key:
+                return unpack(data)
+        return None
+
+    def store(self, key: int, depth: int, score: int, bound: int,
+              move: int = 0) -> None:
+        words = self.words
+        base = (key & self.mask) * BUCKET_WORDS
+        old_data = words[base + 1]
+        old_key = words[base] ^ old_data
+
+        # Keep the move of an earlier entry for the same position when
+        # this search did not find one
+        if not move and old_key == key:
+            move = old_data & 0xFFFF
+        data = pack(depth, score, bound, move, self.age)
+
+        if (old_key == key or depth >= old_data >> 32 & 0xFF
+                or old_data >> 42 != self.age):
+            if old_data and old_key != key:
+                # Demote the displaced entry to the always-replace slot
+                words[base + SLOT_WORDS] = words[base]
+                words[base + SLOT_WORDS + 1] = old_data
+            words[base] = key ^ data
+            words[base + 1] = data
+        else:
+            words[base + SLOT_WORDS] = key ^ data
+            words[base + SLOT_WORDS + 1] = data
+
+    def hashfull(self) -> int:
+        '''Permille of the first thousand slots written during the
+        current search'''
+        words = self.words
+        sample = min(1000, self.buckets * 2)
+        used = 0
+        for slot in range(sample):
+            data = words[slot * SLOT_WORDS + 1]
+            if data and data >> 42 == self.age:
+                used += 1
+        return used * 1000 // sample
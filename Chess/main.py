@@ -20,7 +20,7 @@ while True:
         
         dst_x = ord(dst_parts[0].strip().lower()) - ord('a')
         dst_y = int(dst_parts[1].strip()) - 1
-        e,
+
         src_pos = Position(src_x, src_y)
         dst_pos = Position(dst_x, dst_y)
         
@@ -34,8 +34,12 @@ while True:
     if g.is_check():
         print("Check!")
 
-    if g.is_checkmate():
+    outcome = g.outcome()
+    if outcome == CHECKMATE:
         print("Checkmate!")
         break
+    if outcome is not None:
+        print("Draw by " + outcome + "!")
+        break
 
     turn = "BLACK" if turn == "WHITE" else "WHITE"
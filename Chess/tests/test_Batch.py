@@ -0,0 +1,54 @@
+import io
+import json
+import unittest
+from Batch import *
+
+FENS = [
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+    'rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3',
+    'not a fen',
+    '7k/5Q2/6K1/8/8/8/8/8 b - - 0 1',
+]
+
+PGN_TEXT = '''[White "A"]
+[Black "B"]
+[Result "1-0"]
+
+1. e4 e5 2. Bc4 Nc6 3. Qh5 Nf6 4. Qxf7# 1-0
+'''
+
+
+class BatchTest(unittest.TestCase):
+    def check_rows(self, rows):
+        self.assertEqual([row['index'] for row in rows], [0, 1, 2, 3])
+        self.assertEqual(rows[0]['legal_moves'], 20)
+        self.assertTrue(rows[1]['checkmate'])
+        self.assertIn('error', rows[2])
+        self.assertFalse(rows[3]['check'])
+        self.assertEqual(rows[3]['legal_moves'], 0)
+
+    def test_inline(self):
+        self.check_rows(list(run(FENS, analyze_fen, workers=0, chunk_size=3)))
+
+    def test_process_pool(self):
+        self.check_rows(list(run(FENS, analyze_fen, workers=2, chunk_size=1)))
+
+    def test_pgn(self):
+        units = list(pgn_units(io.StringIO(PGN_TEXT)))
+        rows = list(run(units, analyze_pgn, workers=0))
+        self.assertEqual(rows[0]['plies'], 7)
+        self.assertTrue(rows[0]['checkmate'])
+        self.assertEqual(rows[0]['white'], 'A')
+
+    def test_sinks(self):
+        rows = list(run(FENS[:2], analyze_fen, workers=0))
+        out = io.StringIO()
+        self.assertEqual(write_jsonl(rows, out), 2)
+        self.assertTrue(json.loads(out.getvalue().splitlines()[1])['checkmate'])
+        out = io.StringIO()
+        write_csv(rows, out, POSITION_FIELDS)
+        self.assertEqual(out.getvalue().splitlines()[0], ','.join(POSITION_FIELDS))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+import unittest
+from Bitboard import *
+from ChessBoard import Game
+
+
+class BitboardGameTest(unittest.TestCase):
+    def test_start_position(self):
+        bg = BitboardGame()
+        self.assertEqual(bg.occupied, RANK_1 | RANK_2 | RANK_7 | RANK_8)
+        self.assertEqual(bg.pieces[WHITE][KING], 1 << 4)
+        self.assertEqual(bg.pieces[BLACK][QUEEN], 1 << 59)
+
+    def test_from_game(self):
+        bg = BitboardGame.from_game(Game())
+        self.assertEqual(bg.mailbox, BitboardGame().mailbox)
+        self.assertEqual(bg.castling, ALL_CASTLING)
+
+    def test_to_game(self):
+        game = BitboardGame().to_game()
+        self.assertIsInstance(game.board[0][4], King)
+        self.assertEqual(game.board[0][4].p, Position(4, 0))
+        self.assertIsNone(game.board[3][3])
+
+    def test_to_game_counts_material(self):
+        game = BitboardGame.from_fen('8/8/8/4k3/8/8/8/4K3 w - - 0 1').to_game()
+        self.assertEqual(game.outcome(), 'insufficient material')
+        self.assertEqual(game.repetitions, {game.zobrist: 1})
+
+    def test_knight_moves(self):
+        bg = BitboardGame()
+        self.assertEqual(bg.get_possible_moves(Position(1, 0)),
+                         [Position(0, 2), Position(2, 2)])
+
+    def test_move_piece(self):
+        bg = BitboardGame()
+        bg.move_piece(Position(4, 1), Position(4, 3))
+        self.assertTrue(bg.is_empty(Position(4, 1)))
+        self.assertEqual(bg.ep_square, 20)
+        self.assertEqual(bg.turn, BLACK)
+
+    def test_invalid_move(self):
+        bg = BitboardGame()
+        with self.assertRaises(RuntimeError):
+            bg.move_piece(Position(0, 0), Position(0, 3))
+
+    def test_en_passant(self):
+        bg = BitboardGame()
+        bg.move_piece(Position(4, 1), Position(4, 3))
+        bg.move_piece(Position(0, 6), Position(0, 5))
+        bg.move_piece(Position(4, 3), Position(4, 4))
+        bg.move_piece(Position(3, 6), Position(3, 4))
+        bg.move_piece(Position(4, 4), Position(3, 5))
+        self.assertTrue(bg.is_empty(Position(3, 4)))
+
+    def test_castle(self):
+        bg = BitboardGame()
+        for sq in (5, 6):
+            bg.remove(sq)
+        bg.castle(Position(4, 0), Position(6, 0))
+        self.assertEqual(bg.mailbox[6], (WHITE, KING))
+        self.assertEqual(bg.mailbox[5], (WHITE, ROOK))
+        self.assertEqual(bg.castling, BLACK_KINGSIDE | BLACK_QUEENSIDE)
+
+    def test_move_piece_is_legal(self):
+        bg = BitboardGame.from_fen('4k3/4r3/8/8/8/8/4B3/4K3 w - - 0 1')
+        with self.assertRaises(RuntimeError):
+            bg.move_piece(Position(4, 1), Position(3, 2))  # Pinned
+        bg.move_piece(Position(4, 0), Position(3, 0))
+        bg = BitboardGame.from_fen('4k3/8/8/8/8/8/3r4/4K3 w - - 0 1')
+        with self.assertRaises(RuntimeError):
+            bg.move_piece(Position(4, 0), Position(4, 1))  # Into check
+        bg.move_piece(Position(4, 0), Position(3, 1))
+
+    def test_castling_rules(self):
+        bg = BitboardGame.from_fen('r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1')
+        bg.move_piece(Position(4, 0), Position(6, 0))
+        self.assertEqual(bg.mailbox[5], (WHITE, ROOK))
+        for fen in ('r3k2r/8/8/8/8/8/8/R3K2R w Qkq - 0 1',     # No right
+                    'r3k2r/8/8/8/8/8/4r3/R3K2R w KQkq - 0 1',  # Out of check
+                    'r3k2r/8/8/8/8/8/5r2/R3K2R w KQkq - 0 1',  # Through check
+                    'r3k2r/8/8/8/8/8/8/R3K2R b KQkq - 0 1'):   # Out of turn
+            bg = BitboardGame.from_fen(fen)
+            with self.assertRaises(RuntimeError):
+                bg.castle(Position(4, 0), Position(6, 0))
+
+    def test_no_king(self):
+        bg = BitboardGame.from_fen('4k3/8/8/8/8/8/P7/R7 w - - 0 1')
+        self.assertEqual(len(bg.legal_moves()), 9)
+
+    def test_fools_mate(self):
+        bg = BitboardGame()
+        bg.move_piece(Position(5, 1), Position(5, 2))
+        bg.move_piece(Position(4, 6), Position(4, 4))
+        bg.move_piece(Position(6, 1), Position(6, 3))
+        self.assertFalse(bg.is_check())
+        bg.move_piece(Position(3, 7), Position(7, 3))
+        self.assertTrue(bg.is_check())
+        self.assertTrue(bg.is_checkmate())
+
+    def test_is_square_attacked(self):
+        bg = BitboardGame()
+        self.assertTrue(bg.is_square_attacked(21, WHITE))
+        self.assertFalse(bg.is_square_attacked(28, WHITE))
+        self.assertEqual(bg.attackers_to(21, WHITE), (1 << 6) | (1 << 12) | (1 << 14))
+
+
+    def test_legal_moves(self):
+        bg = BitboardGame()
+        self.assertEqual(len(bg.legal_moves()), 20)
+        self.assertIn(encode_move(12, 28), bg.legal_moves())
+
+    def test_legal_moves_match_game(self):
+        game = Game()
+        game.move_piece(Position(4, 1), Position(4, 3))
+        game.move_piece(Position(3, 6), Position(3, 4))
+        moves = sorted(square(m.src) | square(m.dst) << 6
+                       for m in game.legal_moves())
+        self.assertEqual(sorted(BitboardGame.from_game(game).legal_moves()), moves)
+
+
+    def test_make_unmake(self):
+        bg = BitboardGame()
+        before = bg.mailbox[:], bg.occupied, bg.castling
+        for move in bg.legal_moves():
+            bg.make_move(move)
+            self.assertEqual(bg.turn, BLACK)
+            self.assertEqual(bg.unmake_move(), move)
+            self.assertEqual((bg.mailbox, bg.occupied, bg.castling), before)
+        self.assertEqual(bg.undo_stack, [])
+
+
+    def test_fen_round_trip(self):
+        fen = 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1'
+        bg = BitboardGame.from_fen(fen)
+        self.assertEqual(bg.to_fen(), fen)
+        self.assertEqual(bg.zobrist, Game.from_fen(fen).zobrist)
+
+
+class AttackTableTest(unittest.TestCase):
+    def test_leaper_tables(self):
+        self.assertEqual(KNIGHT_ATTACKS[0], (1 << 10) | (1 << 17))
+        self.assertEqual(KING_ATTACKS[63], (1 << 62) | (1 << 55) | (1 << 54))
+        self.assertEqual(PAWN_ATTACKS[WHITE][8], 1 << 17)
+        self.assertEqual(PAWN_ATTACKS[BLACK][55], 1 << 46)
+
+    def test_sliding_tables_match_ray_walk(self):
+        occupied = BitboardGame().occupied | (1 << 27) | (1 << 36)
+        for sq in range(64):
+            self.assertEqual(rook_attacks(sq, occupied),
+                             slide(1 << sq, occupied, ROOK_DIRECTIONS))
+            self.assertEqual(bishop_attacks(sq, occupied),
+                             slide(1 << sq, occupied, BISHOP_DIRECTIONS))
+
+    def test_relevant_masks_skip_edges(self):
+        self.assertEqual(bin(ROOK_MASKS[0]).count('1'), 12)
+        self.assertEqual(bin(BISHOP_MASKS[27]).count('1'), 9)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import random
+import tempfile
+import unittest
+from Book import *
+from Engine import Engine
+
+E4 = Move(Position(4, 1), Position(4, 3))
+D4 = Move(Position(3, 1), Position(3, 3))
+E5 = Move(Position(4, 6), Position(4, 4))
+
+
+class PolyglotKeyTest(unittest.TestCase):
+    def test_published_keys(self):
+        # From the Polyglot book format description
+        game = Game()
+        self.assertEqual(polyglot_key(game), 0x463B96181691FC9C)
+        for text, key in (('e2e4', 0x823C9B50FD114196), ('d7d5', 0x0756B94461C50FB0),
+                          ('e4e5', 0x662FAFB965DB29D4), ('f7f5', 0x22A48B5A8E47FF78)):
+            game.make_move(Move.from_uci(text))
+            self.assertEqual(polyglot_key(game), key, text)
+
+    def test_transpositions_share_a_key(self):
+        a = Game.from_fen('rnbqkbnr/pppp1ppp/8/4p3/3PP3/8/PPP2PPP/RNBQKBNR b KQkq - 0 2')
+        b = Game()
+        for move in (D4, E5, E4):
+            b.make_move(move)
+        self.assertEqual(polyglot_key(a), polyglot_key(b))
+        self.assertNotEqual(polyglot_key(Game()), polyglot_key(b))
+
+    def test_en_passant_only_when_capturable(self):
+        game = Game()
+        game.make_move(E4)
+        self.assertEqual(polyglot_key(game),
+                         polyglot_key(Game.from_fen(
+                             'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1')))
+        game = Game.from_fen('rnbqkbnr/ppp1pppp/8/8/3p4/8/PPPPPPPP/RNBQKBNR w KQkq - 0 3')
+        before = polyglot_key(game)
+        game.make_move(E4)
+        same_without_ep = Game.from_fen('rnbqkbnr/ppp1pppp/8/8/3pP3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 3')
+        self.assertNotEqual(before, polyglot_key(game))
+        self.assertNotEqual(polyglot_key(game), polyglot_key(same_without_ep))
+
+    def test_castling_code(self):
+        game = Game.from_fen('r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1')
+        castle = Move(Position(4, 0), Position(6, 0))
+        code = encode_move(game, castle)
+        self.assertEqual(code & 7, 7)  # King takes its own rook on h1
+        self.assertEqual(decode_move(game, code), castle)
+        promotion = Move(Position(1, 6), Position(1, 7), Knight)
+        game = Game.from_fen('4k3/1P6/8/8/8/8/8/4K3 w - - 0 1')
+        self.assertEqual(decode_move(game, encode_move(game, promotion)), promotion)
+
+
+class OpeningBookTest(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.bin')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_build_and_probe(self):
+        builder = BookBuilder(max_ply=2)
+        builder.add_game([E4, E5], '1-0')
+        builder.add_game([E4, E5], '1-0')
+        builder.add_game([D4, E5], '1/2-1/2')
+        builder.add_game([D4, E5], '*')  # Ignored
+        self.assertEqual(builder.write(self.path), 3)  # e5 never scored after e4
+
+        with OpeningBook(self.path) as book:
+            self.assertEqual(len(book), 3)
+            self.assertEqual(book.moves(Game()), [(E4, 4), (D4, 1)])
+            game = Game()
+            game.make_move(D4)
+            self.assertEqual(book.moves(game), [(E5, 1)])
+            self.assertIn(book.choose(Game(), random.Random(1)), (E4, D4))
+            game.make_move(E5)
+            self.assertIsNone(book.choose(game))
+
+            result = Engine(book=book).search(Game(), max_depth=3)
+            self.assertIn(result.move, (E4, D4))
+            self.assertEqual(result.depth, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
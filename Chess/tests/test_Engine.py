@@ -0,0 +1,55 @@
+import unittest
+from Engine import *
+
+
+class EngineTest(unittest.TestCase):
+    def test_mate_in_one(self):
+        game = Game.from_fen('6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1')
+        result = Engine().search(game, max_depth=3)
+        self.assertEqual(str(result.move), 'a1a8')
+        self.assertEqual(result.score, MATE - 1)
+
+    def test_wins_hanging_queen(self):
+        game = Game.from_fen('4k3/8/8/3q4/8/8/3R4/4K3 w - - 0 1')
+        result = Engine().search(game, max_depth=2)
+        self.assertEqual(str(result.move), 'd2d5')
+
+    def test_avoids_defended_capture(self):
+        # Quiescence sees the recapture on d5
+        game = Game.from_fen('4k3/8/4p3/3n4/8/8/3Q4/4K3 w - - 0 1')
+        result = Engine().search(game, max_depth=1)
+        self.assertNotEqual(str(result.move), 'd2d5')
+
+    def test_node_limit_leaves_game_unchanged(self):
+        game = Game()
+        fen, key = game.to_fen(), game.zobrist
+        result = Engine().search(game, node_limit=500)
+        self.assertLessEqual(result.nodes, 500)
+        self.assertIn(result.move, list(game.legal_moves()))
+        self.assertEqual((game.to_fen(), game.zobrist), (fen, key))
+        self.assertEqual(game.undo_stack, [])
+
+    def test_time_limit(self):
+        result = Engine().search(Game(), time_limit=0.2)
+        self.assertLess(result.seconds, 1.0)
+        self.assertGreaterEqual(result.depth, 1)
+
+    def test_no_legal_moves(self):
+        game = Game.from_fen('7k/5Q2/6K1/8/8/8/8/8 b - - 0 1')
+        result = Engine().search(game, max_depth=2)
+        self.assertIsNone(result.move)
+        self.assertEqual(result.score, 0)
+
+    def test_repetition_is_draw(self):
+        game = Game()
+        for _ in range(2):
+            for move in ('g1f3', 'g8f6', 'f3g1', 'f6g8'):
+                src = Position(ord(move[0]) - ord('a'), int(move[1]) - 1)
+                dst = Position(ord(move[2]) - ord('a'), int(move[3]) - 1)
+                game.move_piece(src, dst)
+        self.assertTrue(Engine._is_draw(game))
+        self.assertFalse(Engine._is_draw(Game()))
+
+
+if __name__ == "__main__":
+    unittest.main()
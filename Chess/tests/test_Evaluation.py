@@ -0,0 +1,39 @@
+import unittest
+from ChessBoard import Game
+from Evaluation import *
+
+
+class EvaluationTest(unittest.TestCase):
+    def test_start_position(self):
+        game = Game()
+        self.assertEqual(game.phase, MAX_PHASE)
+        self.assertEqual(evaluate(game), 0)
+
+    def test_pack_round_trip(self):
+        for mg, eg in ((0, 0), (25, -40), (-1025, 936), (-3, -7)):
+            self.assertEqual(unpack_score(pack_score(mg, eg)), (mg, eg))
+
+    def test_mirrored_positions_score_alike(self):
+        white = Game.from_fen('4k3/8/8/8/8/2N5/PP6/4K3 w - - 0 1')
+        black = Game.from_fen('4k3/pp6/2n5/8/8/8/8/4K3 b - - 0 1')
+        self.assertGreater(evaluate(white), 0)
+        self.assertEqual(evaluate(white), evaluate(black))
+
+    def test_tapered_to_endgame(self):
+        game = Game.from_fen('4k3/8/8/8/8/8/4P3/4K3 w - - 0 1')
+        self.assertEqual(game.phase, 0)
+        mg, eg = unpack_score(game.psqt)
+        self.assertEqual(evaluate(game), eg)
+
+    def test_incremental_updates(self):
+        game = Game.from_fen('r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1')
+        before = game.psqt, game.phase
+        for move in list(game.legal_moves()):
+            game.make_move(move)
+            self.assertEqual((game.psqt, game.phase), compute(game.board), str(move))
+            game.unmake_move()
+            self.assertEqual((game.psqt, game.phase), before)
+
+
+if __name__ == "__main__":
+    unittest.main()
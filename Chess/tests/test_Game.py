@@ -1,6 +1,9 @@
+import random
 import unittest
-from ChessBoard import Game, Position
+from ChessBoard import (CHECKMATE, FIFTY_MOVES, INSUFFICIENT_MATERIAL, REPETITION,
+                        STALEMATE, Game, Position)
 from Piece import *
+from Bitboard import BLACK_KINGSIDE, BLACK_QUEENSIDE
 
 
 class TestCheckmate(unittest.TestCase):
@@ -25,5 +28,267 @@ class TestCheckmate(unittest.TestCase):
         is_checkmate = game.is_checkmate()
         self.assertFalse(is_checkmate)
 
+class TestLegalMoves(unittest.TestCase):
+    def test_start_position(self):
+        self.assertEqual(len(list(Game().legal_moves())), 20)
+
+    def test_block_escapes_check(self):
+        game = Game()
+        game.board[6][4] = None
+        game.board[4][4] = Queen("white", Position(4, 4), game)
+        self.assertTrue(game.is_square_attacked(Position(4, 7), 'white'))
+        moves = list(game.legal_moves('black'))
+        self.assertIn(Move(Position(5, 7), Position(4, 6)), moves)
+        self.assertFalse(game.is_checkmate())
+
+    def test_pinned_piece(self):
+        game = Game()
+        game.board[1][4] = None
+        game.board[1][3] = Knight("white", Position(3, 1), game)
+        game.board[4][0] = Bishop("black", Position(0, 4), game)
+        moves = list(game.legal_moves('white'))
+        self.assertFalse(any(m.src == Position(3, 1) for m in moves))
+
+    def test_castling(self):
+        game = Game()
+        game.board[0][5] = None
+        game.board[0][6] = None
+        game.move_piece(Position(4, 0), Position(6, 0))
+        self.assertIsInstance(game.board[0][5], Rook)
+        self.assertEqual(game.turn, 'black')
+        self.assertEqual(game.castling, BLACK_KINGSIDE | BLACK_QUEENSIDE)
+
+
+class TestMakeUnmake(unittest.TestCase):
+    def test_round_trip(self):
+        game = Game()
+        before = [line[:] for line in game.board]
+        for move in list(game.legal_moves()):
+            game.make_move(move)
+            self.assertEqual(game.turn, 'black')
+            game.unmake_move()
+            self.assertEqual(game.board, before)
+        self.assertEqual(game.turn, 'white')
+        self.assertEqual(game.undo_stack, [])
+
+    def test_en_passant_undo(self):
+        game = Game()
+        game.move_piece(Position(4, 1), Position(4, 3))
+        game.move_piece(Position(0, 6), Position(0, 5))
+        game.move_piece(Position(4, 3), Position(4, 4))
+        game.move_piece(Position(3, 6), Position(3, 4))
+        game.make_move(Move(Position(4, 4), Position(3, 5)))
+        self.assertIsNone(game.board[4][3])
+        self.assertEqual(game.halfmove_clock, 0)
+        game.unmake_move()
+        self.assertIsInstance(game.board[4][3], Pawn)
+        self.assertEqual(game.last_move, (Position(3, 6), Position(3, 4)))
+
+    def test_promotion_undo(self):
+        game = Game()
+        pawn = Pawn("white", Position(0, 6), game)
+        game.board[6][0] = pawn
+        game.board[7][0] = None
+        game.make_move(Move(Position(0, 6), Position(0, 7), Knight))
+        self.assertIsInstance(game.board[7][0], Knight)
+        game.unmake_move()
+        self.assertIs(game.board[6][0], pawn)
+        self.assertIsNone(game.board[7][0])
+
+
+class TestZobrist(unittest.TestCase):
+    def test_transposition(self):
+        first, second = Game(), Game()
+        for game, moves in ((first, [(1, 0, 2, 2), (6, 7, 5, 5), (6, 0, 5, 2)]),
+                            (second, [(6, 0, 5, 2), (6, 7, 5, 5), (1, 0, 2, 2)])):
+            for x1, y1, x2, y2 in moves:
+                game.move_piece(Position(x1, y1), Position(x2, y2))
+        self.assertEqual(first.zobrist, second.zobrist)
+        self.assertNotEqual(first.zobrist, Game().zobrist)
+
+    def test_incremental_matches_full(self):
+        game = Game()
+        game.move_piece(Position(4, 1), Position(4, 3))
+        game.move_piece(Position(3, 6), Position(3, 4))
+        game.move_piece(Position(4, 3), Position(3, 4))
+        self.assertEqual(game.zobrist, game.compute_zobrist())
+        game.unmake_move()
+        self.assertEqual(game.zobrist, game.compute_zobrist())
+
+    def test_side_to_move(self):
+        game = Game()
+        game.move_piece(Position(1, 0), Position(2, 2))
+        game.move_piece(Position(2, 2), Position(1, 0))
+        self.assertNotEqual(game.zobrist, Game().zobrist)
+
+
+class TestEnPassantSquare(unittest.TestCase):
+    def test_only_when_capturable(self):
+        game = Game.from_fen('rnbqkbnr/ppp1pppp/8/8/3p4/8/PPPPPPPP/RNBQKBNR w KQkq - 0 3')
+        self.assertIsNone(game.en_passant_square())
+        game.move_piece(Position(4, 1), Position(4, 3))
+        self.assertIs(game.en_passant_square(), Position(4, 2))
+        game = Game()
+        game.move_piece(Position(4, 1), Position(4, 3))
+        self.assertIsNone(game.en_passant_square())
+
+
+class TestFen(unittest.TestCase):
+    KIWIPETE = 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1'
+
+    def test_start_position(self):
+        start = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+        self.assertEqual(Game().to_fen(), start)
+        game = Game.from_fen(start)
+        self.assertEqual(game.zobrist, Game().zobrist)
+        self.assertIs(game.board[0][4].g, game)
+
+    def test_round_trip(self):
+        for fen in (self.KIWIPETE, '8/8/8/8/8/8/8/K6k b - - 49 80'):
+            self.assertEqual(Game.from_fen(fen).to_fen(), fen)
+
+    def test_en_passant(self):
+        game = Game()
+        game.move_piece(Position(4, 1), Position(4, 3))
+        fen = game.to_fen()
+        self.assertEqual(fen, 'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1')
+        self.assertEqual(Game.from_fen(fen).last_move, game.last_move)
+        self.assertEqual(Game.from_fen(fen).zobrist, game.zobrist)
+
+    def test_invalid(self):
+        for fen in ('8/8/8 w - - 0 1', 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNX w KQkq - 0 1',
+                    '8/8/8/8/8/8/8/K6k x - - 0 1'):
+            with self.assertRaises(ValueError):
+                Game.from_fen(fen)
+
+
+class TestSquareAttacked(unittest.TestCase):
+    def test_start_position(self):
+        game = Game()
+        self.assertTrue(game.is_square_attacked(Position(4, 2), 'white'))
+        self.assertFalse(game.is_square_attacked(Position(4, 3), 'white'))
+        self.assertTrue(game.is_square_attacked(Position(5, 5), 'black'))
+
+    def test_slider_blocked(self):
+        game = Game()
+        game.board[3][0] = Rook("black", Position(0, 3), game)
+        self.assertTrue(game.is_square_attacked(Position(7, 3), 'black'))
+        self.assertFalse(game.is_square_attacked(Position(0, 0), 'black'))
+
+    def test_pawn_gives_check(self):
+        game = Game()
+        game.board[1][3] = Pawn("black", Position(3, 1), game)
+        self.assertTrue(game.is_check())
+
+
+class TestMoveCache(unittest.TestCase):
+    def test_shared_per_position(self):
+        game = Game.from_fen('rnb1kbnr/pppp1ppp/8/4p3/5PPq/8/PPPPP2P/RNBQKBNR w KQkq - 1 3')
+        self.assertTrue(game.is_checkmate())
+        moves = game.cached_moves()
+        self.assertIs(game.cached_moves(), moves)
+        self.assertEqual(moves, {})
+
+    def test_invalidated_by_moves(self):
+        game = Game()
+        moves = game.cached_moves()
+        game.move_piece(Position(4, 1), Position(4, 3))
+        self.assertIsNot(game.cached_moves(), moves)
+        self.assertEqual(len(game.cached_moves()), 10)
+        game.unmake_move()
+        self.assertEqual(sum(map(len, game.cached_moves().values())), 20)
+
+    def test_rejects_moves_into_check(self):
+        game = Game.from_fen('4k3/8/8/8/8/8/4r3/3K4 w - - 0 1')
+        with self.assertRaises(RuntimeError):
+            game.move_piece(Position(3, 0), Position(3, 1))
+        game.cached_moves()
+        with self.assertRaises(RuntimeError):
+            game.move_piece(Position(3, 0), Position(4, 0))
+        game.move_piece(Position(3, 0), Position(4, 1))
+
+    def test_no_castling_through_check(self):
+        game = Game.from_fen('4k3/8/8/8/8/8/5r2/4K2R w K - 0 1')
+        with self.assertRaises(RuntimeError):
+            game.castle(Position(4, 0), Position(6, 0))
+
+
+class TestIsLegal(unittest.TestCase):
+    def test_matches_legal_moves(self):
+        rng = random.Random(7)
+        squares = [Position(x, y) for y in range(8) for x in range(8)]
+        for _ in range(12):
+            game = Game()
+            for _ in range(rng.randrange(60)):
+                moves = list(game.legal_moves())
+                if not moves:
+                    break
+                game.make_move(rng.choice(moves))
+            legal = {(move.src, move.dst) for move in game.legal_moves()}
+            for src in squares:
+                for dst in squares:
+                    game.invalidate_cache()
+                    self.assertEqual(game.is_legal(src, dst), (src, dst) in legal,
+                                     f"{game.to_fen()} {src} {dst}")
+
+    def test_pinned_piece(self):
+        game = Game.from_fen('4k3/4r3/8/8/8/8/4B3/4K3 w - - 0 1')
+        self.assertFalse(game.is_legal(Position(4, 1), Position(3, 2)))
+        self.assertTrue(game.is_legal(Position(4, 0), Position(3, 0)))
+        self.assertFalse(game.is_legal(Position(4, 0), Position(4, 1)))
+
+    def test_en_passant_discovers_check(self):
+        game = Game.from_fen('8/8/8/K2pP2r/8/8/8/7k w - d6 0 1')
+        self.assertFalse(game.is_legal(Position(4, 4), Position(3, 5)))
+        self.assertTrue(game.is_legal(Position(4, 4), Position(4, 5)))
+
+
+class TestOutcome(unittest.TestCase):
+    def test_in_progress(self):
+        self.assertIsNone(Game().outcome())
+
+    def test_checkmate_and_stalemate(self):
+        game = Game.from_fen('rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3')
+        self.assertEqual(game.outcome(), CHECKMATE)
+        game = Game.from_fen('7k/5Q2/6K1/8/8/8/8/8 b - - 0 1')
+        self.assertEqual(game.outcome(), STALEMATE)
+
+    def test_threefold_repetition(self):
+        game = Game()
+        shuffle = [(Position(6, 0), Position(5, 2)), (Position(6, 7), Position(5, 5)),
+                   (Position(5, 2), Position(6, 0)), (Position(5, 5), Position(6, 7))]
+        for src, dst in shuffle * 2:
+            self.assertIsNone(game.outcome())
+            game.move_piece(src, dst)
+        self.assertEqual(game.outcome(), REPETITION)
+        game.unmake_move()
+        self.assertIsNone(game.outcome())
+        self.assertEqual(game.repetitions[game.zobrist], 2)
+
+    def test_fifty_move_rule(self):
+        game = Game.from_fen('4k3/8/8/8/8/8/8/R3K3 w - - 99 80')
+        self.assertIsNone(game.outcome())
+        game.move_piece(Position(0, 0), Position(0, 1))
+        self.assertEqual(game.outcome(), FIFTY_MOVES)
+
+    def test_insufficient_material(self):
+        for fen, drawn in (('4k3/8/8/8/8/8/8/4K3 w - - 0 1', True),
+                           ('4k3/8/8/8/8/8/8/4KN2 w - - 0 1', True),
+                           ('4kb2/8/8/8/8/8/8/2B1K3 w - - 0 1', True),
+                           ('4k1b1/8/8/8/8/8/8/2B1K3 w - - 0 1', False),
+                           ('4k3/8/8/8/8/8/8/3NKN2 w - - 0 1', False),
+                           ('4k3/8/8/8/8/8/4P3/4K3 w - - 0 1', False)):
+            game = Game.from_fen(fen)
+            self.assertEqual(game.outcome() == INSUFFICIENT_MATERIAL, drawn, fen)
+
+    def test_capture_and_promotion_update_material(self):
+        game = Game.from_fen('3rk3/2P5/8/8/8/8/8/4K3 w - - 0 1')
+        game.move_piece(Position(2, 6), Position(3, 7), Bishop)
+        self.assertEqual(game.outcome(), INSUFFICIENT_MATERIAL)
+        self.assertEqual(game.bishop_squares, [1, 0])
+        game.unmake_move()
+        self.assertEqual((game.material, game.bishop_squares), game.compute_material())
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
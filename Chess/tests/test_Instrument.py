@@ -0,0 +1,62 @@
+import unittest
+import Instrument
+from ChessBoard import Game
+from Piece import *
+
+
+class InstrumentTest(unittest.TestCase):
+    def setUp(self):
+        Instrument.reset()
+
+    def tearDown(self):
+        Instrument.disable()
+        Instrument.reset()
+
+    def test_enable_and_disable(self):
+        move_piece = Game.__dict__['move_piece']
+        new = Position.__dict__['__new__']
+        Instrument.enable()
+        self.assertTrue(Instrument.enabled())
+        self.assertIsNot(Game.__dict__['move_piece'], move_piece)
+        self.assertIs(Position(3, 4), Position(3, 4))
+        Instrument.disable()
+        self.assertFalse(Instrument.enabled())
+        self.assertIs(Game.__dict__['move_piece'], move_piece)
+        self.assertIs(Position.__dict__['__new__'], new)
+
+    def test_scope(self):
+        game = Game()
+        with Instrument.scope('off'):
+            game.move_piece(Position(4, 1), Position(4, 3))
+        Instrument.enable()
+        with Instrument.scope('move'):
+            game.move_piece(Position(4, 6), Position(4, 4))
+        list(game.legal_moves())
+
+        figures = Instrument.snapshot()
+        self.assertNotIn('off', figures['scopes'])
+        move = figures['scopes']['move']
+        self.assertEqual(move['calls'], 1)
+        self.assertEqual(move['calls_by_function']['Game.move_piece'], 1)
+        self.assertEqual(move['calls_by_function']['Piece.can_move_to'], 1)
+        self.assertNotIn('Pawn.get_possible_moves', move['calls_by_function'])
+        functions = figures['functions']
+        self.assertEqual(functions['Game.move_piece']['calls'], 1)
+        self.assertEqual(sum(functions['Game.move_piece']['buckets'].values()), 1)
+        self.assertEqual(functions['Game.legal_moves']['calls'], 1)
+
+    def test_prometheus_text(self):
+        Instrument.enable()
+        Game().is_checkmate()
+        with Instrument.scope('mate'):
+            Game().is_checkmate()
+        text = Instrument.prometheus_text()
+        self.assertIn('# TYPE chess_calls_total counter\n', text)
+        self.assertIn('chess_calls_total{function="Game.is_checkmate"} 2\n', text)
+        self.assertIn('chess_call_seconds_bucket{function="Game.is_checkmate",le="+Inf"} 2\n', text)
+        self.assertIn('chess_scope_calls_total{scope="mate",function="Game.is_checkmate"} 1\n',
+                      text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import io
+import unittest
+from PGN import *
+
+SAMPLE = '''[Event "Casual"]
+[White "A"]
+[Black "B \\"the second\\""]
+[Result "1-0"]
+
+1. e4 e5 2. Bc4 {a comment
+[spanning lines]} Nc6 3. Qh5 $1 Nf6?? (3... g6 4. Qf3) 4. Qxf7# 1-0
+
+[Event "Second"]
+[Result "*"]
+
+1.d4 d5 2.c4 dxc4 3.Nf3 Nf6 4.e3 e6 5.Bxc4 c5 6.O-O a6 ; line comment
+7.dxc5 Bxc5 8.Qxd8+ Kxd8 *
+'''
+
+
+class ReadGamesTest(unittest.TestCase):
+    def test_headers_and_moves(self):
+        games = list(read_games(io.StringIO(SAMPLE)))
+        self.assertEqual(len(games), 2)
+        self.assertEqual(games[0].headers['Black'], 'B "the second"')
+        self.assertEqual(games[0].moves,
+                         ['e4', 'e5', 'Bc4', 'Nc6', 'Qh5', 'Nf6??', 'Qxf7#'])
+        self.assertEqual(games[0].result, '1-0')
+        self.assertEqual(len(games[1].moves), 16)
+        self.assertEqual(games[1].result, '*')
+
+    def test_lines_without_newlines(self):
+        games = list(read_games(SAMPLE.splitlines()))
+        self.assertEqual(games[0].moves,
+                         ['e4', 'e5', 'Bc4', 'Nc6', 'Qh5', 'Nf6??', 'Qxf7#'])
+        self.assertEqual(len(games[1].moves), 16)
+        self.assertEqual(games[1].moves[-4:], ['dxc5', 'Bxc5', 'Qxd8+', 'Kxd8'])
+        game = next(read_games('1. e4 e5\n2. Nf3 Nc6 *'.splitlines()))
+        self.assertEqual(game.moves, ['e4', 'e5', 'Nf3', 'Nc6'])
+
+    def test_lazy(self):
+        games = read_games(io.StringIO(SAMPLE))
+        self.assertEqual(next(games).headers['Event'], 'Casual')
+
+
+class ReplayTest(unittest.TestCase):
+    def test_checkmate(self):
+        record = next(read_games(io.StringIO(SAMPLE)))
+        game = Game()
+        moves = list(replay(record, game))
+        self.assertEqual(str(moves[-1]), 'h5f7')
+        self.assertTrue(game.is_checkmate())
+
+    def test_castling_and_captures(self):
+        record = list(read_games(io.StringIO(SAMPLE)))[1]
+        game = Game()
+        list(replay(record, game))
+        self.assertIsInstance(game.board[0][6], King)
+        self.assertIsInstance(game.board[0][5], Rook)
+        self.assertIsInstance(game.board[7][3], King)
+        self.assertEqual(game.turn, 'white')
+
+    def test_pinned_candidate(self):
+        # Only the knight on c3 can go to e2, the one on g1 is not pinned
+        # but the one on c3 is, so "Ne2" needs no disambiguation
+        game = Game.from_fen('4k3/8/8/b7/8/2N5/8/4K1N1 w - - 0 1')
+        self.assertEqual(parse_san(game, 'Ne2'),
+                         Move(Position(6, 0), Position(4, 1)))
+
+    def test_promotion(self):
+        game = Game.from_fen('8/P6k/8/8/8/8/8/K7 w - - 0 1')
+        self.assertEqual(parse_san(game, 'a8=N+'),
+                         Move(Position(0, 6), Position(0, 7), Knight))
+
+    def test_illegal(self):
+        record = PgnGame(moves=['e4', 'e4'])
+        with self.assertRaises(ValueError):
+            list(replay(record))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+from Parallel import *
+from Piece import Position
+
+
+class ParallelEngineTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.engine = ParallelEngine(workers=2, size_mb=1)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.engine.close()
+
+    def test_mate_in_one(self):
+        game = Game.from_fen('6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1')
+        result = self.engine.search(game, max_depth=3)
+        self.assertEqual(str(result.move), 'a1a8')
+
+    def test_time_limit(self):
+        game = Game()
+        result = self.engine.search(game, time_limit=0.3)
+        self.assertIn(result.move, list(game.legal_moves()))
+        self.assertLess(result.seconds, 2.0)
+        self.assertEqual(game.undo_stack, [])
+
+    def test_game_record(self):
+        game = Game()
+        game.move_piece(Position(4, 1), Position(4, 3))
+        game.move_piece(Position(6, 7), Position(5, 5))
+        game.move_piece(Position(6, 0), Position(5, 2))
+        fen, moves = game_record(game)
+        self.assertEqual(len(moves), 2)
+        copy = Game.from_fen(fen)
+        for move in moves:
+            copy.make_move(move)
+        self.assertEqual((copy.to_fen(), copy.zobrist), (game.to_fen(), game.zobrist))
+        self.assertEqual(len(game.undo_stack), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+from Perft import *
+
+
+class PerftTest(unittest.TestCase):
+    def test_bitboard_suite(self):
+        for name, depth, nodes, expected, _ in run_suite(3, 'bitboard', 10000):
+            self.assertEqual(nodes, expected, f"{name} depth {depth}")
+
+    def test_game_suite(self):
+        for name, depth, nodes, expected, _ in run_suite(3, 'game', 10000):
+            self.assertEqual(nodes, expected, f"{name} depth {depth}")
+
+    def test_divide(self):
+        counts = divide(load(START_FEN), 2)
+        self.assertEqual(len(counts), 20)
+        self.assertEqual(counts['e2e4'], 20)
+        self.assertEqual(counts, divide(load(START_FEN, 'game'), 2))
+
+    def test_depth_zero(self):
+        for engine in ('bitboard', 'game'):
+            self.assertEqual(perft(load(START_FEN, engine), 0), 1)
+            self.assertEqual(perft(load(START_FEN, engine), -1), 1)
+            self.assertEqual(divide(load(START_FEN, engine), 0), {})
+
+    def test_position_restored(self):
+        game = load(POSITIONS[1][1])
+        key = game.zobrist
+        perft(game, 2)
+        self.assertEqual(game.zobrist, key)
+        self.assertEqual(game.undo_stack, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
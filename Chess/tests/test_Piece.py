@@ -157,5 +157,71 @@ class KingTest(unittest.TestCase):
         self.assertEqual(pos, expected)
 
 
+class PositionTest(unittest.TestCase):
+    def test_interned(self):
+        self.assertIs(Position(3, 4), Position(3, 4))
+        self.assertEqual(Position(3, 4).sq, 35)
+
+    def test_off_board_not_interned(self):
+        self.assertIsNot(Position(-1, 9), Position(-1, 9))
+        self.assertEqual(Position(-1, 9), Position(-1, 9))
+        self.assertEqual(len({Position(-1, 9), Position(-1, 9)}), 1)
+        self.assertNotEqual(Position(-1, 9), Position(9, -1))
+        self.assertNotEqual(Position(8, 0), Position(0, 1))
+        self.assertNotEqual(Position(0, 1), Position(8, 0))
+
+    def test_immutable(self):
+        with self.assertRaises(AttributeError):
+            Position(0, 0).x = 1
+
+    def test_pickle_keeps_identity(self):
+        import pickle
+        pos = Position(6, 2)
+        self.assertIs(pickle.loads(pickle.dumps(pos)), pos)
+
+    def test_pieces_are_slotted(self):
+        game = Game()
+        for piece in (game.board[0][0], game.board[1][0], game.board[7][4]):
+            self.assertFalse(hasattr(piece, '__dict__'))
+        self.assertEqual(game.board[0][4].code, KING)
+        self.assertEqual(game.board[6][0].code, 6 + PAWN)
+
+
+class MoveTest(unittest.TestCase):
+    def test_uci_round_trip(self):
+        for text in ('e2e4', 'a7a8q', 'h2h1n'):
+            self.assertEqual(str(Move.from_uci(text)), text)
+        for text in ('e2', 'e2e9', 'i2i4', 'a7a8k'):
+            with self.assertRaises(ValueError):
+                Move.from_uci(text)
+
+
+class CanMoveToTest(unittest.TestCase):
+    def test_matches_possible_moves(self):
+        squares = [Position(x, y) for y in range(8) for x in range(8)]
+        for fen in ('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+                    'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+                    'rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3'):
+            game = Game.from_fen(fen)
+            for row in game.board:
+                for piece in row:
+                    if piece is None:
+                        continue
+                    moves = piece.get_possible_moves()
+                    for dst in squares:
+                        self.assertEqual(piece.can_move_to(dst), dst in moves,
+                                         f"{fen} {piece.p} {dst}")
+
+    def test_off_board(self):
+        game = Game.from_fen('8/8/8/8/8/8/8/K6k w - - 0 1')
+        king = game.board[0][0]
+        rook = Rook('white', Position(3, 0), game)
+        game.board[0][3] = rook
+        for dst in (Position(-1, 0), Position(0, -1), Position(-1, -1)):
+            self.assertFalse(king.can_move_to(dst))
+        for dst in (Position(8, 0), Position(3, 8), Position(-1, 0)):
+            self.assertFalse(rook.can_move_to(dst))
+
+
 if __name__ == "__main__":
     unittest.main()
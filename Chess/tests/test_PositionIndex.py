@@ -0,0 +1,81 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from PGN import PgnGame, replay
+from PositionIndex import *
+from Piece import Position
+
+SCHOLARS_MATE = 'e4 e5 Bc4 Nc6 Qh5 Nf6 Qxf7#'.split()
+ITALIAN = 'e4 e5 Nf3 Nc6 Bc4 Bc5'.split()
+
+
+class PositionIndexTest(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.idx')
+        os.close(handle)
+        os.remove(self.path)
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def build(self, games, first=0):
+        with IndexBuilder(self.path) as builder:
+            for number, moves in enumerate(games, first):
+                game = Game()
+                builder.begin(game, number)
+                for _ in replay(PgnGame(moves=moves), game):
+                    pass
+                builder.end(game)
+                self.assertIsNone(game.recorder)
+
+    def test_lookup(self):
+        self.build([SCHOLARS_MATE, ITALIAN])
+        with PositionIndex(self.path) as index:
+            self.assertEqual(len(index), len(SCHOLARS_MATE) + len(ITALIAN) + 2)
+            self.assertEqual(index.lookup(Game().zobrist), [(0, 0), (1, 0)])
+            game = Game()
+            for _ in replay(PgnGame(moves=['e4', 'e5']), game):
+                pass
+            self.assertEqual(index.lookup(game.zobrist), [(0, 2), (1, 2)])
+            for _ in replay(PgnGame(moves=['Nf3']), game):
+                pass
+            self.assertEqual(index.games(game), [1])
+            self.assertEqual(index.lookup(Game.from_fen('8/8/8/4k3/8/8/8/4K3 w - - 0 1').zobrist), [])
+            keys = [key for key, _ in index.entries()]
+            self.assertEqual(keys, sorted(keys))
+
+    def test_extend(self):
+        self.build([SCHOLARS_MATE])
+        self.build([ITALIAN], first=1)
+        with PositionIndex(self.path) as index:
+            self.assertEqual(index.lookup(Game().zobrist), [(0, 0), (1, 0)])
+            self.assertEqual(len(index), len(SCHOLARS_MATE) + len(ITALIAN) + 2)
+
+    def test_limits(self):
+        with IndexBuilder(self.path) as builder:
+            game = Game()
+            with self.assertRaises(ValueError):
+                builder.begin(game, -1)
+            self.assertIsNone(game.recorder)
+            builder.begin(game, 0)
+            with mock.patch('PositionIndex.MAX_PLY', 1):
+                game.move_piece(Position(4, 1), Position(4, 3))
+                with self.assertRaises(ValueError):
+                    game.move_piece(Position(4, 6), Position(4, 4))
+            self.assertEqual(game.turn, 'black')  # The move was taken back
+            builder.end(game)
+        with PositionIndex(self.path) as index:
+            self.assertEqual(len(index), 2)
+            self.assertEqual(index.lookup(game.zobrist), [(0, 1)])
+
+    def test_bad_file(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'not an index file at all, just some bytes')
+        with self.assertRaises(ValueError):
+            PositionIndex(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
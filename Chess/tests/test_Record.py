@@ -0,0 +1,90 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from PGN import PgnGame, replay
+from Record import *
+
+SCHOLARS_MATE = 'e4 e5 Bc4 Nc6 Qh5 Nf6 Qxf7#'.split()
+PROMOTION_FEN = '4k3/1P6/8/8/8/8/8/R3K3 w Q - 0 1'
+
+
+class RecordTest(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.rec')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_snapshot_round_trip(self):
+        for fen in ('rnbqkbnr/ppp1pppp/8/8/3pP3/8/PPPP1PPP/RNBQKBNR b Kq e3 0 3',
+                    PROMOTION_FEN):
+            game = Game.from_fen(fen)
+            data = pack_position(game)
+            self.assertEqual(len(data), SNAPSHOT.size)
+            self.assertEqual(unpack_position(data).to_fen(), fen)
+
+    def test_write_and_seek(self):
+        fens = []
+        with RecordWriter(self.path, interval=2) as writer:
+            game = Game()
+            writer.begin(game)
+            fens.append(game.to_fen())
+            for _ in replay(PgnGame(moves=SCHOLARS_MATE), game):
+                fens.append(game.to_fen())
+            writer.end(game, '1-0')
+            self.assertIsNone(game.recorder)
+
+            game = Game.from_fen(PROMOTION_FEN)
+            writer.begin(game)
+            game.castle(Position(4, 0), Position(2, 0))
+            game.move_piece(Position(4, 7), Position(4, 6))
+            game.move_piece(Position(1, 6), Position(1, 7), Knight)
+            writer.end(game)
+
+        with RecordReader(self.path) as reader:
+            self.assertEqual(len(reader), 2)
+            self.assertEqual((reader.plies(0), reader.result(0)), (7, '1-0'))
+            for ply, fen in enumerate(fens):
+                self.assertEqual(reader.position(0, ply).to_fen(), fen)
+            self.assertTrue(reader.position(0, -1).is_checkmate())
+            self.assertEqual([str(m) for m in reader.moves(1)], ['e1c1', 'e8e7', 'b7b8n'])
+            self.assertEqual(reader.position(1).to_fen(), PROMOTION_FEN)
+            self.assertIsInstance(reader.position(1, 3).board[7][1], Knight)
+            with self.assertRaises(IndexError):
+                reader.position(2)
+            with self.assertRaises(IndexError):
+                reader.position(0, 8)
+
+    def test_limits_keep_file_consistent(self):
+        with RecordWriter(self.path) as writer:
+            writer.add([], '1-0')
+            game = Game()
+            writer.begin(game)
+            with mock.patch('Record.MAX_PLIES', 2):
+                game.move_piece(Position(4, 1), Position(4, 3))
+                game.move_piece(Position(4, 6), Position(4, 4))
+                with self.assertRaises(RuntimeError):
+                    game.move_piece(Position(6, 0), Position(5, 2))
+                self.assertEqual(len(game.undo_stack), 2)  # The move was taken back
+                with self.assertRaises(RuntimeError):
+                    writer.add([Move(Position(4, 1), Position(4, 3))] * 3)
+            with self.assertRaises(ValueError):
+                writer.end(game, 'white wins')
+            writer.end(game, '*')
+
+        with RecordReader(self.path) as reader:
+            self.assertEqual(len(reader), 2)
+            self.assertEqual((reader.plies(1), reader.result(1)), (2, '*'))
+            self.assertEqual(reader.position(1, 2).to_fen(), game.to_fen())
+
+    def test_not_a_record(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'[Event "?"]\n' * 4)
+        with self.assertRaises(ValueError):
+            RecordReader(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
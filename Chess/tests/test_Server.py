@@ -0,0 +1,80 @@
+import asyncio
+import json
+import unittest
+from Server import *
+
+
+class ServerTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.game_server = GameServer(workers=1)
+        self.server = await self.game_server.start('127.0.0.1', 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.connections = []
+
+    async def asyncTearDown(self):
+        for _, writer in self.connections:
+            writer.close()
+        self.server.close()
+        await self.server.wait_closed()
+        self.game_server.close()
+
+    async def connect(self):
+        connection = await asyncio.open_connection('127.0.0.1', self.port)
+        self.connections.append(connection)
+        return connection
+
+    async def request(self, connection, **message):
+        reader, writer = connection
+        writer.write(json.dumps(message).encode() + b'\n')
+        await writer.drain()
+        return json.loads(await asyncio.wait_for(reader.readline(), 10))
+
+    async def test_fools_mate_is_broadcast(self):
+        white, black = await self.connect(), await self.connect()
+        game = (await self.request(white, op='new'))['game']
+        self.assertEqual((await self.request(black, op='join', game=game))['turn'], 'white')
+        for player, move in ((white, 'f2f3'), (black, 'e7e5'), (white, 'g2g4')):
+            reply = await self.request(player, op='move', game=game, move=move)
+            self.assertNotIn('error', reply)
+            other = black if player is white else white
+            event = json.loads(await asyncio.wait_for(other[0].readline(), 10))
+            self.assertEqual((event['event'], event['move']), ('move', move))
+        reply = await self.request(black, op='move', game=game, move='d8h4', id=7)
+        self.assertEqual(reply['id'], 7)
+        self.assertTrue(reply['checkmate'])
+        event = json.loads(await asyncio.wait_for(white[0].readline(), 10))
+        self.assertTrue(event['checkmate'])
+        self.assertEqual(event['outcome'], 'checkmate')
+        self.assertIn('error', await self.request(white, op='move', game=game, move='a2a3'))
+
+    async def test_errors(self):
+        client = await self.connect()
+        game = (await self.request(client, op='new'))['game']
+        self.assertIn('error', await self.request(client, op='move', game=game, move='e2e5'))
+        self.assertIn('error', await self.request(client, op='move', game=game, move='e7e5'))
+        self.assertIn('error', await self.request(client, op='move', game=99, move='e2e4'))
+        self.assertIn('error', await self.request(client, op='fly'))
+        moves = await self.request(client, op='moves', game=game)
+        self.assertEqual(len(moves['moves']), 20)
+
+    async def test_bad_field_types(self):
+        client = await self.connect()
+        game = (await self.request(client, op='new'))['game']
+        self.assertIn('error', await self.request(client, op='new', fen=123))
+        self.assertIn('error', await self.request(client, op='moves', game=[game]))
+        self.assertIn('error', await self.request(client, op='analyze', game=game, time=None))
+        for depth in (0, -2, 1.5, True):
+            self.assertIn('error', await self.request(client, op='analyze', game=game, depth=depth))
+        # The connection is still served
+        moves = await self.request(client, op='moves', game=game, id=3)
+        self.assertEqual((len(moves['moves']), moves['id']), (20, 3))
+
+    async def test_analyze(self):
+        client = await self.connect()
+        game = (await self.request(client, op='new', fen='6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1'))['game']
+        reply = await self.request(client, op='analyze', game=game, depth=2, time=5)
+        self.assertEqual(reply['move'], 'a1a8')
+
+
+if __name__ == "__main__":
+    unittest.main()
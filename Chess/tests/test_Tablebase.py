@@ -0,0 +1,122 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from Engine import MATE, Engine
+from Fen import format_fen
+from Tablebase import *
+from Tablebase import _Generator, _order
+
+
+class TablebaseTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.tables = {}
+        for name in ('KQvK', 'KRvK'):
+            cls.tables[parse_signature(name)] = generate(parse_signature(name), cls.tables)
+        cls.table = cls.tables[parse_signature('KQvK')]
+        for table in cls.tables.values():
+            with open(os.path.join(cls.directory, table.name + '.ctb'), 'wb') as f:
+                f.write(table.data)
+        cls.tablebases = Tablebases(cls.directory)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tablebases.close()
+        shutil.rmtree(cls.directory)
+
+    def probe(self, fen):
+        return self.tablebases.probe(Game.from_fen(fen))
+
+    def test_signature(self):
+        self.assertEqual(parse_signature('KvKQ'), ((KING, QUEEN), (KING,)))
+        self.assertEqual(format_signature(parse_signature('krvkq')), 'KQvKR')
+        for name in ('KQvKQv', 'KQvQ', 'KPvK', 'KQRBvK'):
+            with self.assertRaises(ValueError):
+                parse_signature(name)
+
+    def test_probe(self):
+        self.assertEqual(self.probe('7k/8/5K2/8/8/8/8/6Q1 w - - 0 1'), (WIN, 1))
+        self.assertEqual(self.probe('7k/6Q1/5K2/8/8/8/8/8 b - - 0 1'), (LOSS, 0))
+        self.assertEqual(self.probe('7k/5K2/6Q1/8/8/8/8/8 b - - 0 1'), (DRAW, 0))
+        self.assertEqual(self.probe('7K/8/5k2/8/8/8/8/6q1 b - - 0 1'), (WIN, 1))
+        self.assertEqual(self.probe('8/8/4k3/8/8/4K3/8/8 w - - 0 1'), (DRAW, 0))
+        self.assertIsNone(self.probe('8/8/4k3/8/8/4K3/4P3/8 w - - 0 1'))
+        self.assertIsNone(self.probe('8/8/4k3/8/8/4K3/8/4B3 w - - 0 1'))  # No KBvK table
+
+    def test_longest_mate(self):
+        longest = max(self.table.dtm(index) for index in range(self.table.size)
+                      if self.table.wdl(index) == WIN)
+        self.assertEqual(longest, 19)  # Mate in ten
+
+    def test_best_move(self):
+        game = Game.from_fen('7k/8/5K2/8/8/8/8/6Q1 w - - 0 1')
+        move, result, distance = self.tablebases.best_move(game)
+        self.assertEqual((str(move), result, distance), ('g1g7', WIN, 1))
+
+        game = Game.from_fen('8/8/8/3k4/8/8/8/Q3K3 w - - 0 1')
+        result = Engine(tablebases=self.tablebases).search(game)
+        self.assertEqual(result.score, MATE - self.tablebases.probe(game)[1])
+        game.make_move(result.move)
+        self.assertEqual(self.tablebases.probe(game)[0], LOSS)
+
+    def lookahead(self, game):
+        '''What _Generator.score_moves should find, from the legal moves
+        of game and a probe of the position after each capture'''
+        count, best_win, longest = 0, None, 0
+        moves = list(game.legal_moves())
+        for move in moves:
+            if game.board[move.dst.y][move.dst.x] is None:
+                count += 1
+                continue
+            game.make_move(move)
+            result, distance = self.tablebases.probe(game)
+            game.unmake_move()
+            if result == WIN:
+                longest = max(longest, distance + 1)
+                continue
+            count += 1
+            if result == LOSS and (best_win is None or distance + 1 < best_win):
+                best_win = distance + 1
+        return bool(moves), count, best_win, longest
+
+    def test_four_piece_captures(self):
+        signature = parse_signature('KQvKR')
+        generator = _Generator(signature, self.tables)
+
+        def score(game):
+            pieces = [(piece.kind, piece.color == 'black', piece.p.sq)
+                      for row in game.board for piece in row if piece is not None]
+            return generator.score_moves(_order(signature, pieces, False),
+                                         game.turn == 'black')
+
+        # White wins by taking the rook; Black escapes the loss by taking the queen
+        won = Game.from_fen('k7/8/8/3r4/8/8/8/K2Q4 w - - 0 1')
+        self.assertIsNotNone(score(won)[2])
+        escape = Game.from_fen('8/8/2k5/r1Q5/3K4/8/8/8 b - - 0 1')
+        self.assertGreater(score(escape)[1], 0)
+        for game in (won, escape):
+            self.assertEqual(score(game), self.lookahead(game), game.to_fen())
+
+        rng = random.Random(4)
+        checked = 0
+        while checked < 200:
+            squares = rng.sample(range(64), 4)
+            placement = [[None] * 8 for _ in range(8)]
+            for sq, letter in zip(squares, 'KQkr'):
+                placement[sq >> 3][sq & 7] = letter
+            try:
+                game = Game.from_fen(format_fen(placement, rng.choice(COLORS), 0, None, 0, 1))
+            except ValueError:
+                continue
+            enemy = 'black' if game.turn == 'white' else 'white'
+            if game.is_square_attacked(game.find_king(enemy).p, game.turn):
+                continue
+            checked += 1
+            self.assertEqual(score(game), self.lookahead(game), game.to_fen())
+
+
+if __name__ == '__main__':
+    unittest.main()
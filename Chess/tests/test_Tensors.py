@@ -0,0 +1,52 @@
+import unittest
+from Bitboard import BitboardGame
+from ChessBoard import Game
+from Piece import *
+
+try:
+    import numpy as np
+    from Tensors import *
+except ImportError:
+    np = None
+
+POSITIONS = [
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 1',
+    'rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w - - 1 3',  # Checkmate
+    'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R b - - 0 1',
+    '4k3/1P6/8/8/8/8/6p1/4K2R b - - 0 1',
+]
+
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class TensorsTest(unittest.TestCase):
+    def setUp(self):
+        self.games = [Game.from_fen(fen) for fen in POSITIONS]
+        self.planes, self.turns = encode_games(self.games)
+        self.boards = to_bitboards(self.planes)
+
+    def test_round_trip(self):
+        self.assertEqual(self.planes.shape, (len(POSITIONS), 12, 8, 8))
+        self.assertTrue((to_planes(self.boards) == self.planes).all())
+        self.assertTrue((board_planes(self.games[2].board) == self.planes[2]).all())
+        for game, decoded in zip(self.games, decode_games(self.planes, self.turns)):
+            # Placement and side to move; the arrays keep nothing else
+            self.assertEqual(decoded.to_fen().split()[:2], game.to_fen().split()[:2])
+        self.assertEqual(int(self.boards[0, 6 + KING]), 1 << 60)
+
+    def test_in_check(self):
+        self.assertEqual(in_check(self.boards, self.turns).tolist(),
+                         [game.is_check() for game in self.games])
+
+    def test_move_counts(self):
+        # Promotions count four moves; the checkmated side still has
+        # pseudo-legal moves
+        self.assertEqual(move_counts(self.boards, self.turns).tolist(), [20, 19, 41, 13])
+
+    def test_attacked_squares(self):
+        for fen, attacked in zip(POSITIONS, attacked_squares(self.boards, self.turns)):
+            board = BitboardGame.from_fen(fen)
+            self.assertEqual(int(attacked), board.attacked_by(1 - board.turn))
+
+
+if __name__ == '__main__':
+    unittest.main()
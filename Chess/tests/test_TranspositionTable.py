@@ -0,0 +1,60 @@
+import unittest
+from TranspositionTable import *
+from ChessBoard import Game
+
+
+class TranspositionTableTest(unittest.TestCase):
+    def test_size_budget(self):
+        tt = TranspositionTable(1)
+        self.assertEqual(tt.size_bytes, 1 << 20)
+        self.assertEqual(TranspositionTable(1.5).size_bytes, 1 << 20)
+
+    def test_store_and_probe(self):
+        tt = TranspositionTable(1)
+        key = Game().zobrist
+        self.assertIsNone(tt.probe(key))
+        tt.store(key, 5, -120, UPPER, 0x31C)
+        self.assertEqual(tt.probe(key), (5, -120, UPPER, 0x31C))
+
+    def test_depth_preferred(self):
+        tt = TranspositionTable(1)
+        deep, shallow, newest = 0x10, 0x10 + tt.buckets, 0x10 + 2 * tt.buckets
+        tt.store(deep, 8, 10, EXACT)
+        tt.store(shallow, 2, 20, EXACT)
+        tt.store(newest, 1, 30, EXACT)
+        self.assertEqual(tt.probe(deep)[0], 8)
+        self.assertIsNone(tt.probe(shallow))
+        self.assertEqual(tt.probe(newest)[1], 30)
+
+    def test_old_entries_replaced(self):
+        tt = TranspositionTable(1)
+        tt.store(0x20, 9, 0, EXACT)
+        tt.new_search()
+        tt.store(0x20 + tt.buckets, 1, 0, LOWER)
+        self.assertEqual(tt.probe(0x20 + tt.buckets)[0], 1)
+        self.assertEqual(tt.probe(0x20)[0], 9)
+
+    def test_keeps_previous_move(self):
+        tt = TranspositionTable(1)
+        tt.store(0x30, 3, 0, EXACT, 0x123)
+        tt.store(0x30, 4, 5, LOWER)
+        self.assertEqual(tt.probe(0x30), (4, 5, LOWER, 0x123))
+
+    def test_external_buffer(self):
+        buffer = bytearray(BUCKET_BYTES * 4)
+        tt = TranspositionTable(buffer=buffer)
+        tt.store(7, 1, 2, EXACT, 3)
+        self.assertEqual(TranspositionTable(buffer=buffer).probe(7), (1, 2, EXACT, 3))
+        with self.assertRaises(ValueError):
+            TranspositionTable(buffer=bytearray(BUCKET_BYTES * 3))
+
+    def test_clear(self):
+        tt = TranspositionTable(1)
+        tt.store(0x40, 1, 1, EXACT)
+        tt.clear()
+        self.assertIsNone(tt.probe(0x40))
+        self.assertEqual(tt.hashfull(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()